@@ -8,13 +8,20 @@ import logging
 from app.models.schemas import (
     RecommendationRequest,
     RecommendationResponse,
+    BatchRecommendationRequest,
+    BatchRecommendationResponse,
     SearchRequest,
     SearchResponse,
+    SuggestionResponse,
+    SemanticSearchRequest,
+    SemanticSearchResponse,
+    SimilarMoviesResponse,
     StatusResponse,
     MovieBase,
     MovieDetail
 )
 from app.services.recommendation_service import recommendation_service
+from app.services.search_service import search_service
 from app.services.tmdb_service import tmdb_service
 from app.services.embedding_service import embedding_service
 from app.services.faiss_service import faiss_service
@@ -50,6 +57,50 @@ async def get_recommendations(request: RecommendationRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/recommend/batch", response_model=BatchRecommendationResponse)
+async def get_recommendations_batch(request: BatchRecommendationRequest):
+    """
+    Get movie recommendations for many users in one call (e.g. precomputed rails)
+    
+    - **users**: List of recommendation requests (liked_movies, top_k, filters)
+    
+    Liked movies that are not in the catalog are ignored instead of being fetched.
+    """
+    try:
+        results = await recommendation_service.get_recommendations_batch(request.users)
+        
+        return BatchRecommendationResponse(results=results)
+        
+    except Exception as e:
+        logger.error(f"Error generating batched recommendations: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/semantic-search", response_model=SemanticSearchResponse)
+async def semantic_search(request: SemanticSearchRequest):
+    """
+    Search movies by description with the embedding model (no TMDB call)
+    
+    - **query**: Natural-language query, e.g. "a heist movie in space"
+    - **top_k**: Number of results to return (default: 10, max: 50)
+    - **filters**: Optional filters, same as /recommend
+    - **hybrid**: Also rank movies whose title matches the query
+    """
+    try:
+        results = await recommendation_service.semantic_search(
+            query=request.query,
+            top_k=request.top_k,
+            filters=request.filters,
+            hybrid=request.hybrid
+        )
+        
+        return SemanticSearchResponse(results=results)
+        
+    except Exception as e:
+        logger.error(f"Error in semantic search: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/search", response_model=SearchResponse)
 async def search_movies(
     query: str = Query(..., min_length=1, max_length=200),
@@ -60,9 +111,11 @@ async def search_movies(
     
     - **query**: Search query string
     - **page**: Page number for pagination
+    
+    Movies already in the catalog are listed first; TMDB fills the pages once they run out.
     """
     try:
-        results = await tmdb_service.search_movies(query=query, page=page)
+        results = await search_service.search_movies(query=query, page=page)
         
         return SearchResponse(
             results=[MovieBase(**movie) for movie in results["results"]],
@@ -76,6 +129,25 @@ async def search_movies(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/search/suggest", response_model=SuggestionResponse)
+async def suggest_movies(
+    query: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(8, ge=1, le=20)
+):
+    """
+    Typeahead suggestions from the local catalog (no TMDB call, cheap enough for every keystroke)
+    
+    - **query**: Partial title
+    - **limit**: Maximum number of suggestions
+    """
+    try:
+        results = await search_service.suggest(query=query, limit=limit)
+        return SuggestionResponse(results=[MovieBase(**movie) for movie in results])
+        
+    except Exception as e:
+        logger.error(f"Error suggesting movies: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 
 @router.get("/search/person")
 async def search_person(
@@ -120,6 +192,32 @@ async def get_movie_details(movie_id: int):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/movie/{movie_id}/similar", response_model=SimilarMoviesResponse)
+async def get_similar_movies(
+    movie_id: int,
+    top_k: int = Query(10, ge=1, le=50)
+):
+    """
+    Get the movies most similar to a catalog movie ("more like this")
+    
+    - **movie_id**: TMDB movie ID
+    - **top_k**: Number of similar movies (default: 10, max: 50)
+    """
+    try:
+        results = await recommendation_service.get_similar_movies(movie_id, top_k=top_k)
+        
+        if results is None:
+            raise HTTPException(status_code=404, detail="Movie not in catalog")
+        
+        return SimilarMoviesResponse(movie_id=movie_id, results=results)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching similar movies: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/popular", response_model=SearchResponse)
 async def get_popular_movies(page: int = Query(1, ge=1, le=500)):
     """
@@ -153,7 +251,7 @@ async def get_status():
         return StatusResponse(
             status="healthy",
             total_movies=len(embedding_service.movie_ids),
-            embeddings_ready=embedding_service.embeddings is not None,
+            embeddings_ready=len(embedding_service.movie_ids) > 0,
             faiss_index_ready=index_stats["is_trained"]
         )
         
@@ -167,6 +265,57 @@ async def get_status():
         )
 
 
+@router.get("/facets")
+async def get_facets(
+    genre: Optional[str] = None,
+    year: Optional[int] = None,
+    min_rating: Optional[float] = None,
+    actor: Optional[str] = None,
+    director: Optional[str] = None,
+    min_runtime: Optional[int] = None,
+    max_runtime: Optional[int] = None
+):
+    """
+    Count catalog movies per genre, decade and rating for the filter panel
+    
+    Takes the same filters as /recommend; each facet ignores its own filter, so its
+    counts tell how many movies every alternative choice would match.
+    """
+    try:
+        return await recommendation_service.get_facets({
+            "genre": genre,
+            "year": year,
+            "min_rating": min_rating,
+            "actor": actor,
+            "director": director,
+            "min_runtime": min_runtime,
+            "max_runtime": max_runtime
+        })
+    except Exception as e:
+        logger.error(f"Error computing facets: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """
+    Get hit/miss statistics of the caches
+    """
+    return {
+        "tmdb": tmdb_service.cache.get_stats(),
+        "embeddings": embedding_service.embedding_cache.get_stats(),
+        "recommendations": recommendation_service.get_cache_stats()
+    }
+
+
+@router.get("/index/stats")
+async def get_index_stats():
+    """
+    Get the FAISS index strategy, size and recall@k against an exact scan
+    """
+    return faiss_service.get_index_stats()
+
+
 @router.post("/initialize")
 async def initialize_system(num_movies: int = Query(500, ge=100, le=10000)):
     """
@@ -12,6 +12,12 @@ class Settings(BaseSettings):
     TMDB_API_KEY: str
     TMDB_BASE_URL: str = "https://api.themoviedb.org/3"
     TMDB_IMAGE_BASE_URL: str = "https://image.tmdb.org/t/p/w500"
+    TMDB_REQUESTS_PER_SECOND: float = 40.0
+    TMDB_MAX_CONCURRENT_REQUESTS: int = 8
+    
+    # Catalog ingestion
+    INGESTION_CONCURRENCY: int = 16
+    INGESTION_EMBEDDING_BATCH_SIZE: int = 64
     
     # Database
     DATABASE_URL: str = "sqlite+aiosqlite:///./data/movies.db"
@@ -19,7 +25,37 @@ class Settings(BaseSettings):
     # Paths
     FAISS_INDEX_PATH: str = "./data/faiss_index.bin"
     EMBEDDINGS_PATH: str = "./data/embeddings.npy"
+    # Memory-map the embeddings snapshot read-only (shared across workers via the page cache)
+    EMBEDDINGS_MMAP: bool = True
+    # Legacy JSON metadata snapshot, only read to migrate to the columnar store below
     MOVIES_METADATA_PATH: str = "./data/movies_metadata.json"
+    # Columnar metadata (ids, year, rating, runtime, genres, cast...) and full documents
+    MOVIES_COLUMNS_PATH: str = "./data/movies_columns.npz"
+    MOVIES_DOCS_PATH: str = "./data/movies_docs.db"
+    EMBEDDING_LOG_PATH: str = "./data/embeddings.wal"
+    HTTP_CACHE_PATH: str = "./data/http_cache.db"
+    EMBEDDING_CACHE_PATH: str = "./data/embedding_cache.db"
+    NEIGHBORS_PATH: str = "./data/neighbors.npz"
+    
+    # TMDB response cache
+    HTTP_CACHE_ENABLED: bool = True
+    HTTP_CACHE_MEMORY_ENTRIES: int = 4096
+    
+    # Recommendation result cache (in memory, invalidated whenever the index changes)
+    RECOMMENDATION_CACHE_ENABLED: bool = True
+    RECOMMENDATION_CACHE_SIZE: int = 2048
+    RECOMMENDATION_CACHE_TTL: float = 600.0
+    # Results missing a liked movie that could not be fetched, so the fetch is retried soon
+    RECOMMENDATION_CACHE_PARTIAL_TTL: float = 30.0
+    # Unfiltered candidates fetched once per profile; filter / top_k changes are answered from them
+    CANDIDATE_POOL_ENABLED: bool = True
+    CANDIDATE_POOL_SIZE: int = 300
+    CANDIDATE_POOL_CACHE_SIZE: int = 1024
+    # Free-text semantic search: embeddings of recent queries, share of the title match in hybrid scores
+    QUERY_EMBEDDING_CACHE_SIZE: int = 1024
+    SEMANTIC_SEARCH_LEXICAL_WEIGHT: float = 0.3
+    # Neighbours precomputed per movie for /movie/{id}/similar
+    SIMILAR_MOVIES_NEIGHBORS: int = 50
     
     # Server
     HOST: str = "0.0.0.0"
@@ -32,6 +68,38 @@ class Settings(BaseSettings):
     # Embedding Model
     EMBEDDING_MODEL_NAME: str = "all-MiniLM-L6-v2"
     EMBEDDING_DIMENSION: int = 384
+    # Inference backend: "torch" (reference), "onnx" or "onnx-int8" (needs optimum[onnxruntime])
+    EMBEDDING_BACKEND: str = "torch"
+    ONNX_EXPORT_DIR: str = "./data/onnx"
+    # Token truncation of the ONNX backends (sentence-transformers setting of all-MiniLM-L6-v2)
+    EMBEDDING_MAX_SEQ_LENGTH: int = 256
+    # Threads running model inference off the event loop (each encode already uses every core)
+    INFERENCE_WORKERS: int = 1
+    # Skip re-encoding texts whose vectors are already cached
+    EMBEDDING_CACHE_ENABLED: bool = True
+    # Micro-batching of concurrent single-text encodes
+    EMBEDDING_BATCH_MAX_SIZE: int = 32
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = 5.0
+    # Fold the write-ahead log into the snapshot files after this many on-the-fly additions
+    EMBEDDING_LOG_COMPACT_THRESHOLD: int = 200
+    
+    # FAISS index
+    # Strategy: "auto" (by catalog size), "flat", "ivf-flat", "ivf-pq" or "hnsw"
+    FAISS_INDEX_TYPE: str = "auto"
+    FAISS_AUTO_FLAT_MAX_VECTORS: int = 20000
+    FAISS_AUTO_HNSW_MAX_VECTORS: int = 1000000
+    FAISS_TRAIN_SAMPLE_SIZE: int = 100000
+    # IVF: number of inverted lists (0 = ~4 * sqrt(n)) and lists probed per query
+    FAISS_NLIST: int = 0
+    FAISS_NPROBE: int = 16
+    # IVF-PQ: sub-quantizers (must divide EMBEDDING_DIMENSION), 8 bits each
+    FAISS_PQ_M: int = 48
+    # HNSW: graph degree and build / search beam widths
+    FAISS_HNSW_M: int = 32
+    FAISS_HNSW_EF_CONSTRUCTION: int = 200
+    FAISS_HNSW_EF_SEARCH: int = 128
+    # Queries of the recall@k report computed after building an approximate index
+    FAISS_RECALL_QUERIES: int = 200
     
     class Config:
         env_file = ".env"
@@ -10,6 +10,10 @@ from app.core.config import settings
 from app.api.routes import router
 from app.services.embedding_service import embedding_service
 from app.services.faiss_service import faiss_service
+from app.services.tmdb_service import tmdb_service
+from app.services.recommendation_service import recommendation_service
+from app.services.search_service import search_service
+from app.services.neighbor_table import neighbor_table
 
 # Configure logging
 logging.basicConfig(
@@ -36,6 +40,19 @@ async def lifespan(app: FastAPI):
     embeddings_loaded = embedding_service.load_embeddings()
     index_loaded = faiss_service.load_index()
     
+    # Movies replayed from the embedding log are not in the saved index yet
+    if embeddings_loaded:
+        faiss_service.sync_with_embeddings(embedding_service.embeddings, embedding_service.movie_ids)
+        index_loaded = faiss_service.index is not None
+        # Inverted indexes used by filters and facet counts
+        recommendation_service.filter_index.build()
+        # Title index used by local search and typeahead
+        search_service.build()
+        # Precomputed "more like this" neighbours, built offline by build_neighbors.py
+        # (until then, similar movies are searched in the index directly)
+        if index_loaded and neighbor_table.load() and neighbor_table.sync():
+            neighbor_table.save()
+    
     if embeddings_loaded and index_loaded:
         logger.info("✅ System ready with pre-computed embeddings")
     else:
@@ -45,6 +62,12 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down Movie Recommendation API")
+    if embedding_service.log.pending:
+        await recommendation_service.compact_storage()
+    embedding_service.log.close()
+    embedding_service.movies_metadata.close()
+    embedding_service.shutdown()
+    await tmdb_service.close()
 
 
 # Create FastAPI app
@@ -106,7 +129,7 @@ async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
-        "embeddings_loaded": embedding_service.embeddings is not None,
+        "embeddings_loaded": len(embedding_service.movie_ids) > 0,
         "faiss_ready": faiss_service.index is not None
     }
 
@@ -89,12 +89,64 @@ class RecommendationResponse(BaseModel):
     )
 
 
+class BatchRecommendationRequest(BaseModel):
+    """Request for the recommendations of many users at once"""
+    users: List[RecommendationRequest] = Field(
+        ...,
+        description="One recommendation request per user",
+        min_length=1,
+        max_length=10000
+    )
+
+
+class BatchRecommendationResponse(BaseModel):
+    """Recommendations of many users"""
+    results: List[List[RecommendationItem]] = Field(
+        description="Recommendations of each user, in request order"
+    )
+
+
 class SearchRequest(BaseModel):
     """Request to search for movies"""
     query: str = Field(..., min_length=1, max_length=200)
     page: int = Field(default=1, ge=1)
 
 
+class SimilarMoviesResponse(BaseModel):
+    """Movies most similar to a given movie"""
+    movie_id: int
+    results: List[RecommendationItem]
+
+
+class SemanticSearchRequest(BaseModel):
+    """Request for a free-text search over the movie embeddings"""
+    query: str = Field(
+        ...,
+        description="Natural-language description, e.g. \"a heist movie in space\"",
+        min_length=1,
+        max_length=500
+    )
+    top_k: int = Field(
+        default=10,
+        description="Number of results to return",
+        ge=1,
+        le=50
+    )
+    filters: Optional[dict] = Field(
+        default=None,
+        description="Optional filters for genre, year, etc."
+    )
+    hybrid: bool = Field(
+        default=False,
+        description="Blend lexical title matches with the semantic scores"
+    )
+
+
+class SemanticSearchResponse(BaseModel):
+    """Response containing semantic search results"""
+    results: List[RecommendationItem]
+
+
 class SearchResponse(BaseModel):
     """Response containing search results"""
     results: List[MovieBase]
@@ -103,6 +155,11 @@ class SearchResponse(BaseModel):
     total_results: int
 
 
+class SuggestionResponse(BaseModel):
+    """Typeahead suggestions from the local catalog"""
+    results: List[MovieBase]
+
+
 class StatusResponse(BaseModel):
     """API status information"""
     status: str
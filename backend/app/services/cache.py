@@ -0,0 +1,326 @@
+"""
+Cache Service - In-memory LRU tier and persistent SQLite tier for API responses
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import logging
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Bounded in-memory LRU cache with optional per-entry expiry"""
+    
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a value, or None if missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        value, expires_at = entry
+        if expires_at and expires_at < time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store a value, evicting the least recently used entries if full"""
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.monotonic() + ttl if ttl else 0.0
+        
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def pop(self, key: Hashable) -> Optional[Any]:
+        """Remove an entry and return its value"""
+        entry = self._entries.pop(key, None)
+        return entry[0] if entry else None
+    
+    def clear(self):
+        """Drop every entry"""
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+
+class ResponseCache:
+    """
+    Two-tier (memory LRU + SQLite) cache for JSON API responses
+    
+    Each entry has a fresh lifetime and an extra stale window: fresh entries are served
+    directly, stale ones are served immediately while a background task revalidates them,
+    and expired ones are refetched. Concurrent misses on the same key share one fetch.
+    """
+    
+    def __init__(self, db_path: str, max_memory_entries: int = 2048, enabled: bool = True):
+        self.db_path = db_path
+        self.enabled = enabled
+        # Values are (payload, fresh_until, stale_until) using wall-clock time so they survive restarts
+        self.memory = LRUCache(max_entries=max_memory_entries)
+        self._db: Optional[aiosqlite.Connection] = None
+        self._db_failed = False
+        self._db_lock = asyncio.Lock()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._background: set[asyncio.Task] = set()
+        
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "revalidations": 0,
+            "errors": 0
+        }
+    
+    async def _get_db(self) -> Optional[aiosqlite.Connection]:
+        """Open the SQLite tier lazily (memory-only if it cannot be opened)"""
+        if self._db is not None or self._db_failed:
+            return self._db
+        
+        async with self._db_lock:
+            if self._db is not None or self._db_failed:
+                return self._db
+            try:
+                Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+                db = await aiosqlite.connect(self.db_path)
+                await db.execute("PRAGMA journal_mode=WAL")
+                await db.execute("PRAGMA synchronous=NORMAL")
+                await db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, payload TEXT NOT NULL, "
+                    "fresh_until REAL NOT NULL, stale_until REAL NOT NULL)"
+                )
+                # Purge entries that can no longer be served
+                await db.execute("DELETE FROM responses WHERE stale_until < ?", (time.time(),))
+                await db.commit()
+                self._db = db
+                logger.info(f"Response cache opened at {self.db_path}")
+            except Exception as e:
+                logger.error(f"Error opening response cache, using memory only: {e}")
+                self._db_failed = True
+        
+        return self._db
+    
+    async def close(self):
+        """Wait for pending fetches and revalidations and close the SQLite tier"""
+        pending = self._background | set(self._inflight.values())
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+    
+    @staticmethod
+    def make_key(url: str, params: Any = None) -> str:
+        """Build a canonical cache key from a URL and its query parameters"""
+        if not params:
+            return url
+        items = params.items() if isinstance(params, dict) else params
+        canonical = sorted((str(k), str(v)) for k, v in items)
+        return f"{url}?{json.dumps(canonical, separators=(',', ':'))}"
+    
+    async def get_or_fetch(
+        self,
+        key: str,
+        fetcher: Callable[[], Awaitable[Any]],
+        ttl: float,
+        stale_ttl: float = 0.0
+    ) -> Any:
+        """
+        Get a cached response or fetch it
+        
+        Args:
+            key: Cache key (see make_key)
+            fetcher: Coroutine function performing the actual request
+            ttl: Seconds during which the response is fresh
+            stale_ttl: Extra seconds during which a stale response is served while revalidating
+        
+        Returns:
+            The (possibly cached) response payload
+        """
+        if not self.enabled or ttl <= 0:
+            return await fetcher()
+        
+        now = time.time()
+        
+        entry = self.memory.get(key)
+        source = "memory_hits"
+        if entry is None:
+            entry = await self._read_disk(key)
+            source = "disk_hits"
+            if entry is not None:
+                self.memory.set(key, entry)
+        
+        if entry is not None:
+            payload, fresh_until, stale_until = entry
+            if now < fresh_until:
+                self.stats[source] += 1
+                return payload
+            if now < stale_until:
+                self.stats["stale_hits"] += 1
+                self._revalidate(key, fetcher, ttl, stale_ttl)
+                return payload
+            self.memory.pop(key)
+        
+        self.stats["misses"] += 1
+        return await self._fetch_once(key, fetcher, ttl, stale_ttl)
+    
+    async def peek(self, key: str) -> Optional[Any]:
+        """Get a cached response (fresh or stale) without ever fetching it"""
+        if not self.enabled:
+            return None
+        
+        entry = self.memory.get(key)
+        if entry is None:
+            entry = await self._read_disk(key)
+            if entry is not None:
+                self.memory.set(key, entry)
+        
+        if entry is None or entry[2] <= time.time():
+            return None
+        return entry[0]
+    
+    async def _fetch_once(
+        self,
+        key: str,
+        fetcher: Callable[[], Awaitable[Any]],
+        ttl: float,
+        stale_ttl: float
+    ) -> Any:
+        """
+        Fetch and store a response, sharing the request between concurrent callers
+        
+        The fetch runs as its own task: a caller that gets cancelled stops waiting
+        but does not abort the request for the others.
+        """
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            async def fetch():
+                payload = await fetcher()
+                await self._store(key, payload, ttl, stale_ttl)
+                return payload
+            
+            inflight = asyncio.create_task(fetch())
+            self._inflight[key] = inflight
+            inflight.add_done_callback(lambda task: self._fetch_done(key, task))
+        
+        return await asyncio.shield(inflight)
+    
+    def _fetch_done(self, key: str, task: asyncio.Task):
+        """Forget a finished shared fetch"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved when every caller stopped waiting
+        if not task.cancelled():
+            task.exception()
+    
+    def _revalidate(
+        self,
+        key: str,
+        fetcher: Callable[[], Awaitable[Any]],
+        ttl: float,
+        stale_ttl: float
+    ):
+        """Refresh a stale entry in the background"""
+        if key in self._inflight:
+            return
+        
+        async def refresh():
+            try:
+                await self._fetch_once(key, fetcher, ttl, stale_ttl)
+                self.stats["revalidations"] += 1
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning(f"Background revalidation failed for {key}: {e}")
+        
+        task = asyncio.create_task(refresh())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+    
+    async def _read_disk(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        """Read an entry from the SQLite tier"""
+        db = await self._get_db()
+        if db is None:
+            return None
+        
+        try:
+            async with db.execute(
+                "SELECT payload, fresh_until, stale_until FROM responses WHERE key = ?",
+                (key,)
+            ) as cursor:
+                row = await cursor.fetchone()
+            if row is None:
+                return None
+            return json.loads(row[0]), row[1], row[2]
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Error reading response cache: {e}")
+            return None
+    
+    async def _store(self, key: str, payload: Any, ttl: float, stale_ttl: float):
+        """Write an entry to both tiers"""
+        now = time.time()
+        entry = (payload, now + ttl, now + ttl + stale_ttl)
+        self.memory.set(key, entry)
+        
+        db = await self._get_db()
+        if db is None:
+            return
+        
+        try:
+            await db.execute(
+                "INSERT OR REPLACE INTO responses (key, payload, fresh_until, stale_until) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(payload), entry[1], entry[2])
+            )
+            await db.commit()
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Error writing response cache: {e}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters for both tiers"""
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["stale_hits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "enabled": self.enabled
+        }
@@ -0,0 +1,197 @@
+"""
+Embedding Backends - Interchangeable inference engines for the sentence embedding model
+"""
+import time
+import numpy as np
+from pathlib import Path
+from typing import Any, Dict, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    """L2-normalize rows as float32"""
+    embeddings = np.asarray(embeddings, dtype='float32')
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+class TorchBackend:
+    """Reference backend: the PyTorch SentenceTransformer model"""
+    
+    name = "torch"
+    
+    def __init__(self, model_name: str):
+        # Imported lazily so ONNX deployments never load torch
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+    
+    def encode(
+        self,
+        texts: List[str],
+        batch_size: int = 32,
+        show_progress_bar: bool = False
+    ) -> np.ndarray:
+        embeddings = self.model.encode(
+            texts,
+            normalize_embeddings=True,
+            show_progress_bar=show_progress_bar,
+            batch_size=batch_size
+        )
+        return np.asarray(embeddings, dtype='float32').reshape(len(texts), -1)
+
+
+class OnnxBackend:
+    """
+    ONNX Runtime backend, optionally with dynamic int8 quantization
+    
+    The model is exported (and quantized) once with `optimum` into `export_dir` and
+    loaded from there afterwards. Pooling mirrors the sentence-transformers pipeline
+    of MiniLM models: attention-masked mean over token embeddings, then L2 norm.
+    """
+    
+    def __init__(
+        self,
+        model_name: str,
+        export_dir: str,
+        quantize: bool = False,
+        max_seq_length: int = 256
+    ):
+        try:
+            from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+            from optimum.onnxruntime.configuration import AutoQuantizationConfig
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise RuntimeError(
+                "ONNX embedding backends require the optional `optimum[onnxruntime]` package"
+            ) from e
+        
+        self.name = "onnx-int8" if quantize else "onnx"
+        self.max_seq_length = max_seq_length
+        
+        hub_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        model_dir = Path(export_dir) / model_name.replace("/", "__")
+        
+        if not (model_dir / "model.onnx").exists():
+            logger.info(f"Exporting {hub_id} to ONNX in {model_dir}")
+            model = ORTModelForFeatureExtraction.from_pretrained(hub_id, export=True)
+            model.save_pretrained(model_dir)
+            AutoTokenizer.from_pretrained(hub_id).save_pretrained(model_dir)
+        
+        if quantize:
+            quantized_dir = model_dir / "int8"
+            if not (quantized_dir / "model_quantized.onnx").exists():
+                logger.info(f"Quantizing {model_dir} to int8")
+                quantizer = ORTQuantizer.from_pretrained(model_dir)
+                config = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+                quantizer.quantize(save_dir=quantized_dir, quantization_config=config)
+            self.model = ORTModelForFeatureExtraction.from_pretrained(
+                quantized_dir, file_name="model_quantized.onnx"
+            )
+        else:
+            self.model = ORTModelForFeatureExtraction.from_pretrained(model_dir)
+        
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    
+    def encode(
+        self,
+        texts: List[str],
+        batch_size: int = 32,
+        show_progress_bar: bool = False
+    ) -> np.ndarray:
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            token_embeddings = np.asarray(self.model(**inputs).last_hidden_state, dtype='float32')
+            
+            # Mean pooling over real (non-padding) tokens
+            mask = inputs["attention_mask"][..., None].astype('float32')
+            pooled = (token_embeddings * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            batches.append(_normalize(pooled))
+            
+            if show_progress_bar:
+                logger.info(f"Encoded {min(start + batch_size, len(texts))}/{len(texts)} texts")
+        
+        if not batches:
+            return np.empty((0, self.model.config.hidden_size), dtype='float32')
+        return np.vstack(batches)
+
+
+def create_backend(name: str, model_name: str, export_dir: str, max_seq_length: int = 256):
+    """
+    Instantiate an embedding backend
+    
+    Args:
+        name: One of BACKENDS ("torch", "onnx", "onnx-int8")
+        model_name: SentenceTransformer model name
+        export_dir: Directory holding exported ONNX models
+        max_seq_length: Token truncation length of the ONNX backends
+    
+    Returns:
+        Backend exposing encode(texts, batch_size, show_progress_bar)
+    """
+    if name == "torch":
+        return TorchBackend(model_name)
+    if name in ("onnx", "onnx-int8"):
+        return OnnxBackend(
+            model_name,
+            export_dir,
+            quantize=name == "onnx-int8",
+            max_seq_length=max_seq_length
+        )
+    raise ValueError(f"Unknown embedding backend '{name}', expected one of {', '.join(BACKENDS)}")
+
+
+def parity_report(candidate, reference, texts: List[str], batch_size: int = 32) -> Dict[str, Any]:
+    """
+    Compare a backend's embeddings with a reference backend on the same texts
+    
+    Args:
+        candidate: Backend under test
+        reference: Reference backend (normally TorchBackend)
+        texts: Sample texts to encode
+    
+    Returns:
+        Dict with cosine agreement statistics, nearest-neighbour agreement and timings
+    """
+    started_at = time.perf_counter()
+    expected = reference.encode(texts, batch_size=batch_size)
+    reference_seconds = time.perf_counter() - started_at
+    
+    started_at = time.perf_counter()
+    actual = candidate.encode(texts, batch_size=batch_size)
+    candidate_seconds = time.perf_counter() - started_at
+    
+    cosines = np.sum(expected * actual, axis=1)
+    norms = np.linalg.norm(actual, axis=1)
+    
+    # Same nearest neighbour among the sample texts (excluding each text itself)
+    expected_sim = expected @ expected.T
+    actual_sim = actual @ actual.T
+    np.fill_diagonal(expected_sim, -np.inf)
+    np.fill_diagonal(actual_sim, -np.inf)
+    neighbour_agreement = float(np.mean(expected_sim.argmax(axis=1) == actual_sim.argmax(axis=1)))
+    
+    return {
+        "backend": candidate.name,
+        "reference": reference.name,
+        "texts": len(texts),
+        "dtype": str(actual.dtype),
+        "max_norm_error": float(np.max(np.abs(norms - 1.0))),
+        "cosine_mean": float(np.mean(cosines)),
+        "cosine_min": float(np.min(cosines)),
+        "cosine_p01": float(np.percentile(cosines, 1)),
+        "nearest_neighbour_agreement": neighbour_agreement,
+        "reference_texts_per_second": len(texts) / max(reference_seconds, 1e-9),
+        "backend_texts_per_second": len(texts) / max(candidate_seconds, 1e-9),
+        "speedup": reference_seconds / max(candidate_seconds, 1e-9)
+    }
@@ -0,0 +1,124 @@
+"""
+Embedding Batcher - Coalesces concurrent single-text encodes into batched model calls
+"""
+import asyncio
+import numpy as np
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """
+    Async micro-batcher in front of a batch encode function
+    
+    Requests are queued; a single worker task takes the first waiting text, then keeps
+    collecting until `max_batch_size` texts are queued or `max_wait_ms` has elapsed, and
+    encodes them in one call. Each caller awaits its own future, so a lone request waits
+    at most `max_wait_ms` longer than an unbatched encode, while bursts share model calls.
+    """
+    
+    def __init__(
+        self,
+        encode_batch: Callable[[List[str]], Awaitable[np.ndarray]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0
+    ):
+        self.encode_batch = encode_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        
+        self.stats = {
+            "requests": 0,
+            "texts": 0,
+            "batches": 0,
+            "errors": 0
+        }
+    
+    async def encode(self, text: str) -> np.ndarray:
+        """
+        Encode one text as part of the next batch
+        
+        Args:
+            text: Text to embed
+        
+        Returns:
+            Normalized embedding vector
+        """
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            # (Re)start the worker on the current event loop
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+        
+        future = loop.create_future()
+        self.stats["requests"] += 1
+        await self._queue.put((text, future))
+        return await future
+    
+    async def _run(self):
+        """Collect and encode batches until cancelled"""
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.max_wait
+            
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    # Still take whatever is already queued
+                    if self._queue.empty():
+                        break
+                    batch.append(self._queue.get_nowait())
+                    continue
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            
+            await self._encode(batch)
+    
+    async def _encode(self, batch: List[Tuple[str, asyncio.Future]]):
+        """Encode one batch and resolve the callers' futures"""
+        # Callers that gave up (cancelled) do not need encoding
+        batch = [(text, future) for text, future in batch if not future.done()]
+        if not batch:
+            return
+        
+        self.stats["batches"] += 1
+        self.stats["texts"] += len(batch)
+        try:
+            embeddings = await self.encode_batch([text for text, _ in batch])
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Error encoding batch of {len(batch)} texts: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, future), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+    
+    def close(self):
+        """Stop the worker and cancel queued requests"""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            future.cancel()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get request/batch counters"""
+        return {
+            **self.stats,
+            "avg_batch_size": self.stats["texts"] / self.stats["batches"] if self.stats["batches"] else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000
+        }
@@ -0,0 +1,146 @@
+"""
+Embedding Cache - Persistent content-addressed cache of embedding vectors
+"""
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters per statement
+_CHUNK = 500
+
+
+class EmbeddingCache:
+    """
+    SQLite cache of float32 vectors keyed on hash(model, text template version, text)
+    
+    Any change to the model, the inference backend or `create_embedding_text` changes
+    the keys, so stale vectors are never served; unchanged movies are never re-encoded.
+    Safe to use from the inference threads.
+    """
+    
+    def __init__(self, db_path: str, model_key: str, template_version: int, enabled: bool = True):
+        self.db_path = db_path
+        self.model_key = model_key
+        self.template_version = template_version
+        self.enabled = enabled
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_failed = False
+        self._lock = threading.Lock()
+        
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "errors": 0
+        }
+    
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """Open the database lazily (caller holds _lock); None disables the cache"""
+        if self._db is not None or self._db_failed:
+            return self._db
+        
+        try:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.db_path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("CREATE TABLE IF NOT EXISTS vectors (key BLOB PRIMARY KEY, vector BLOB NOT NULL)")
+            db.commit()
+            self._db = db
+        except Exception as e:
+            logger.error(f"Error opening embedding cache, caching disabled: {e}")
+            self._db_failed = True
+        return self._db
+    
+    def make_key(self, text: str) -> bytes:
+        """Content hash of a text for the current model and template"""
+        digest = hashlib.sha256()
+        digest.update(f"{self.model_key}\0{self.template_version}\0".encode("utf-8"))
+        digest.update(text.encode("utf-8"))
+        return digest.digest()
+    
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up cached vectors
+        
+        Args:
+            texts: Embedding texts
+        
+        Returns:
+            One vector (or None on a miss) per text
+        """
+        if not self.enabled or not texts:
+            return [None] * len(texts)
+        
+        keys = [self.make_key(text) for text in texts]
+        found: Dict[bytes, np.ndarray] = {}
+        with self._lock:
+            db = self._connect()
+            if db is not None:
+                try:
+                    unique_keys = list(set(keys))
+                    for start in range(0, len(unique_keys), _CHUNK):
+                        chunk = unique_keys[start:start + _CHUNK]
+                        rows = db.execute(
+                            f"SELECT key, vector FROM vectors WHERE key IN ({','.join('?' * len(chunk))})",
+                            chunk
+                        ).fetchall()
+                        for key, vector in rows:
+                            found[key] = np.frombuffer(vector, dtype='float32')
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    logger.error(f"Error reading embedding cache: {e}")
+        
+        vectors = [found.get(key) for key in keys]
+        hits = sum(vector is not None for vector in vectors)
+        self.stats["hits"] += hits
+        self.stats["misses"] += len(vectors) - hits
+        return vectors
+    
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        """
+        Store vectors for texts
+        
+        Args:
+            texts: Embedding texts
+            vectors: Matrix of float32 vectors aligned with texts
+        """
+        if not self.enabled or not texts:
+            return
+        
+        rows = [
+            (self.make_key(text), np.ascontiguousarray(vector, dtype='float32').tobytes())
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return
+            try:
+                db.executemany("INSERT OR REPLACE INTO vectors (key, vector) VALUES (?, ?)", rows)
+                db.commit()
+                self.stats["writes"] += len(rows)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Error writing embedding cache: {e}")
+    
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_ratio": self.stats["hits"] / lookups if lookups else 0.0,
+            "enabled": self.enabled
+        }
@@ -0,0 +1,220 @@
+"""
+Embedding Log - Append-only, crash-safe write-ahead log of new movie embeddings
+"""
+import json
+import os
+import struct
+import zlib
+import numpy as np
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, run a single worker
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Record layout: header (magic, payload length, crc32 of payload) + payload
+# Payload layout: movie_id (int64), vector length (uint32), float32 vector, metadata JSON
+_HEADER = struct.Struct("<4sII")
+_PAYLOAD_PREFIX = struct.Struct("<qI")
+_MAGIC = b"EMB1"
+
+LogRecord = Tuple[int, np.ndarray, Dict[str, Any]]
+
+
+def _encode(movie_id: int, vector: np.ndarray, metadata: Dict[str, Any]) -> bytes:
+    """Serialize one record (header + payload)"""
+    vector = np.ascontiguousarray(vector, dtype='float32').reshape(-1)
+    payload = b"".join([
+        _PAYLOAD_PREFIX.pack(int(movie_id), len(vector)),
+        vector.tobytes(),
+        json.dumps(metadata).encode("utf-8")
+    ])
+    return _HEADER.pack(_MAGIC, len(payload), zlib.crc32(payload)) + payload
+
+
+@contextmanager
+def _file_lock(path: Path):
+    """Hold an exclusive advisory lock on a file, across processes (no-op without fcntl)"""
+    if fcntl is None:
+        yield
+        return
+    
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class EmbeddingLog:
+    """
+    Write-ahead log of (movie_id, vector, metadata) records
+    
+    Each append is a single small write followed by an fsync, so adding a movie costs
+    O(d) I/O whatever the catalog size. Records are checksummed: replay stops at the
+    first torn or corrupt record (e.g. after a crash mid-write) and truncates it away.
+    
+    Compaction rotates the log to `<path>.compacting` before the snapshot is written and
+    deletes it once the snapshot is safely on disk, so a crash at any point leaves every
+    record either in the snapshot or in a log that is replayed on startup.
+    
+    Several server processes may share the log: appends, rotation and deletion hold an
+    flock on `<path>.lock`, and whole compactions are serialized by `<path>.compact.lock`
+    (see compacting()).
+    """
+    
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.rotated_path = self.path.with_name(self.path.name + ".compacting")
+        self._lock_path = self.path.with_name(self.path.name + ".lock")
+        self._compact_lock_path = self.path.with_name(self.path.name + ".compact.lock")
+        self._file = None
+        self.pending = 0
+    
+    def compacting(self):
+        """Lock held by a process for its whole compaction (rotate, snapshot, discard)"""
+        return _file_lock(self._compact_lock_path)
+    
+    def _open(self):
+        """Open the active log for appending (caller holds the log lock)"""
+        if self._file is not None and self._rotated_away():
+            # Another process rotated the log: our handle now points at the old file
+            self.close()
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "ab")
+        return self._file
+    
+    def _rotated_away(self) -> bool:
+        """Whether the open handle no longer refers to the file at self.path"""
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self._file.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+    
+    def close(self):
+        """Close the active log file"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    
+    def append(self, movie_id: int, vector: np.ndarray, metadata: Dict[str, Any]):
+        """
+        Durably append a record
+        
+        Args:
+            movie_id: ID of the movie
+            vector: Embedding vector
+            metadata: Movie metadata (JSON-serializable)
+        """
+        record = _encode(movie_id, vector, metadata)
+        
+        with _file_lock(self._lock_path):
+            f = self._open()
+            f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+        self.pending += 1
+    
+    def replay(self) -> List[LogRecord]:
+        """
+        Read every valid record, rotated log first
+        
+        Returns:
+            List of (movie_id, vector, metadata) in append order
+        """
+        records: List[LogRecord] = []
+        with _file_lock(self._lock_path):
+            for path in (self.rotated_path, self.path):
+                if path.exists():
+                    records.extend(self._read(path))
+        
+        self.pending = len(records)
+        return records
+    
+    def read_rotated(self) -> List[LogRecord]:
+        """
+        Read the rotated log, which may hold records appended by other processes
+        
+        Returns:
+            List of (movie_id, vector, metadata) in append order
+        """
+        with _file_lock(self._lock_path):
+            if not self.rotated_path.exists():
+                return []
+            return self._read(self.rotated_path)
+    
+    def _read(self, path: Path) -> List[LogRecord]:
+        """Read records from one log file, truncating a torn tail"""
+        records: List[LogRecord] = []
+        good_offset = 0
+        
+        with open(path, "rb") as f:
+            data = f.read()
+        
+        offset = 0
+        while offset + _HEADER.size <= len(data):
+            magic, length, crc = _HEADER.unpack_from(data, offset)
+            start = offset + _HEADER.size
+            payload = data[start:start + length]
+            if magic != _MAGIC or len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            
+            movie_id, dimension = _PAYLOAD_PREFIX.unpack_from(payload, 0)
+            vector_end = _PAYLOAD_PREFIX.size + dimension * 4
+            vector = np.frombuffer(payload[_PAYLOAD_PREFIX.size:vector_end], dtype='float32').copy()
+            metadata = json.loads(payload[vector_end:].decode("utf-8"))
+            records.append((movie_id, vector, metadata))
+            
+            offset = start + length
+            good_offset = offset
+        
+        if good_offset < len(data):
+            logger.warning(
+                f"Discarding {len(data) - good_offset} bytes of torn/corrupt records in {path}"
+            )
+            with open(path, "r+b") as f:
+                f.truncate(good_offset)
+                os.fsync(f.fileno())
+        
+        return records
+    
+    def rotate(self):
+        """
+        Move the active log aside before a snapshot is taken
+        
+        Records appended afterwards go to a fresh log. If a previous compaction did not
+        finish, the active log is folded into the pending rotated one.
+        """
+        self.close()
+        self.pending = 0
+        with _file_lock(self._lock_path):
+            if not self.path.exists():
+                return
+            
+            if self.rotated_path.exists():
+                # Append the valid records only, after the rotated log's own valid records: a
+                # torn tail left in the middle would make replay stop there and drop what follows
+                self._read(self.rotated_path)
+                records = self._read(self.path)
+                with open(self.rotated_path, "ab") as dst:
+                    dst.write(b"".join(_encode(*record) for record in records))
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                self.path.unlink()
+            else:
+                os.replace(self.path, self.rotated_path)
+    
+    def discard_rotated(self):
+        """Delete the rotated log once its records are part of a snapshot"""
+        with _file_lock(self._lock_path):
+            if self.rotated_path.exists():
+                self.rotated_path.unlink()
@@ -1,18 +1,49 @@
 """
 Embedding Service - Generates and manages movie embeddings using SentenceTransformers
 """
+import asyncio
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Tuple, Union
 import logging
 import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from contextlib import contextmanager
+from functools import partial
 
 from app.core.config import settings
+from app.services.embedding_store import EmbeddingStore, write_npy
+from app.services.embedding_log import EmbeddingLog
+from app.services.metadata_store import MetadataStore
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.embedding_backends import create_backend
+from app.services.embedding_cache import EmbeddingCache
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever create_embedding_text changes, so cached vectors are not reused
+EMBEDDING_TEXT_VERSION = 1
+
+# Name prefix of the inference executor threads
+_INFERENCE_THREAD_PREFIX = "inference"
+
+# Rated rows gathered at once when building user profiles (small enough for the dense
+# users x rows weight block to stay cheap)
+PROFILE_GATHER_ROWS = 256
+
+
+@contextmanager
+def _atomic_write(path: str, mode: str):
+    """Write a file through a temporary sibling that atomically replaces it once fsynced"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, mode) as f:
+        yield f
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
 
 class EmbeddingService:
     """Service for generating and managing movie embeddings"""
@@ -20,16 +51,71 @@ class EmbeddingService:
     def __init__(self):
         self.model_name = settings.EMBEDDING_MODEL_NAME
         self.dimension = settings.EMBEDDING_DIMENSION
-        self.model: Optional[SentenceTransformer] = None
-        self.embeddings: Optional[np.ndarray] = None
+        # Inference backend (torch, onnx or onnx-int8), see embedding_backends
+        self.backend_name = settings.EMBEDDING_BACKEND
+        self.model = None
+        # Vectors of already encoded texts, keyed on model + template version + text
+        self.embedding_cache = EmbeddingCache(
+            settings.EMBEDDING_CACHE_PATH,
+            model_key=f"{self.model_name}/{self.backend_name}",
+            template_version=EMBEDDING_TEXT_VERSION,
+            enabled=settings.EMBEDDING_CACHE_ENABLED
+        )
+        # Growable float32 matrix; exposed as `embeddings`
+        self._store = EmbeddingStore(self.dimension)
         self.movie_ids: List[int] = []
-        self.movies_metadata: Dict[int, Dict[str, Any]] = {}
+        # Columnar metadata aligned with the embedding rows (a Mapping of movie_id -> dict)
+        self.movies_metadata = MetadataStore(settings.MOVIES_DOCS_PATH)
+        # movie_id -> row in self.embeddings, kept in sync with self.movie_ids
+        self._row_by_id: Dict[int, int] = {}
+        # Sorted (ids, rows) arrays for vectorized lookups, rebuilt lazily after changes
+        self._sorted_ids: Optional[np.ndarray] = None
+        self._sorted_rows: Optional[np.ndarray] = None
+        # Write-ahead log of movies added since the last snapshot
+        self.log = EmbeddingLog(settings.EMBEDDING_LOG_PATH)
+        # (mtime, metadata generation) of the snapshot last loaded or saved by this process
+        self._snapshot_stamp: Optional[Tuple[int, int]] = None
+        # Guards in-memory mutations against snapshots and searches running in worker threads
+        self.lock = threading.RLock()
+        # Threads running model inference, so encodes never block the event loop
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Coalesces concurrent single-text encodes into batched model calls
+        self.batcher = EmbeddingBatcher(
+            self._encode_on_executor,
+            max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+            max_wait_ms=settings.EMBEDDING_BATCH_MAX_WAIT_MS
+        )
+        # Same for free-text queries, which must stay out of the movie embedding cache
+        self.uncached_batcher = EmbeddingBatcher(
+            partial(self._encode_on_executor, use_cache=False),
+            max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+            max_wait_ms=settings.EMBEDDING_BATCH_MAX_WAIT_MS
+        )
+        
+    @property
+    def embeddings(self) -> Optional[np.ndarray]:
+        """
+        Embedding matrix (one row per movie in movie_ids order), or None if empty
         
+        Prefer get_vectors for row lookups: when movies were added on top of a
+        memory-mapped snapshot, this builds a private copy of the whole matrix.
+        """
+        return self._store.array
+    
+    @embeddings.setter
+    def embeddings(self, matrix: Optional[np.ndarray]):
+        self._store.replace(matrix)
+    
     def load_model(self):
-        """Load the SentenceTransformer model"""
+        """Load the embedding model with the configured inference backend"""
         if self.model is None:
-            logger.info(f"Loading embedding model: {self.model_name}")
-            self.model = SentenceTransformer(self.model_name)
+            logger.info(f"Loading embedding model: {self.model_name} ({self.backend_name} backend)")
+            self.model = create_backend(
+                self.backend_name,
+                self.model_name,
+                settings.ONNX_EXPORT_DIR,
+                max_seq_length=settings.EMBEDDING_MAX_SEQ_LENGTH
+            )
             logger.info("Embedding model loaded successfully")
     
     def create_embedding_text(self, movie_data: Dict[str, Any]) -> str:
@@ -71,17 +157,106 @@ Director: {director}
         Returns:
             Normalized embedding vector
         """
-        if self.model is None:
-            self.load_model()
+        return self._encode_blocking([text])[0]
+    
+    def encode_texts(
+        self,
+        texts: List[str],
+        show_progress_bar: bool = False,
+        use_cache: bool = True
+    ) -> np.ndarray:
+        """
+        Generate embeddings for several texts in one model call
         
-        # Generate embedding with normalization
-        embedding = self.model.encode(
-            text,
-            normalize_embeddings=True,
-            show_progress_bar=False
-        )
+        Texts found in the embedding cache are not encoded again.
+        
+        Args:
+            texts: Texts to embed
+            show_progress_bar: Display encoding progress
+            use_cache: Read and fill the persistent embedding cache (off for user input)
         
-        return embedding.astype('float32')
+        Returns:
+            Normalized embedding matrix (len(texts), dimension)
+        """
+        embeddings = np.empty((len(texts), self.dimension), dtype='float32')
+        
+        cached = self.embedding_cache.get_many(texts) if use_cache else [None] * len(texts)
+        misses: Dict[str, List[int]] = {}
+        for i, (text, vector) in enumerate(zip(texts, cached)):
+            if vector is None:
+                misses.setdefault(text, []).append(i)
+            else:
+                embeddings[i] = vector
+        
+        if misses:
+            if self.model is None:
+                self.load_model()
+            
+            # Every backend returns L2-normalized float32 rows
+            miss_texts = list(misses)
+            encoded = np.asarray(self.model.encode(
+                miss_texts,
+                batch_size=32,
+                show_progress_bar=show_progress_bar
+            ), dtype='float32').reshape(len(miss_texts), self.dimension)
+            
+            for text, vector in zip(miss_texts, encoded):
+                embeddings[misses[text]] = vector
+            if use_cache:
+                self.embedding_cache.put_many(miss_texts, encoded)
+        
+        return embeddings
+    
+    async def encode_async(self, texts: Union[str, List[str]], use_cache: bool = True) -> np.ndarray:
+        """
+        Generate embeddings on the inference executor without blocking the event loop
+        
+        Single texts are micro-batched with other concurrent requests.
+        
+        Args:
+            texts: A text (returns a vector) or a list of texts (returns a matrix)
+            use_cache: Go through the persistent embedding cache (off for user input)
+        
+        Returns:
+            Normalized embedding vector or matrix
+        """
+        if isinstance(texts, str):
+            batcher = self.batcher if use_cache else self.uncached_batcher
+            return await batcher.encode(texts)
+        return await self._encode_on_executor(texts, use_cache=use_cache)
+    
+    async def _encode_on_executor(self, texts: List[str], use_cache: bool = True) -> np.ndarray:
+        """Run encode_texts on the inference executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(),
+            partial(self.encode_texts, texts, use_cache=use_cache)
+        )
+    
+    def _encode_blocking(self, texts: List[str], show_progress_bar: bool = False) -> np.ndarray:
+        """Run encode_texts on the inference executor and wait (for synchronous callers)"""
+        if threading.current_thread().name.startswith(_INFERENCE_THREAD_PREFIX):
+            # Already on an inference thread: waiting on the pool could deadlock it
+            return self.encode_texts(texts, show_progress_bar=show_progress_bar)
+        return self._get_executor().submit(self.encode_texts, texts, show_progress_bar).result()
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Inference executor, the only threads calling the model"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.INFERENCE_WORKERS,
+                thread_name_prefix=_INFERENCE_THREAD_PREFIX
+            )
+        return self._executor
+    
+    def shutdown(self):
+        """Stop the micro-batchers and the inference executor"""
+        self.batcher.close()
+        self.uncached_batcher.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.embedding_cache.close()
     
     def generate_movie_embedding(self, movie_data: Dict[str, Any]) -> np.ndarray:
         """
@@ -109,9 +284,6 @@ Director: {director}
         Returns:
             Tuple of (embeddings array, movie IDs list)
         """
-        if self.model is None:
-            self.load_model()
-        
         logger.info(f"Generating embeddings for {len(movies_data)} movies")
         
         # Create embedding texts
@@ -123,17 +295,12 @@ Director: {director}
         # Get movie IDs
         movie_ids = [movie["id"] for movie in movies_data]
         
-        # Generate embeddings in batch
-        embeddings = self.model.encode(
-            embedding_texts,
-            normalize_embeddings=True,
-            show_progress_bar=True,
-            batch_size=32
-        )
+        # Generate embeddings in batch, on the inference executor like async callers
+        embeddings = self._encode_blocking(embedding_texts, show_progress_bar=True)
         
         logger.info("Embeddings generated successfully")
         
-        return embeddings.astype('float32'), movie_ids
+        return embeddings, movie_ids
     
     def create_user_profile_embedding(
         self,
@@ -148,106 +315,281 @@ Director: {director}
         Returns:
             User profile embedding vector or None if movies not found
         """
-        if self.embeddings is None or len(self.movie_ids) == 0:
+        if len(self._store) == 0 or len(self.movie_ids) == 0:
             logger.error("Embeddings not loaded")
             return None
         
-        embeddings_list = []
-        weights_list = []
+        indptr, rows, weights, missing_ids = self._ratings_matrix([rated_movies])
+        for movie_id in missing_ids:
+            logger.warning(f"Movie ID {movie_id} not found in embeddings")
         
-        for item in rated_movies:
-            movie_id = item.movie_id
-            rating = item.rating
-            
-            try:
-                idx = self.movie_ids.index(movie_id)
-                embeddings_list.append(self.embeddings[idx])
-                # Ensure rating is at least a small positive value if we want to include it, 
-                # or treat 0 as "ignore". But user wants 0-10.
-                # If rating is 0, it contributes 0 to the sum.
-                weights_list.append(max(0.0, float(rating)))
-            except ValueError:
-                logger.warning(f"Movie ID {movie_id} not found in embeddings")
-        
-        if not embeddings_list:
+        if len(rows) == 0:
             logger.error("None of the selected movies found in embeddings")
             return None
         
-        # Convert to numpy arrays
-        embeddings_matrix = np.vstack(embeddings_list)
-        weights_array = np.array(weights_list).reshape(-1, 1)
+        profiles, _ = self._weighted_profiles(indptr, rows, weights)
+        return profiles[0]
+    
+    def create_user_profile_embeddings(
+        self,
+        users_rated_movies: List[List[Any]]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Create the profiles of many users at once (same weighting as create_user_profile_embedding)
+        
+        Args:
+            users_rated_movies: One list of RatedMovie objects per user
+            
+        Returns:
+            Tuple of (profiles matrix (n_users, dimension), boolean mask of users with a profile)
+        """
+        if len(self._store) == 0 or len(users_rated_movies) == 0:
+            n_users = len(users_rated_movies)
+            return np.zeros((n_users, self.dimension), dtype='float32'), np.zeros(n_users, dtype=bool)
         
-        # Calculate weighted average
-        total_weight = np.sum(weights_array)
+        indptr, rows, weights, _ = self._ratings_matrix(users_rated_movies)
+        return self._weighted_profiles(indptr, rows, weights)
+    
+    def _ratings_matrix(
+        self,
+        users_rated_movies: List[List[Any]]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Build the sparse (users x movies) weight matrix of rated movies, in CSR form
         
-        if total_weight > 0:
-            weighted_sum = np.sum(embeddings_matrix * weights_array, axis=0)
-            user_profile = weighted_sum / total_weight
-        else:
-            # Fallback to simple mean if total weight is 0
-            user_profile = np.mean(embeddings_matrix, axis=0)
+        Columns are embedding rows. Ratings are clamped at 0; users whose ratings are
+        all 0 get uniform weights (simple mean). Unknown movies are dropped.
+        
+        Args:
+            users_rated_movies: One list of RatedMovie objects per user
+            
+        Returns:
+            Tuple of (indptr, embedding rows, weights, unknown movie IDs)
+        """
+        n_users = len(users_rated_movies)
+        counts = np.fromiter((len(items) for items in users_rated_movies), dtype=np.int64, count=n_users)
+        movie_ids = np.fromiter(
+            (item.movie_id for items in users_rated_movies for item in items),
+            dtype=np.int64,
+            count=int(counts.sum())
+        )
+        ratings = np.fromiter(
+            (item.rating for items in users_rated_movies for item in items),
+            dtype='float32',
+            count=len(movie_ids)
+        )
+        users = np.repeat(np.arange(n_users), counts)
+        
+        rows, missing = self.lookup_rows(movie_ids)
+        rows, weights, users = rows[~missing], np.maximum(ratings[~missing], 0.0), users[~missing]
+        
+        total_weight = np.bincount(users, weights=weights, minlength=n_users)
+        weights = np.where(total_weight[users] > 0, weights, 1.0).astype('float32')
+        
+        indptr = np.zeros(n_users + 1, dtype=np.int64)
+        np.cumsum(np.bincount(users, minlength=n_users), out=indptr[1:])
+        
+        return indptr, rows, weights, movie_ids[missing]
+    
+    def _weighted_profiles(
+        self,
+        indptr: np.ndarray,
+        rows: np.ndarray,
+        weights: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Sparse (users x movies) weights times the embedding matrix, row-normalized
+        
+        Rated rows are gathered in blocks of about PROFILE_GATHER_ROWS (bounded memory);
+        each block's CSR slice is expanded into a dense (users x rows) weight block, so the
+        block's profiles are one W @ vectors product. Sums are then divided by the users'
+        total weights.
+        
+        Returns:
+            Tuple of (profiles matrix (n_users, dimension), boolean mask of users with a profile)
+        """
+        n_users = len(indptr) - 1
+        profiles = np.zeros((n_users, self.dimension), dtype='float32')
+        has_profile = np.diff(indptr) > 0
+        
+        user = 0
+        while user < n_users:
+            end = int(np.searchsorted(indptr, indptr[user] + PROFILE_GATHER_ROWS, side='right')) - 1
+            end = min(n_users, max(end, user + 1))
+            offset, stop = indptr[user], indptr[end]
+            if stop > offset:
+                block = np.zeros((end - user, stop - offset), dtype='float32')
+                block_users = np.repeat(np.arange(end - user), np.diff(indptr[user:end + 1]))
+                block[block_users, np.arange(stop - offset)] = weights[offset:stop]
+                profiles[user:end] = block @ self._store.take(rows[offset:stop])
+            user = end
+        
+        # Weighted average (_ratings_matrix already turned all-zero ratings into a plain mean)
+        if has_profile.any():
+            starts = indptr[:-1][has_profile]
+            profiles[has_profile] /= np.add.reduceat(weights, starts)[:, None]
         
         # Re-normalize
-        norm = np.linalg.norm(user_profile)
-        if norm > 1e-9:
-            user_profile = user_profile / norm
-        else:
-            user_profile = np.zeros_like(user_profile)
+        norms = np.linalg.norm(profiles, axis=1, keepdims=True)
+        profiles = np.where(norms > 1e-9, profiles / np.maximum(norms, 1e-9), 0.0).astype('float32')
         
-        return user_profile.astype('float32')
+        return profiles, has_profile
     
-    def save_embeddings(self):
-        """Save embeddings and metadata to disk"""
+    def save_embeddings(self) -> List[int]:
+        """
+        Save a snapshot of embeddings and metadata to disk (safe to call from a worker thread)
+        
+        The write-ahead log is rotated while the snapshot is captured and only discarded
+        once both snapshot files have been atomically replaced. When several processes
+        share the data directory, compactions run one at a time and each first takes in
+        the movies the others logged or saved, so the snapshot never drops them.
+        
+        Returns:
+            IDs of the movies taken in from other processes (not in the FAISS index yet)
+        """
+        merged_ids: List[int] = []
         try:
-            # Create data directory if it doesn't exist
-            data_dir = Path(settings.EMBEDDINGS_PATH).parent
-            data_dir.mkdir(parents=True, exist_ok=True)
-            
-            # Save embeddings
-            np.save(settings.EMBEDDINGS_PATH, self.embeddings)
-            logger.info(f"Embeddings saved to {settings.EMBEDDINGS_PATH}")
-            
-            # Save movie IDs and metadata
-            metadata = {
-                "movie_ids": self.movie_ids,
-                "movies_metadata": self.movies_metadata
-            }
+            with self.log.compacting():
+                # Capture a consistent snapshot; later additions go to the fresh log
+                with self.lock:
+                    merged_ids = self._absorb_snapshot()
+                    self.log.rotate()
+                    merged_ids += self._apply_log_records(self.log.read_rotated())
+                    segments = self._store.segments()
+                    metadata = self.movies_metadata.snapshot()
+                
+                if not segments:
+                    logger.warning("No embeddings to save")
+                    return merged_ids
+                
+                # Create data directory if it doesn't exist
+                data_dir = Path(settings.EMBEDDINGS_PATH).parent
+                data_dir.mkdir(parents=True, exist_ok=True)
+                
+                # Save embeddings (streamed, so a memory-mapped base is never copied in memory)
+                with _atomic_write(settings.EMBEDDINGS_PATH, 'wb') as f:
+                    write_npy(f, segments, self.dimension)
+                logger.info(f"Embeddings saved to {settings.EMBEDDINGS_PATH}")
+                
+                # Save new metadata documents, then the metadata columns (which carry the movie IDs)
+                with _atomic_write(settings.MOVIES_COLUMNS_PATH, 'wb') as f:
+                    self.movies_metadata.write_snapshot(metadata, f)
+                logger.info(f"Metadata saved to {settings.MOVIES_COLUMNS_PATH}")
+                
+                self.log.discard_rotated()
+                with self.lock:
+                    self.movies_metadata.mark_saved(metadata)
+                    self._stamp_snapshot()
             
-            with open(settings.MOVIES_METADATA_PATH, 'w') as f:
-                json.dump(metadata, f)
-            logger.info(f"Metadata saved to {settings.MOVIES_METADATA_PATH}")
+            # Swap private rows for the shared mapping of the new snapshot
+            if settings.EMBEDDINGS_MMAP:
+                with self.lock:
+                    self._store.set_base(self._load_matrix())
             
         except Exception as e:
             logger.error(f"Error saving embeddings: {e}")
+        
+        return merged_ids
+    
+    def _stamp_snapshot(self):
+        """Remember which snapshot this process's catalog contains (caller holds self.lock)"""
+        self._snapshot_stamp = (
+            os.stat(settings.MOVIES_COLUMNS_PATH).st_mtime_ns,
+            self.movies_metadata.generation
+        )
+    
+    def _absorb_snapshot(self) -> List[int]:
+        """
+        Add the movies of a snapshot saved by another process since ours (caller holds self.lock)
+        
+        Returns:
+            IDs of the movies added
+        """
+        if self._snapshot_stamp is None or not os.path.exists(settings.MOVIES_COLUMNS_PATH):
+            return []
+        mtime, generation = self._snapshot_stamp
+        if os.stat(settings.MOVIES_COLUMNS_PATH).st_mtime_ns == mtime or generation != self.movies_metadata.generation:
+            # Unchanged on disk, or this process replaced its catalog since (re-initialization wins)
+            return []
+        
+        on_disk = MetadataStore(settings.MOVIES_DOCS_PATH)
+        try:
+            on_disk.load(settings.MOVIES_COLUMNS_PATH)
+            embeddings = np.load(settings.EMBEDDINGS_PATH, mmap_mode='r')
+            count = min(len(embeddings), len(on_disk))
+            rows = np.flatnonzero(self.lookup_rows(on_disk.ids[:count])[1])
+            if not len(rows):
+                return []
+            
+            movie_ids = on_disk.ids[rows].tolist()
+            docs = on_disk.get_many(movie_ids)
+            self.add_embeddings(
+                movie_ids,
+                np.asarray(embeddings[rows], dtype='float32'),
+                [docs.get(movie_id, {"id": movie_id}) for movie_id in movie_ids]
+            )
+        finally:
+            on_disk.close()
+        
+        logger.info(f"Took in {len(movie_ids)} movies from a snapshot saved by another process")
+        return movie_ids
     
     def load_embeddings(self) -> bool:
         """
-        Load embeddings and metadata from disk
+        Load the embeddings snapshot from disk and replay the write-ahead log over it
         
         Returns:
             True if successful, False otherwise
         """
         try:
+            migrated = False
+            
             # Check if files exist
             if not os.path.exists(settings.EMBEDDINGS_PATH):
                 logger.warning("Embeddings file not found")
-                return False
-            
-            if not os.path.exists(settings.MOVIES_METADATA_PATH):
+            elif os.path.exists(settings.MOVIES_COLUMNS_PATH):
+                embeddings = self._load_matrix()
+                
+                # Load metadata columns (documents stay in SQLite until requested)
+                with self.lock:
+                    self.movies_metadata.load(settings.MOVIES_COLUMNS_PATH)
+                    
+                    # A crash between the two snapshot renames can leave one file ahead of the
+                    # other: keep the common prefix, the log replay below restores the rest
+                    count = min(len(embeddings), len(self.movies_metadata))
+                    self.movies_metadata.truncate(count)
+                    self._set_matrix(embeddings[:count])
+                    self.movie_ids = self.movies_metadata.ids.tolist()
+                    self._rebuild_id_index()
+                    self._stamp_snapshot()
+                self._log_loaded(embeddings)
+            elif os.path.exists(settings.MOVIES_METADATA_PATH):
+                embeddings = self._load_matrix()
+                
+                # Legacy JSON metadata: import it, then rewrite it in the columnar format
+                logger.info(f"Migrating {settings.MOVIES_METADATA_PATH} to the columnar metadata store")
+                with open(settings.MOVIES_METADATA_PATH, 'r') as f:
+                    metadata = json.load(f)
+                movie_ids = metadata["movie_ids"]
+                movies_metadata = {
+                    int(k): v for k, v in metadata["movies_metadata"].items()
+                }
+                
+                count = min(len(embeddings), len(movie_ids))
+                self.set_catalog(embeddings[:count], movie_ids[:count], movies_metadata)
+                self._log_loaded(embeddings)
+                migrated = True
+            else:
                 logger.warning("Metadata file not found")
-                return False
             
-            # Load embeddings
-            self.embeddings = np.load(settings.EMBEDDINGS_PATH)
-            logger.info(f"Loaded {len(self.embeddings)} embeddings")
+            with self.lock:
+                self._apply_log_records(self.log.replay())
             
-            # Load metadata
-            with open(settings.MOVIES_METADATA_PATH, 'r') as f:
-                metadata = json.load(f)
-                self.movie_ids = metadata["movie_ids"]
-                self.movies_metadata = {
-                    int(k): v for k, v in metadata["movies_metadata"].items()
-                }
+            if migrated:
+                self.save_embeddings()
+            
+            if len(self._store) == 0 or len(self.movie_ids) == 0:
+                return False
             
             logger.info("Embeddings and metadata loaded successfully")
             return True
@@ -256,16 +598,145 @@ Director: {director}
             logger.error(f"Error loading embeddings: {e}")
             return False
     
+    def _log_loaded(self, embeddings: np.ndarray):
+        logger.info(
+            f"Loaded {len(self.movie_ids)} embeddings"
+            f"{' (memory-mapped)' if isinstance(embeddings, np.memmap) else ''}"
+        )
+    
+    def _load_matrix(self) -> np.ndarray:
+        """Open the embeddings snapshot, read-only memory-mapped when EMBEDDINGS_MMAP is set"""
+        if not settings.EMBEDDINGS_MMAP:
+            return np.load(settings.EMBEDDINGS_PATH).astype('float32', copy=False)
+        
+        embeddings = np.load(settings.EMBEDDINGS_PATH, mmap_mode='r')
+        if embeddings.dtype != np.float32 or not embeddings.flags.c_contiguous:
+            # Legacy snapshot layout: fall back to an in-memory float32 copy
+            logger.warning("Embeddings snapshot is not C-ordered float32, loading it in memory")
+            return np.ascontiguousarray(embeddings, dtype='float32')
+        return embeddings
+    
+    def _apply_log_records(self, records: List[Tuple[int, np.ndarray, Dict[str, Any]]]) -> List[int]:
+        """
+        Re-apply logged movies that are missing from the catalog (caller holds self.lock)
+        
+        Returns:
+            IDs of the movies added
+        """
+        movie_ids, vectors, metadata = [], [], []
+        seen = set()
+        for movie_id, vector, movie_metadata in records:
+            if self.has_movie(movie_id) or movie_id in seen:
+                continue
+            seen.add(movie_id)
+            movie_ids.append(movie_id)
+            vectors.append(vector)
+            metadata.append(movie_metadata)
+        
+        if movie_ids:
+            self.add_embeddings(movie_ids, np.vstack(vectors), metadata)
+            logger.info(f"Replayed {len(movie_ids)} movies from the embedding log")
+        return movie_ids
+    
     def get_movie_metadata(self, movie_id: int) -> Optional[Dict[str, Any]]:
         """Get metadata for a specific movie"""
         return self.movies_metadata.get(movie_id)
+    
+    def set_catalog(
+        self,
+        embeddings: np.ndarray,
+        movie_ids: List[int],
+        movies_metadata: Dict[int, Dict[str, Any]]
+    ):
+        """
+        Replace the whole in-memory catalog (e.g. after re-initialization)
+        
+        Args:
+            embeddings: Embedding matrix, one row per movie
+            movie_ids: Movie IDs in row order
+            movies_metadata: Metadata keyed by movie ID
+        """
+        with self.lock:
+            self._set_matrix(embeddings)
+            self.movie_ids = list(movie_ids)
+            self.movies_metadata.reset(self.movie_ids, movies_metadata)
+            self._rebuild_id_index()
+    
+    def _set_matrix(self, embeddings: np.ndarray):
+        """Replace the embedding rows"""
+        if isinstance(embeddings, np.memmap):
+            # Keep the shared read-only mapping instead of copying it
+            self._store.replace(None)
+            self._store.set_base(embeddings)
+        else:
+            self.embeddings = embeddings
+    
+    def _rebuild_id_index(self):
+        """Rebuild the movie_id -> row map from self.movie_ids"""
+        self._row_by_id = {movie_id: row for row, movie_id in enumerate(self.movie_ids)}
+        self._sorted_ids = None
+        self._sorted_rows = None
+    
+    def get_vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Gather embedding rows (works across memory-mapped and in-memory segments)"""
+        return self._store.take(rows)
+    
+    def get_vector_range(self, start: int, stop: int) -> np.ndarray:
+        """
+        Contiguous embedding rows, a view when they lie in one segment
+        
+        Stored rows are never modified in place (appends and catalog swaps install new
+        buffers), so the result stays valid after embedding_service.lock is released.
+        """
+        return self._store.slice(start, stop)
+    
+    def has_movie(self, movie_id: int) -> bool:
+        """Check whether a movie has an embedding"""
+        return movie_id in self._row_by_id
+    
+    def get_row(self, movie_id: int) -> Optional[int]:
+        """Get the embedding row of a movie, or None if unknown"""
+        return self._row_by_id.get(movie_id)
+    
+    def lookup_rows(self, movie_ids: Iterable[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Vectorized movie_id -> row lookup
+        
+        Args:
+            movie_ids: Movie IDs to look up
+            
+        Returns:
+            Tuple of (rows array with -1 for unknown IDs, boolean mask of unknown IDs)
+        """
+        if isinstance(movie_ids, np.ndarray):
+            ids = movie_ids.astype(np.int64, copy=False)
+        else:
+            ids = np.fromiter(movie_ids, dtype=np.int64)
+        
+        if self._sorted_ids is None:
+            known_ids = np.fromiter(self._row_by_id.keys(), dtype=np.int64, count=len(self._row_by_id))
+            known_rows = np.fromiter(self._row_by_id.values(), dtype=np.int64, count=len(self._row_by_id))
+            order = np.argsort(known_ids)
+            self._sorted_ids = known_ids[order]
+            self._sorted_rows = known_rows[order]
+        
+        if len(self._sorted_ids) == 0:
+            return np.full(len(ids), -1, dtype=np.int64), np.ones(len(ids), dtype=bool)
+        
+        positions = np.searchsorted(self._sorted_ids, ids)
+        positions = np.minimum(positions, len(self._sorted_ids) - 1)
+        missing = self._sorted_ids[positions] != ids
+        rows = np.where(missing, -1, self._sorted_rows[positions])
+        
+        return rows, missing
 
 
     def add_single_movie_embedding(
         self,
         movie_id: int,
         embedding: np.ndarray,
-        metadata: Dict[str, Any]
+        metadata: Dict[str, Any],
+        persist: bool = False
     ):
         """
         Add a single movie embedding to the in-memory store
@@ -274,16 +745,43 @@ Director: {director}
             movie_id: ID of the movie
             embedding: Embedding vector
             metadata: Movie metadata
+            persist: Also append it to the write-ahead log (cheap, fsynced)
         """
-        if self.embeddings is None:
-            self.embeddings = np.array([embedding])
-        else:
-            self.embeddings = np.vstack([self.embeddings, embedding])
-            
-        self.movie_ids.append(movie_id)
-        self.movies_metadata[movie_id] = metadata
+        with self.lock:
+            if persist:
+                self.log.append(movie_id, embedding, metadata)
+            self.add_embeddings([movie_id], embedding.reshape(1, -1), [metadata])
         
         logger.info(f"Added temporary embedding for movie ID {movie_id}")
+    
+    def add_embeddings(
+        self,
+        movie_ids: List[int],
+        embeddings: np.ndarray,
+        metadata: List[Dict[str, Any]]
+    ):
+        """
+        Append several movie embeddings to the in-memory store (amortized O(d) per movie)
+        
+        Args:
+            movie_ids: IDs of the movies
+            embeddings: Embedding matrix, one row per movie
+            metadata: Movie metadata, aligned with movie_ids
+        """
+        if not (len(movie_ids) == len(embeddings) == len(metadata)):
+            raise ValueError("movie_ids, embeddings and metadata must have the same length")
+        
+        with self.lock:
+            first_row = len(self.movie_ids)
+            self._store.append(embeddings)
+            
+            for offset, (movie_id, movie_metadata) in enumerate(zip(movie_ids, metadata)):
+                self._row_by_id[movie_id] = first_row + offset
+                self.movies_metadata.append(movie_id, movie_metadata)
+            self.movie_ids.extend(movie_ids)
+            
+            self._sorted_ids = None
+            self._sorted_rows = None
 
 
 # Global instance
@@ -0,0 +1,182 @@
+"""
+Embedding Store - Growable float32 matrix backing the embedding service
+"""
+import numpy as np
+from typing import List, Optional
+
+
+class EmbeddingStore:
+    """
+    Row-appendable float32 matrix with amortized O(d) inserts
+    
+    Rows live in two segments:
+        - an optional read-only base (typically the memory-mapped `embeddings.npy` snapshot,
+          shared by every worker through the page cache)
+        - a private tail buffer whose capacity doubles when full
+    
+    Appending never copies the whole matrix except on the (logarithmically rare) growth
+    steps of the tail. `take` gathers rows across both segments without materializing
+    the matrix; `array` only copies when both segments are non-empty.
+    """
+    
+    def __init__(self, dimension: int, initial_capacity: int = 1024):
+        self.dimension = dimension
+        self.initial_capacity = max(1, initial_capacity)
+        self._base: Optional[np.ndarray] = None
+        self._buffer: Optional[np.ndarray] = None
+        self._tail_size = 0
+    
+    def __len__(self) -> int:
+        return self._base_size + self._tail_size
+    
+    @property
+    def _base_size(self) -> int:
+        return 0 if self._base is None else len(self._base)
+    
+    @property
+    def capacity(self) -> int:
+        return self._base_size + (0 if self._buffer is None else len(self._buffer))
+    
+    @property
+    def is_memory_mapped(self) -> bool:
+        return isinstance(self._base, np.memmap)
+    
+    @property
+    def array(self) -> Optional[np.ndarray]:
+        """
+        The logical matrix, or None if nothing was ever stored
+        
+        Zero-copy unless a tail was appended on top of a base, in which case the
+        concatenation is built on demand (callers should not hold on to it).
+        """
+        if self._base is None and self._buffer is None:
+            return None
+        if self._tail_size == 0 and self._base is not None:
+            return self._base
+        if self._base is None:
+            return self._buffer[:self._tail_size]
+        return np.concatenate([self._base, self._buffer[:self._tail_size]])
+    
+    def take(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Gather rows across segments without materializing the matrix
+        
+        Args:
+            rows: Row indices
+        
+        Returns:
+            Array of shape (len(rows), dimension)
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if self._base is None:
+            return self._buffer[rows]
+        if self._tail_size == 0:
+            return np.asarray(self._base[rows])
+        
+        out = np.empty((len(rows), self.dimension), dtype='float32')
+        in_base = rows < self._base_size
+        out[in_base] = self._base[rows[in_base]]
+        out[~in_base] = self._buffer[rows[~in_base] - self._base_size]
+        return out
+    
+    def slice(self, start: int, stop: Optional[int] = None) -> np.ndarray:
+        """Get a contiguous range of rows (a view when it lies in one segment)"""
+        stop = len(self) if stop is None else stop
+        if start >= self._base_size:
+            if self._buffer is None:
+                return np.empty((0, self.dimension), dtype='float32')
+            return self._buffer[start - self._base_size:stop - self._base_size]
+        if stop <= self._base_size:
+            return self._base[start:stop]
+        return self.take(np.arange(start, stop))
+    
+    def reserve(self, capacity: int):
+        """Make sure the tail can grow to a total of `capacity` rows without reallocating"""
+        tail_capacity = capacity - self._base_size
+        current = 0 if self._buffer is None else len(self._buffer)
+        if tail_capacity <= current:
+            return
+        
+        new_capacity = max(current, self.initial_capacity)
+        while new_capacity < tail_capacity:
+            new_capacity *= 2
+        
+        buffer = np.empty((new_capacity, self.dimension), dtype='float32')
+        if self._buffer is not None and self._tail_size:
+            buffer[:self._tail_size] = self._buffer[:self._tail_size]
+        self._buffer = buffer
+    
+    def append(self, vectors: np.ndarray):
+        """
+        Append one vector (1D) or several (2D) at the end of the matrix
+        
+        Args:
+            vectors: Embedding vector(s) of size `dimension`
+        """
+        vectors = np.asarray(vectors, dtype='float32').reshape(-1, self.dimension)
+        count = len(vectors)
+        
+        self.reserve(len(self) + count)
+        self._buffer[self._tail_size:self._tail_size + count] = vectors
+        self._tail_size += count
+    
+    def replace(self, matrix: Optional[np.ndarray]):
+        """Replace the whole matrix with an in-memory copy (None clears it)"""
+        self._base = None
+        self._buffer = None
+        self._tail_size = 0
+        
+        if matrix is not None:
+            self.append(matrix)
+    
+    def set_base(self, base: np.ndarray):
+        """
+        Use a read-only matrix (e.g. np.load(..., mmap_mode='r')) as the store content, without copying
+        
+        Rows beyond the end of the new base are kept in the tail, so a snapshot written
+        while rows were still being appended can be swapped in safely.
+        """
+        if len(base) > len(self) and len(self) > 0:
+            raise ValueError("Base snapshot is larger than the store")
+        
+        extra = self.slice(len(base)).copy() if len(self) > len(base) else None
+        
+        self._base = base
+        self._buffer = None
+        self._tail_size = 0
+        if extra is not None:
+            self.append(extra)
+    
+    def segments(self) -> List[np.ndarray]:
+        """
+        Get the stored rows as a list of arrays to write out
+        
+        The base is immutable and shared; the tail is copied so the result stays
+        consistent while more rows are appended.
+        """
+        segments = []
+        if self._base is not None:
+            segments.append(self._base)
+        if self._tail_size:
+            segments.append(self._buffer[:self._tail_size].copy())
+        return segments
+
+
+def write_npy(f, segments: List[np.ndarray], dimension: int):
+    """
+    Stream row segments to an open binary file as a single C-ordered float32 .npy array
+    
+    The .npy header is padded so the data starts on a 64-byte boundary, which lets
+    readers memory-map the matrix directly.
+    """
+    rows = sum(len(segment) for segment in segments)
+    header = {"descr": np.lib.format.dtype_to_descr(np.dtype('float32')),
+              "fortran_order": False,
+              "shape": (rows, dimension)}
+    np.lib.format.write_array_header_1_0(f, header)
+    
+    for segment in segments:
+        # Write in chunks so memory-mapped segments never need to be fully resident
+        for start in range(0, len(segment), 65536):
+            chunk = np.ascontiguousarray(segment[start:start + 65536], dtype='float32')
+            f.write(chunk.tobytes())
@@ -2,106 +2,586 @@
 FAISS Service - Manages vector similarity search using FAISS
 """
 import faiss
+import hashlib
+import json
+import math
+import time
 import numpy as np
-from typing import List, Tuple, Optional
+from typing import Any, Dict, List, Tuple, Optional
 import logging
 import os
+import threading
 from pathlib import Path
 
 from app.core.config import settings
+from app.services.cache import LRUCache
 
 logger = logging.getLogger(__name__)
 
+INDEX_TYPES = ("flat", "ivf-flat", "ivf-pq", "hnsw")
+
+# FAISS k-means wants at least this many training points per centroid
+_MIN_POINTS_PER_CENTROID = 39
+
+# Distinct allowed-ID sets (filter combinations) whose search selector is kept around
+_SELECTOR_CACHE_SIZE = 64
+
 
 class FAISSService:
-    """Service for vector similarity search using FAISS"""
+    """
+    Service for vector similarity search using FAISS
+    
+    Vectors are stored under their TMDB movie id (IndexIDMap2), so searches return
+    movie ids directly and movies can be removed or re-embedded without rebuilding.
+    """
     
     def __init__(self):
         self.dimension = settings.EMBEDDING_DIMENSION
         self.index: Optional[faiss.Index] = None
         self.is_trained = False
+        self.index_type: Optional[str] = None
+        # Recall@k of the current (approximate) index against an exact scan, if measured
+        self.recall: Optional[Dict[str, Any]] = None
+        # Bumped on every change of the indexed vectors (keys caches of search results)
+        self.version = 0
+        # Serializes index mutations with searches and snapshots running in worker threads
+        self._lock = threading.Lock()
+        # (selector, bitmap) per allowed-ID set, keyed by a digest of the IDs (used under _lock)
+        self._selectors = LRUCache(max_entries=_SELECTOR_CACHE_SIZE)
     
-    def create_index(self, embeddings: np.ndarray):
+    def create_index(
+        self,
+        embeddings: np.ndarray,
+        movie_ids: List[int],
+        index_type: Optional[str] = None
+    ):
         """
         Create a new FAISS index from embeddings
         
         Args:
             embeddings: Array of embedding vectors (n_samples, dimension)
+            movie_ids: Movie ID of each row
+            index_type: One of INDEX_TYPES; defaults to settings.FAISS_INDEX_TYPE ("auto" picks by size)
         """
-        logger.info(f"Creating FAISS index with {len(embeddings)} vectors")
+        index_type = self._select_index_type(len(embeddings), index_type or settings.FAISS_INDEX_TYPE)
+        logger.info(f"Creating {index_type} FAISS index with {len(embeddings)} vectors")
         
-        # Use IndexFlatIP for inner product (cosine similarity with normalized vectors)
-        # This is faster and works well with normalized embeddings
-        self.index = faiss.IndexFlatIP(self.dimension)
+        # Inner product everywhere (cosine similarity with normalized vectors)
+        base = self._build_index(index_type, len(embeddings))
         
-        # Add vectors to index
-        self.index.add(embeddings)
-        self.is_trained = True
+        # Train coarse quantizers / codebooks on a sample
+        if not base.is_trained:
+            base.train(self._training_sample(embeddings))
+        
+        # Store vectors under their movie IDs
+        index = faiss.IndexIDMap2(base)
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        
+        # Add vectors to index (in chunks, so a memory-mapped matrix is never fully copied)
+        for start in range(0, len(embeddings), 65536):
+            index.add_with_ids(
+                np.ascontiguousarray(embeddings[start:start + 65536], dtype='float32'),
+                movie_ids[start:start + 65536]
+            )
+        
+        self._configure_search(index)
+        
+        with self._lock:
+            self.index = index
+            self.index_type = index_type
+            self.is_trained = True
+            self.recall = None
+            self.version += 1
         
         logger.info(f"FAISS index created with {self.index.ntotal} vectors")
+        
+        if index_type != "flat" and settings.FAISS_RECALL_QUERIES > 0:
+            self.recall = self.recall_report(embeddings, movie_ids)
+            logger.info(
+                f"{index_type} recall@{self.recall['k']} vs flat: {self.recall['recall_at_k']:.3f} "
+                f"({self.recall['index_ms_per_query']:.2f} ms vs {self.recall['exact_ms_per_query']:.2f} ms per query)"
+            )
+    
+    def _select_index_type(self, num_vectors: int, index_type: str) -> str:
+        """Resolve "auto" by catalog size and fall back when there is too little data to train"""
+        if index_type == "auto":
+            if num_vectors < settings.FAISS_AUTO_FLAT_MAX_VECTORS:
+                index_type = "flat"
+            elif num_vectors < settings.FAISS_AUTO_HNSW_MAX_VECTORS:
+                index_type = "hnsw"
+            else:
+                index_type = "ivf-pq"
+        
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown FAISS index type '{index_type}', expected one of {', '.join(INDEX_TYPES)}")
+        
+        # PQ trains 256 centroids per sub-quantizer
+        if index_type == "ivf-pq" and num_vectors < 256 * _MIN_POINTS_PER_CENTROID:
+            logger.warning(f"Too few vectors ({num_vectors}) to train PQ codebooks, using ivf-flat")
+            index_type = "ivf-flat"
+        if index_type.startswith("ivf") and num_vectors < 2 * _MIN_POINTS_PER_CENTROID:
+            logger.warning(f"Too few vectors ({num_vectors}) to train an IVF index, using flat")
+            index_type = "flat"
+        
+        return index_type
+    
+    def _build_index(self, index_type: str, num_vectors: int) -> faiss.Index:
+        """Instantiate an empty index of the given type"""
+        if index_type == "flat":
+            return faiss.IndexFlatIP(self.dimension)
+        
+        if index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(self.dimension, settings.FAISS_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = settings.FAISS_HNSW_EF_CONSTRUCTION
+            return index
+        
+        # Rule of thumb: ~4 * sqrt(n) inverted lists, each with enough training points
+        nlist = settings.FAISS_NLIST or int(4 * math.sqrt(num_vectors))
+        nlist = max(1, min(nlist, num_vectors // _MIN_POINTS_PER_CENTROID))
+        
+        if index_type == "ivf-flat":
+            description = f"IVF{nlist},Flat"
+        else:
+            description = f"IVF{nlist},PQ{settings.FAISS_PQ_M}"
+        return faiss.index_factory(self.dimension, description, faiss.METRIC_INNER_PRODUCT)
+    
+    def _training_sample(self, embeddings: np.ndarray) -> np.ndarray:
+        """Random subset of rows used to train the index"""
+        size = min(len(embeddings), settings.FAISS_TRAIN_SAMPLE_SIZE)
+        rows = np.sort(np.random.default_rng(0).choice(len(embeddings), size=size, replace=False))
+        return np.ascontiguousarray(embeddings[rows], dtype='float32')
+    
+    @staticmethod
+    def _unwrap(index: faiss.Index) -> faiss.Index:
+        """The storage index behind the ID map"""
+        index = faiss.downcast_index(index)
+        if isinstance(index, faiss.IndexIDMap2):
+            index = faiss.downcast_index(index.index)
+        return index
+    
+    def _configure_search(self, index: faiss.Index):
+        """Apply the nprobe / efSearch knobs"""
+        index = self._unwrap(index)
+        if isinstance(index, faiss.IndexIVF):
+            index.nprobe = min(settings.FAISS_NPROBE, index.nlist)
+        elif isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efSearch = settings.FAISS_HNSW_EF_SEARCH
+    
+    @staticmethod
+    def _describe(index: faiss.Index) -> str:
+        """Strategy name of a (possibly loaded) index"""
+        index = FAISSService._unwrap(index)
+        if isinstance(index, faiss.IndexHNSW):
+            return "hnsw"
+        if isinstance(index, faiss.IndexIVFPQ):
+            return "ivf-pq"
+        if isinstance(index, faiss.IndexIVF):
+            return "ivf-flat"
+        return "flat"
+    
+    def _search_params(self, selector: faiss.IDSelector, effort: int = 1) -> faiss.SearchParameters:
+        """
+        Search parameters restricting results to a selector
+        
+        Explicit parameters override the index's own nprobe / efSearch, so they are
+        carried over (scaled by `effort` when a filtered search needs to dig deeper).
+        """
+        index = self._unwrap(self.index)
+        if isinstance(index, faiss.IndexIVF):
+            return faiss.SearchParametersIVF(sel=selector, nprobe=min(index.nlist, index.nprobe * effort))
+        if isinstance(index, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch * effort)
+        return faiss.SearchParameters(sel=selector)
+    
+    def recall_report(
+        self,
+        embeddings: np.ndarray,
+        movie_ids: List[int],
+        k: int = 10,
+        num_queries: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Measure recall@k of the current index against an exact (flat) scan
+        
+        Args:
+            embeddings: The indexed embedding matrix
+            movie_ids: Movie ID of each row
+            k: Number of neighbors compared
+            num_queries: Catalog rows used as queries (default settings.FAISS_RECALL_QUERIES)
+            
+        Returns:
+            Dict with recall_at_k and per-query latencies of both searches
+        """
+        num_queries = min(num_queries or settings.FAISS_RECALL_QUERIES, len(embeddings))
+        k = min(k, len(embeddings))
+        rows = np.sort(np.random.default_rng(1).choice(len(embeddings), size=num_queries, replace=False))
+        queries = np.ascontiguousarray(embeddings[rows], dtype='float32')
+        
+        started_at = time.perf_counter()
+        _, exact_rows = faiss.knn(queries, np.ascontiguousarray(embeddings, dtype='float32'), k,
+                                  metric=faiss.METRIC_INNER_PRODUCT)
+        exact = np.asarray(movie_ids, dtype=np.int64)[exact_rows]
+        exact_seconds = time.perf_counter() - started_at
+        
+        started_at = time.perf_counter()
+        with self._lock:
+            _, approx = self.index.search(queries, k)
+        index_seconds = time.perf_counter() - started_at
+        
+        hits = sum(len(np.intersect1d(a, e)) for a, e in zip(approx, exact))
+        
+        return {
+            "index_type": self.index_type,
+            "k": k,
+            "queries": num_queries,
+            "recall_at_k": hits / (num_queries * k),
+            "exact_ms_per_query": exact_seconds * 1000 / num_queries,
+            "index_ms_per_query": index_seconds * 1000 / num_queries
+        }
     
-    def add_vectors(self, embeddings: np.ndarray):
+    def add_vectors(self, embeddings: np.ndarray, movie_ids: List[int]):
         """
         Add new vectors to the existing index
         
         Args:
             embeddings: Array of embedding vectors to add
+            movie_ids: Movie ID of each vector
         """
         if self.index is None:
             # If no index exists, create one
-            self.create_index(embeddings)
+            self.create_index(embeddings, movie_ids)
             return
-
+        
         logger.info(f"Adding {len(embeddings)} vectors to FAISS index")
         
         # Add to index
-        self.index.add(embeddings)
+        with self._lock:
+            self.index.add_with_ids(
+                np.ascontiguousarray(embeddings, dtype='float32'),
+                np.asarray(movie_ids, dtype=np.int64)
+            )
+            self.version += 1
         
         logger.info(f"FAISS index updated, now contains {self.index.ntotal} vectors")
-
+    
+    def remove_ids(self, movie_ids: List[int]) -> int:
+        """
+        Remove movies from the index
+        
+        Args:
+            movie_ids: Movie IDs to remove (unknown IDs are ignored)
+            
+        Returns:
+            Number of vectors removed
+        """
+        if self.index is None or len(movie_ids) == 0:
+            return 0
+        
+        with self._lock:
+            removed = self._remove(np.asarray(movie_ids, dtype=np.int64))
+        
+        logger.info(f"Removed {removed} vectors from FAISS index")
+        return removed
+    
+    def replace_vectors(self, embeddings: np.ndarray, movie_ids: List[int]):
+        """
+        Replace the vectors of re-embedded movies in place (movies not indexed yet are added)
+        
+        Args:
+            embeddings: New embedding vectors
+            movie_ids: Movie ID of each vector
+        """
+        self.update_vectors([], embeddings, movie_ids)
+    
+    def update_vectors(self, removed_ids: List[int], embeddings: np.ndarray, movie_ids: List[int]):
+        """
+        Remove some movies and add or replace others in one step
+        
+        Index types that cannot delete nodes (HNSW) are rebuilt once for the whole change,
+        rather than once for the removals and again for the replacements.
+        
+        Args:
+            removed_ids: Movie IDs to remove (unknown IDs are ignored)
+            embeddings: New embedding vectors
+            movie_ids: Movie ID of each new vector (already indexed ones are replaced)
+        """
+        if self.index is None:
+            self.create_index(embeddings, movie_ids)
+            return
+        
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32').reshape(len(movie_ids), self.index.d)
+        dropped = np.union1d(np.asarray(removed_ids, dtype=np.int64), movie_ids)
+        with self._lock:
+            if self._supports_removal():
+                self._remove_in_place(dropped)
+                self.index.add_with_ids(embeddings, movie_ids)
+            else:
+                self._rebuild(dropped, embeddings, movie_ids)
+            self.version += 1
+        
+        logger.info(f"FAISS index updated: {len(removed_ids)} removed, {len(movie_ids)} added or replaced")
+    
+    def _supports_removal(self) -> bool:
+        """Whether vectors can be deleted in place (HNSW graphs cannot delete nodes)"""
+        return not isinstance(self._unwrap(self.index), faiss.IndexHNSW)
+    
+    def _remove(self, movie_ids: np.ndarray) -> int:
+        """Remove IDs from the index (caller holds _lock)"""
+        if self._supports_removal():
+            removed = self._remove_in_place(movie_ids)
+        else:
+            removed = self._rebuild(movie_ids)
+        if removed:
+            self.version += 1
+        return removed
+    
+    def _remove_in_place(self, movie_ids: np.ndarray) -> int:
+        """Delete IDs from an index that supports removal (caller holds _lock)"""
+        positions = np.flatnonzero(np.isin(faiss.vector_to_array(self.index.id_map), movie_ids))
+        removed = self.index.remove_ids(movie_ids)
+        
+        ivf = faiss.try_extract_index_ivf(self.index.index)
+        if ivf is not None and removed:
+            # IndexIDMap2 compacts its id map, but IVF lists keep the old internal ids:
+            # shift them down so they still point at the right movie
+            for list_no in range(ivf.nlist):
+                size = ivf.invlists.list_size(list_no)
+                if size:
+                    ids = faiss.rev_swig_ptr(ivf.invlists.get_ids(list_no), size)
+                    ids -= np.searchsorted(positions, ids)
+        return removed
+    
+    def _rebuild(
+        self,
+        dropped_ids: np.ndarray,
+        embeddings: Optional[np.ndarray] = None,
+        movie_ids: Optional[np.ndarray] = None
+    ) -> int:
+        """
+        Rebuild the index from its own stored vectors minus some IDs, plus new vectors
+        (caller holds _lock)
+        
+        Returns:
+            Number of stored vectors dropped
+        """
+        labels = faiss.vector_to_array(self.index.id_map)
+        keep = ~np.isin(labels, dropped_ids)
+        removed = int(np.count_nonzero(~keep))
+        if removed == 0:
+            # Nothing to drop: new vectors can go straight into the graph
+            if movie_ids is not None:
+                self.index.add_with_ids(embeddings, movie_ids)
+            return 0
+        
+        vectors = self._unwrap(self.index).reconstruct_n(0, self.index.ntotal)[keep]
+        labels = labels[keep]
+        if movie_ids is not None:
+            vectors = np.vstack([vectors, embeddings])
+            labels = np.concatenate([labels, movie_ids])
+        logger.warning(
+            f"{self.index_type} index does not support removal, rebuilding it "
+            f"({removed} vectors dropped, {len(labels)} indexed)"
+        )
+        
+        base = self._build_index(self.index_type, len(vectors))
+        if not base.is_trained:
+            base.train(self._training_sample(vectors))
+        index = faiss.IndexIDMap2(base)
+        index.add_with_ids(vectors, labels)
+        self._configure_search(index)
+        
+        self.index = index
+        return removed
+    
+    def indexed_ids(self) -> np.ndarray:
+        """Movie IDs currently stored in the index (in storage order)"""
+        if self.index is None:
+            return np.empty(0, dtype=np.int64)
+        with self._lock:
+            return faiss.vector_to_array(self.index.id_map).copy()
+    
+    def sync_with_embeddings(self, embeddings: Optional[np.ndarray], movie_ids: List[int]):
+        """
+        Bring the index in line with the embedding matrix (e.g. after a log replay on startup)
+        
+        Movies are matched by ID, not by position, so the index may store them in any
+        order (removals and replacements reorder it).
+        
+        Args:
+            embeddings: Full embedding matrix
+            movie_ids: Movie ID of each row
+        """
+        if embeddings is None or len(embeddings) == 0:
+            return
+        
+        if self.index is None:
+            logger.warning("FAISS index missing, building it")
+            self.create_index(embeddings, movie_ids)
+            return
+        
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        indexed = self.indexed_ids()
+        stale = indexed[~np.isin(indexed, movie_ids)]
+        missing = ~np.isin(movie_ids, indexed)
+        if len(stale) or missing.any():
+            self.update_vectors(stale, embeddings[missing], movie_ids[missing])
+    
     def search(
         self,
         query_vector: np.ndarray,
         k: int = 10,
-        exclude_indices: Optional[List[int]] = None
+        exclude_ids: Optional[List[int]] = None,
+        allowed_ids: Optional[np.ndarray] = None
     ) -> Tuple[np.ndarray, np.ndarray]:
         """
         Search for k nearest neighbors
         
         Args:
-            query_vector: Query embedding vector (1D or 2D)
+            query_vector: Query embedding vector (1D or 2D with one row)
             k: Number of neighbors to return
-            exclude_indices: Indices to exclude from results (e.g., input movies)
+            exclude_ids: Movie IDs to exclude from results (e.g., input movies)
+            allowed_ids: Optional movie IDs; only those can be returned
             
         Returns:
-            Tuple of (distances, indices)
+            Tuple of (similarities, movie IDs)
+        """
+        distances, ids = self.search_batch(
+            query_vector.reshape(1, -1),
+            k=k,
+            exclude_ids=[exclude_ids or []],
+            allowed_ids=allowed_ids
+        )[0]
+        
+        return distances.reshape(1, -1), ids.reshape(1, -1)
+    
+    def search_batch(
+        self,
+        query_vectors: np.ndarray,
+        k: int = 10,
+        exclude_ids: Optional[List[List[int]]] = None,
+        allowed_ids: Optional[np.ndarray] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Search nearest neighbors of many queries with a single FAISS call
+        
+        Args:
+            query_vectors: Query embedding matrix (n_queries, dimension)
+            k: Number of neighbors to return per query
+            exclude_ids: Movie IDs to exclude, one list per query
+            allowed_ids: Optional movie IDs shared by all queries; only those can be returned
+            
+        Returns:
+            One tuple of (similarities, movie IDs) per query
         """
         if self.index is None:
             raise ValueError("Index not created. Call create_index first.")
         
-        # Ensure query vector is 2D
-        if query_vector.ndim == 1:
-            query_vector = query_vector.reshape(1, -1)
+        query_vectors = np.ascontiguousarray(query_vectors, dtype='float32')
         
         # Search for more results if we need to exclude some
-        search_k = k
-        if exclude_indices:
-            search_k = k + len(exclude_indices)
+        search_k = k + max((len(ids) for ids in exclude_ids), default=0) if exclude_ids else k
         
-        # Perform search
-        distances, indices = self.index.search(query_vector, search_k)
+        # Searches may run in worker threads while vectors are being added
+        with self._lock:
+            if allowed_ids is not None:
+                allowed_ids = np.asarray(allowed_ids, dtype=np.int64)
+                search_k = min(search_k, len(allowed_ids))
+                if search_k == 0:
+                    empty = (np.empty(0, dtype='float32'), np.empty(0, dtype=np.int64))
+                    return [empty] * len(query_vectors)
+                distances, ids = self._search_allowed(query_vectors, search_k, allowed_ids)
+            else:
+                # Perform search
+                distances, ids = self.index.search(query_vectors, search_k)
         
-        # Exclude specified indices
-        if exclude_indices:
-            exclude_set = set(exclude_indices)
-            mask = np.array([idx not in exclude_set for idx in indices[0]])
-            distances = distances[0][mask][:k].reshape(1, -1)
-            indices = indices[0][mask][:k].reshape(1, -1)
+        # Drop padding (fewer matches than k) and excluded movies
+        results = []
+        for row in range(len(query_vectors)):
+            keep = ids[row] >= 0
+            if exclude_ids and exclude_ids[row]:
+                keep &= ~np.isin(ids[row], np.asarray(exclude_ids[row], dtype=np.int64))
+            results.append((distances[row][keep][:k], ids[row][keep][:k]))
         
-        return distances, indices
+        return results
+    
+    def _search_allowed(
+        self,
+        query_vectors: np.ndarray,
+        k: int,
+        allowed_ids: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search restricted to the given movie IDs (caller holds _lock)
+        
+        The IDs are pushed down into FAISS as an IDSelectorBitmap over the ID space, so
+        the scan skips filtered-out vectors and returns min(k, matches) results per query.
+        Index types that do not support selectors fall back to re-searching with a growing k.
+        Results are padded with -1 IDs.
+        """
+        try:
+            selector = self._selector(allowed_ids)
+            effort = 1
+            while True:
+                distances, ids = self.index.search(query_vectors, k, params=self._search_params(selector, effort))
+                # Approximate indexes can miss matches of very selective filters: probe deeper
+                found = np.count_nonzero(ids >= 0, axis=1)
+                if self.index_type == "flat" or np.all(found >= k) or effort >= 64:
+                    break
+                effort *= 4
+        except (TypeError, RuntimeError) as e:
+            logger.debug(f"Index does not support ID selectors, re-searching instead: {e}")
+            distances, ids = self._search_growing(query_vectors, k, allowed_ids)
+        
+        return distances, ids
+    
+    def _selector(self, allowed_ids: np.ndarray) -> faiss.IDSelector:
+        """
+        Bitmap selector over the ID space of some allowed IDs (caller holds _lock)
+        
+        The bitmap spans every ID up to the largest allowed one (TMDB IDs go past a
+        million), so it is built once per distinct ID set rather than on every query.
+        """
+        key = hashlib.blake2b(allowed_ids.tobytes(), digest_size=16).digest()
+        cached = self._selectors.get(key)
+        if cached is None:
+            bitmap = np.zeros(int(allowed_ids.max()) // 8 + 1, dtype=np.uint8)
+            np.bitwise_or.at(bitmap, allowed_ids >> 3, np.left_shift(1, allowed_ids & 7).astype(np.uint8))
+            # The selector only points at the bitmap: keep both alive together
+            cached = (faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap)), bitmap)
+            self._selectors.set(key, cached)
+        return cached[0]
+    
+    def _search_growing(
+        self,
+        query_vectors: np.ndarray,
+        k: int,
+        allowed_ids: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Search with a growing k until k neighbors are allowed (or the index is exhausted)"""
+        ntotal = self.index.ntotal
+        # Start from the expected number of neighbors needed at the filter's selectivity
+        selectivity = min(1.0, len(allowed_ids) / ntotal)
+        
+        out_distances = np.zeros((len(query_vectors), k), dtype='float32')
+        out_ids = np.full((len(query_vectors), k), -1, dtype=np.int64)
+        for row in range(len(query_vectors)):
+            search_k = min(ntotal, max(2 * k, int(k / selectivity)))
+            while True:
+                distances, ids = self.index.search(query_vectors[row:row + 1], search_k)
+                keep = (ids[0] >= 0) & np.isin(ids[0], allowed_ids)
+                if np.count_nonzero(keep) >= k or search_k >= ntotal:
+                    break
+                search_k = min(ntotal, search_k * 4)
+            
+            found = min(k, np.count_nonzero(keep))
+            out_distances[row, :found] = distances[0][keep][:k]
+            out_ids[row, :found] = ids[0][keep][:k]
+        
+        return out_distances, out_ids
     
     def save_index(self):
-        """Save FAISS index to disk"""
+        """Save FAISS index to disk atomically (safe to call from a worker thread)"""
         if self.index is None:
             logger.warning("No index to save")
             return
@@ -111,10 +591,20 @@ class FAISSService:
             index_path = Path(settings.FAISS_INDEX_PATH)
             index_path.parent.mkdir(parents=True, exist_ok=True)
             
-            # Save index
-            faiss.write_index(self.index, str(index_path))
+            # Save index to a temporary file, then swap it in
+            tmp_path = f"{index_path}.tmp"
+            with self._lock:
+                faiss.write_index(self.index, tmp_path)
+                recall = self.recall
+            os.replace(tmp_path, index_path)
             logger.info(f"FAISS index saved to {index_path}")
             
+            # Keep the recall report next to the index so it survives restarts
+            recall_path = self._recall_path()
+            with open(f"{recall_path}.tmp", "w") as f:
+                json.dump(recall, f)
+            os.replace(f"{recall_path}.tmp", recall_path)
+        
         except Exception as e:
             logger.error(f"Error saving FAISS index: {e}")
     
@@ -133,16 +623,45 @@ class FAISSService:
                 return False
             
             # Load index
-            self.index = faiss.read_index(index_path)
-            self.is_trained = True
+            index = faiss.read_index(index_path)
+            if not isinstance(faiss.downcast_index(index), faiss.IndexIDMap2):
+                logger.warning("FAISS index was saved without movie IDs, it will be rebuilt")
+                return False
+            self._configure_search(index)
+            
+            index_type = self._describe(index)
+            recall = self._load_recall(index_type)
+            
+            with self._lock:
+                self.index = index
+                self.index_type = index_type
+                self.is_trained = True
+                self.recall = recall
+                self.version += 1
             
             logger.info(f"FAISS index loaded with {self.index.ntotal} vectors")
             return True
-            
+        
         except Exception as e:
             logger.error(f"Error loading FAISS index: {e}")
             return False
     
+    def _recall_path(self) -> str:
+        """Path of the recall report saved with the index"""
+        return f"{settings.FAISS_INDEX_PATH}.recall.json"
+    
+    def _load_recall(self, index_type: str) -> Optional[Dict[str, Any]]:
+        """Read the recall report saved with the index, if it matches the loaded index type"""
+        try:
+            with open(self._recall_path()) as f:
+                recall = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        if not recall or recall.get("index_type") != index_type:
+            return None
+        return recall
+    
     def get_index_stats(self) -> dict:
         """Get statistics about the current index"""
         if self.index is None:
@@ -155,7 +674,10 @@ class FAISSService:
         return {
             "is_trained": self.is_trained,
             "total_vectors": self.index.ntotal,
-            "dimension": self.dimension
+            "dimension": self.dimension,
+            "index_type": self.index_type,
+            "recall": self.recall,
+            "version": self.version
         }
 
 
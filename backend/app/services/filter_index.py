@@ -0,0 +1,281 @@
+"""
+Filter Index - Inverted indexes over the metadata columns for filters and facet counts
+"""
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from app.services.metadata_store import MetadataStore
+from app.services.text_index import TrigramIndex
+
+logger = logging.getLogger(__name__)
+
+# Number of set bits of every byte value, to count rows of packed bitsets
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.int64)
+
+# Rows appended since the last build are scanned from the columns until they exceed
+# this share of the catalog (on-the-fly additions never trigger a full rebuild)
+_MAX_TAIL_FRACTION = 0.125
+_MIN_TAIL_ROWS = 4096
+
+
+def _to_bits(rows: np.ndarray, size: int) -> np.ndarray:
+    """Packed bitset (little bit order) of the given rows"""
+    mask = np.zeros(size, dtype=bool)
+    mask[rows] = True
+    return np.packbits(mask, bitorder='little')
+
+
+class _Postings:
+    """Rows of each term id (CSR), sorted by row within a term"""
+    
+    def __init__(self, term_ids: np.ndarray, rows: np.ndarray, num_terms: int):
+        order = np.argsort(term_ids, kind='stable')
+        self.rows = rows[order]
+        self.offsets = np.zeros(num_terms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=num_terms), out=self.offsets[1:])
+    
+    def rows_of(self, term_ids: List[int]) -> np.ndarray:
+        """Rows holding any of the term ids (terms unknown at build time have none)"""
+        slices = [
+            self.rows[self.offsets[term_id]:self.offsets[term_id + 1]]
+            for term_id in term_ids if term_id < len(self.offsets) - 1
+        ]
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+
+class _RangeIndex:
+    """Rows sorted by a numeric column, so range queries are two binary searches"""
+    
+    def __init__(self, values: np.ndarray):
+        self.order = np.argsort(values, kind='stable')
+        self.sorted = values[self.order]
+    
+    def rows_between(self, low=None, high=None) -> np.ndarray:
+        """Rows with low <= value <= high (either bound optional)"""
+        start = 0 if low is None else np.searchsorted(self.sorted, low, side='left')
+        stop = len(self.sorted) if high is None else np.searchsorted(self.sorted, high, side='right')
+        return self.order[start:stop]
+
+
+class FilterIndex:
+    """
+    Inverted indexes over a MetadataStore, evaluated as bitset intersections
+    
+    - genre id -> packed bitset of rows
+    - person id (cast, director) -> rows, and a trigram index over the accent-folded
+      person names to resolve name queries into person ids
+    - year, vote average and runtime -> rows sorted by value (range queries)
+    
+    The indexes cover the first `size` rows; rows appended since (on-the-fly
+    additions) are checked directly against the columns until the tail grows past
+    a fraction of the catalog, and a reset of the store (new generation) triggers a
+    rebuild. Callers serialize access with the store's writers (embedding_service.lock).
+    """
+    
+    def __init__(self, metadata: MetadataStore):
+        self.metadata = metadata
+        self.size = 0
+        self._generation: Optional[int] = None
+        self.genre_bits: List[np.ndarray] = []
+        self.cast_postings: Optional[_Postings] = None
+        self.director_postings: Optional[_Postings] = None
+        self.years: Optional[_RangeIndex] = None
+        self.vote_averages: Optional[_RangeIndex] = None
+        self.runtimes: Optional[_RangeIndex] = None
+        # Trigram index over the person vocabulary (entry id = person id)
+        self.person_names = TrigramIndex()
+    
+    def sync(self):
+        """Rebuild after a reset or once too many rows were appended"""
+        metadata = self.metadata
+        tail = len(metadata) - self.size
+        if (
+            self._generation != metadata.generation
+            or tail < 0
+            or tail > max(_MIN_TAIL_ROWS, self.size * _MAX_TAIL_FRACTION)
+        ):
+            self.build()
+        
+        names = metadata.person_vocab.names
+        for name in names[len(self.person_names):]:
+            self.person_names.add(name)
+    
+    def build(self):
+        """Index every row of the store"""
+        metadata = self.metadata
+        size = len(metadata)
+        rows = np.arange(size, dtype=np.int64)
+        
+        genres = _Postings(
+            metadata.genres.values.values,
+            np.repeat(rows, np.diff(metadata.genres.offsets.values)),
+            len(metadata.genre_vocab)
+        )
+        self.genre_bits = [
+            _to_bits(genres.rows_of([genre_id]), size) for genre_id in range(len(metadata.genre_vocab))
+        ]
+        
+        self.cast_postings = _Postings(
+            metadata.cast.values.values,
+            np.repeat(rows, np.diff(metadata.cast.offsets.values)),
+            len(metadata.person_vocab)
+        )
+        directed = metadata.director_ids >= 0
+        self.director_postings = _Postings(
+            metadata.director_ids[directed],
+            rows[directed],
+            len(metadata.person_vocab)
+        )
+        
+        self.years = _RangeIndex(metadata.years)
+        self.vote_averages = _RangeIndex(metadata.vote_averages)
+        self.runtimes = _RangeIndex(metadata.runtimes)
+        
+        self.person_names.build(metadata.person_vocab.names)
+        self.size = size
+        self._generation = metadata.generation
+        logger.info(f"Filter index built over {size} movies")
+    
+    def match_persons(self, query: str) -> List[int]:
+        """Person ids whose name contains the query (case and accent insensitive, typo tolerant)"""
+        return self.person_names.match(query)
+    
+    def compile(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Evaluate filters as an intersection of row bitsets
+        
+        Args:
+            filters: Filter criteria (genre, year, min_rating, actor, director, min_runtime, max_runtime)
+        
+        Returns:
+            Boolean mask over rows, or None when no filter is set
+        """
+        if not filters or not any(filters.values()):
+            return None
+        
+        self.sync()
+        metadata = self.metadata
+        size = self.size
+        # Packed bitset over the indexed rows, plain mask over the appended tail
+        bits = np.full((size + 7) // 8, 0xFF, dtype=np.uint8)
+        tail = np.ones(len(metadata) - size, dtype=bool)
+        
+        def intersect(criterion: Tuple[np.ndarray, np.ndarray]):
+            nonlocal bits, tail
+            bits &= criterion[0]
+            tail &= criterion[1]
+        
+        # Genre filter
+        if filters.get("genre"):
+            genre_id = metadata.genre_vocab.get(filters["genre"])
+            if genre_id is None:
+                return np.zeros(len(metadata), dtype=bool)
+            intersect((
+                self.genre_bits[genre_id] if genre_id < len(self.genre_bits) else np.zeros_like(bits),
+                metadata.genres.contains_any([genre_id], start=size)
+            ))
+        
+        # Year filter (min_year); movies without a release date (year 0) never match
+        if filters.get("year"):
+            try:
+                min_year = max(int(filters["year"]), 1)
+                intersect(self._range(self.years, metadata.years, low=min_year))
+            except ValueError:
+                pass
+        
+        # Minimum rating filter
+        if filters.get("min_rating"):
+            min_rating = np.float32(float(filters["min_rating"]))
+            intersect(self._range(self.vote_averages, metadata.vote_averages, low=min_rating))
+        
+        # Actor filter (partial, accent-insensitive match) resolved to person ids
+        if filters.get("actor"):
+            person_ids = self.match_persons(filters["actor"])
+            intersect((
+                _to_bits(self.cast_postings.rows_of(person_ids), size),
+                metadata.cast.contains_any(person_ids, start=size)
+            ))
+        
+        # Director filter (same matching as actors)
+        if filters.get("director"):
+            person_ids = self.match_persons(filters["director"])
+            intersect((
+                _to_bits(self.director_postings.rows_of(person_ids), size),
+                np.isin(metadata.director_ids[size:], person_ids)
+            ))
+        
+        # Runtime filter
+        if filters.get("min_runtime"):
+            intersect(self._range(self.runtimes, metadata.runtimes, low=int(filters["min_runtime"])))
+        
+        if filters.get("max_runtime"):
+            intersect(self._range(self.runtimes, metadata.runtimes, high=int(filters["max_runtime"])))
+        
+        mask = np.empty(len(metadata), dtype=bool)
+        mask[:size] = np.unpackbits(bits, count=size, bitorder='little')
+        mask[size:] = tail
+        return mask
+    
+    def _range(self, index: _RangeIndex, column: np.ndarray, low=None, high=None) -> Tuple[np.ndarray, np.ndarray]:
+        """Bitset of indexed rows and mask of tail rows with low <= value <= high"""
+        tail = np.ones(len(column) - self.size, dtype=bool)
+        if low is not None:
+            tail &= column[self.size:] >= low
+        if high is not None:
+            tail &= column[self.size:] <= high
+        return _to_bits(index.rows_between(low, high), self.size), tail
+    
+    def facets(self, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Count matching movies per genre, decade and rating
+        
+        Each facet ignores its own filter (the genre counts apply every filter but the
+        genre), so the counts tell how many movies each alternative choice would yield.
+        
+        Args:
+            filters: Current filter criteria
+        
+        Returns:
+            Dict with the total and the counts of each facet
+        """
+        filters = {key: value for key, value in (filters or {}).items() if value}
+        self.sync()
+        metadata = self.metadata
+        
+        def matching(ignored: str) -> np.ndarray:
+            mask = self.compile({key: value for key, value in filters.items() if key != ignored})
+            return np.ones(len(metadata), dtype=bool) if mask is None else mask
+        
+        # Genres: popcount of (genre bitset & mask) over indexed rows, column scan over the tail
+        mask = matching("genre")
+        mask_bits = np.packbits(mask[:self.size], bitorder='little')
+        genre_counts = np.zeros(len(metadata.genre_vocab), dtype=np.int64)
+        for genre_id, genre_bits in enumerate(self.genre_bits):
+            genre_counts[genre_id] = _POPCOUNT[genre_bits & mask_bits].sum()
+        tail_start = metadata.genres.offsets.values[self.size]
+        tail_values = metadata.genres.values.values[tail_start:]
+        tail_rows = np.repeat(
+            np.arange(self.size, len(metadata)),
+            np.diff(metadata.genres.offsets.values[self.size:])
+        )
+        genre_counts += np.bincount(tail_values[mask[tail_rows]], minlength=len(genre_counts))
+        
+        # Decades of known release years
+        years = metadata.years[matching("year")]
+        decades, decade_counts = np.unique((years[years > 0] // 10) * 10, return_counts=True)
+        
+        # Rating buckets (floor of the vote average)
+        ratings = np.clip(np.floor(metadata.vote_averages[matching("min_rating")]), 0, 10).astype(np.int64)
+        rating_counts = np.bincount(ratings, minlength=11)
+        
+        total = self.compile(filters)
+        return {
+            "total": int(len(metadata) if total is None else np.count_nonzero(total)),
+            "genres": {
+                metadata.genre_vocab.names[genre_id]: int(genre_counts[genre_id])
+                for genre_id in np.argsort(-genre_counts, kind='stable') if genre_counts[genre_id] > 0
+            },
+            "decades": {str(decade): int(count) for decade, count in zip(decades, decade_counts)},
+            "ratings": {str(rating): int(count) for rating, count in enumerate(rating_counts) if count > 0}
+        }
@@ -0,0 +1,208 @@
+"""
+Ingestion Service - Streaming, rate-limited catalog ingestion pipeline
+"""
+import asyncio
+import time
+import numpy as np
+from typing import List, Dict, Any, Optional, Callable
+import logging
+
+from app.core.config import settings
+from app.services.embedding_service import embedding_service
+from app.services.tmdb_service import tmdb_service
+
+logger = logging.getLogger(__name__)
+
+# Sentinel marking the end of a queue stream
+_DONE = None
+
+
+class IngestionPipeline:
+    """
+    Streaming pipeline building the movie catalog from TMDB
+    
+    Stages:
+        1. Page producer: walks popular then top rated list pages and enqueues unseen movie IDs
+        2. Detail fetchers: bounded pool fetching complete movie data (rate-limited by TMDBService)
+        3. Embedding consumer: encodes movies in batches as they arrive
+    
+    The producer holds one "slot" per enqueued movie and fetchers give the slot back when a
+    fetch fails, so the pipeline keeps pulling pages until exactly `num_movies` are ingested
+    (or the sources run dry).
+    """
+    
+    def __init__(
+        self,
+        num_movies: int,
+        concurrency: int = settings.INGESTION_CONCURRENCY,
+        batch_size: int = settings.INGESTION_EMBEDDING_BATCH_SIZE,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ):
+        self.num_movies = num_movies
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.progress_callback = progress_callback
+        
+        self.seen_ids: set[int] = set()
+        self.failed = 0
+        self.movies_data: List[Dict[str, Any]] = []
+        self.embedding_batches: List[np.ndarray] = []
+        self.movie_ids: List[int] = []
+    
+    async def run(self) -> tuple[np.ndarray, List[int], List[Dict[str, Any]]]:
+        """
+        Run the pipeline to completion
+        
+        Returns:
+            Tuple of (embeddings array, movie IDs list, movies data list)
+        """
+        started_at = time.monotonic()
+        
+        ids_queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        movies_queue: asyncio.Queue = asyncio.Queue()
+        slots = asyncio.Semaphore(self.num_movies)
+        
+        producer = asyncio.create_task(self._produce(ids_queue, slots))
+        fetchers = [
+            asyncio.create_task(self._fetch(ids_queue, movies_queue, slots))
+            for _ in range(self.concurrency)
+        ]
+        
+        try:
+            await self._consume(movies_queue, started_at)
+        finally:
+            # The consumer stops as soon as the target is reached; tear down the other stages
+            for task in [producer, *fetchers]:
+                task.cancel()
+            await asyncio.gather(producer, *fetchers, return_exceptions=True)
+        
+        elapsed = time.monotonic() - started_at
+        cache_stats = embedding_service.embedding_cache.get_stats()
+        logger.info(
+            f"Ingested {len(self.movie_ids)} movies in {elapsed:.1f}s "
+            f"({self.failed} failed fetches, embedding cache hit ratio {cache_stats['hit_ratio']:.0%})"
+        )
+        
+        if self.embedding_batches:
+            embeddings = np.vstack(self.embedding_batches)
+        else:
+            embeddings = np.zeros((0, embedding_service.dimension), dtype='float32')
+        
+        return embeddings, self.movie_ids, self.movies_data
+    
+    async def _produce(self, ids_queue: asyncio.Queue, slots: asyncio.Semaphore):
+        """Enqueue unseen movie IDs: popular movies first, then top rated ones"""
+        try:
+            # 50% popular movies
+            target_popular = self.num_movies // 2
+            enqueued_popular = 0
+            page = 1
+            while enqueued_popular < target_popular and page <= 500:
+                movies_batch = await tmdb_service.get_popular_movies(page=page, populate=False)
+                if not movies_batch:
+                    break
+                
+                for movie_basic in movies_batch:
+                    if await self._enqueue(movie_basic["id"], ids_queue, slots):
+                        enqueued_popular += 1
+                    if enqueued_popular >= target_popular:
+                        break
+                
+                page += 1
+            
+            # Fill the rest with top rated movies
+            page = 1
+            while page <= 500:
+                movies_batch = await tmdb_service.get_top_rated_movies(page=page, populate=False)
+                if not movies_batch:
+                    break
+                
+                for movie_basic in movies_batch:
+                    await self._enqueue(movie_basic["id"], ids_queue, slots)
+                
+                page += 1
+        except Exception as e:
+            logger.error(f"Error producing movie pages during ingestion: {e}")
+        
+        # Sources exhausted: tell every fetcher to stop
+        for _ in range(self.concurrency):
+            await ids_queue.put(_DONE)
+    
+    async def _enqueue(
+        self,
+        movie_id: int,
+        ids_queue: asyncio.Queue,
+        slots: asyncio.Semaphore
+    ) -> bool:
+        """Enqueue a movie ID once a slot is free, skipping duplicates across sources"""
+        if movie_id in self.seen_ids:
+            return False
+        
+        await slots.acquire()
+        self.seen_ids.add(movie_id)
+        await ids_queue.put(movie_id)
+        return True
+    
+    async def _fetch(
+        self,
+        ids_queue: asyncio.Queue,
+        movies_queue: asyncio.Queue,
+        slots: asyncio.Semaphore
+    ):
+        """Fetch complete movie data for queued IDs"""
+        while True:
+            movie_id = await ids_queue.get()
+            if movie_id is _DONE:
+                await movies_queue.put(_DONE)
+                return
+            
+            try:
+                complete_data = await tmdb_service.get_complete_movie_data(movie_id)
+            except Exception as e:
+                logger.error(f"Error fetching movie {movie_id} during ingestion: {e}")
+                complete_data = None
+            
+            if complete_data:
+                await movies_queue.put(complete_data)
+            else:
+                # Give the slot back so the producer can replace this movie
+                self.failed += 1
+                slots.release()
+    
+    async def _consume(self, movies_queue: asyncio.Queue, started_at: float):
+        """Encode incoming movies in batches until the target count is reached"""
+        batch: List[Dict[str, Any]] = []
+        finished_fetchers = 0
+        
+        while len(self.movie_ids) + len(batch) < self.num_movies:
+            movie_data = await movies_queue.get()
+            if movie_data is _DONE:
+                finished_fetchers += 1
+                if finished_fetchers == self.concurrency:
+                    break
+                continue
+            
+            batch.append(movie_data)
+            if len(batch) >= self.batch_size:
+                await self._encode_batch(batch, started_at)
+                batch = []
+        
+        if batch:
+            await self._encode_batch(batch, started_at)
+    
+    async def _encode_batch(self, batch: List[Dict[str, Any]], started_at: float):
+        """Encode a batch off the event loop so fetchers keep running meanwhile"""
+        embeddings = await embedding_service.encode_async(
+            [embedding_service.create_embedding_text(movie) for movie in batch]
+        )
+        
+        self.embedding_batches.append(embeddings)
+        self.movie_ids.extend(movie["id"] for movie in batch)
+        self.movies_data.extend(batch)
+        
+        done = len(self.movie_ids)
+        rate = done / max(time.monotonic() - started_at, 1e-6)
+        logger.info(f"Ingestion progress: {done}/{self.num_movies} movies ({rate:.1f} movies/s)")
+        
+        if self.progress_callback:
+            self.progress_callback(done, self.num_movies)
@@ -0,0 +1,407 @@
+"""
+Metadata Store - Columnar per-movie metadata with lazily loaded documents
+"""
+import json
+import sqlite3
+import threading
+import numpy as np
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+import logging
+
+from app.services.cache import LRUCache
+
+# SQLite limits the number of bound parameters per statement
+_CHUNK = 500
+
+logger = logging.getLogger(__name__)
+
+
+class _Column:
+    """Growable 1D NumPy column (capacity doubling)"""
+    
+    def __init__(self, dtype, values: Optional[np.ndarray] = None):
+        self.dtype = np.dtype(dtype)
+        self._data = np.empty(0, dtype=self.dtype)
+        self._size = 0
+        if values is not None:
+            self.extend(values)
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    @property
+    def values(self) -> np.ndarray:
+        return self._data[:self._size]
+    
+    def extend(self, values):
+        values = np.asarray(values, dtype=self.dtype).reshape(-1)
+        needed = self._size + len(values)
+        if needed > len(self._data):
+            capacity = max(needed, 2 * len(self._data), 1024)
+            data = np.empty(capacity, dtype=self.dtype)
+            data[:self._size] = self._data[:self._size]
+            self._data = data
+        self._data[self._size:needed] = values
+        self._size = needed
+
+
+class _Vocabulary:
+    """String <-> integer id mapping (genre names, person names)"""
+    
+    def __init__(self, names: Optional[List[str]] = None):
+        self.names: List[str] = []
+        self._ids: Dict[str, int] = {}
+        for name in names or []:
+            self.add(name)
+    
+    def __len__(self) -> int:
+        return len(self.names)
+    
+    def add(self, name: str) -> int:
+        term_id = self._ids.get(name)
+        if term_id is None:
+            term_id = len(self.names)
+            self._ids[name] = term_id
+            self.names.append(name)
+        return term_id
+    
+    def get(self, name: str) -> Optional[int]:
+        return self._ids.get(name)
+
+
+class _MultiValueColumn:
+    """Growable CSR column: a list of vocabulary ids per row"""
+    
+    def __init__(self, offsets: Optional[np.ndarray] = None, values: Optional[np.ndarray] = None):
+        self.offsets = _Column(np.int64, offsets if offsets is not None else [0])
+        self.values = _Column(np.int32, values)
+    
+    def append(self, term_ids: List[int]):
+        self.values.extend(term_ids)
+        self.offsets.extend([len(self.values)])
+    
+    def row(self, row: int) -> np.ndarray:
+        offsets = self.offsets.values
+        return self.values.values[offsets[row]:offsets[row + 1]]
+    
+    def contains_any(self, term_ids, start: int = 0) -> np.ndarray:
+        """Boolean mask of the rows (from `start` on) holding at least one of the given ids"""
+        offsets = self.offsets.values[start:]
+        mask = np.zeros(len(offsets) - 1, dtype=bool)
+        values = self.values.values[offsets[0]:]
+        hits = np.flatnonzero(np.isin(values, np.asarray(term_ids, dtype=np.int32))) + offsets[0]
+        if len(hits):
+            # Map each matching value position back to its row
+            mask[np.searchsorted(offsets, hits, side='right') - 1] = True
+        return mask
+
+
+def _text_to_array(data: Any) -> np.ndarray:
+    """Encode JSON-serializable data as a uint8 array (npz without pickle)"""
+    return np.frombuffer(json.dumps(data).encode("utf-8"), dtype=np.uint8)
+
+
+def _array_to_text(array: np.ndarray) -> Any:
+    return json.loads(array.tobytes().decode("utf-8"))
+
+
+def _release_year(release_date: Optional[str]) -> int:
+    try:
+        return int((release_date or "").split("-")[0])
+    except ValueError:
+        return 0
+
+
+class MetadataStore(Mapping):
+    """
+    Movie metadata split into hot columns and cold documents
+    
+    Fields used by ranking and filtering (title, release year, vote average, runtime,
+    popularity, genre ids, cast and director ids) live in NumPy columns aligned with the
+    embedding rows and are loaded at startup from a single .npz file. Full metadata
+    documents (overview, keywords, poster...) stay in SQLite and are read on demand
+    through a small LRU, so startup never parses per-movie JSON.
+    
+    The store behaves as a read-only `Mapping[movie_id, metadata dict]` for callers that
+    only need `get`/`in`/`len`.
+    """
+    
+    def __init__(self, docs_path: str, doc_cache_size: int = 2048):
+        self.docs_path = docs_path
+        self._docs_cache = LRUCache(max_entries=doc_cache_size)
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        # Bumped whenever rows are replaced rather than appended (derived indexes rebuild)
+        self.generation = 0
+        self._reset()
+    
+    def _reset(self):
+        """Drop every row"""
+        self.generation += 1
+        self.genre_vocab = _Vocabulary()
+        self.person_vocab = _Vocabulary()
+        self._ids = _Column(np.int64)
+        self._years = _Column(np.int16)
+        self._vote_averages = _Column(np.float32)
+        self._runtimes = _Column(np.int32)
+        self._popularity = _Column(np.float32)
+        self._director_ids = _Column(np.int32)
+        self.genres = _MultiValueColumn()
+        self.cast = _MultiValueColumn()
+        self.titles: List[str] = []
+        self.original_titles: List[str] = []
+        self._row_by_id: Dict[int, int] = {}
+        # Documents not yet written to SQLite (added since the last snapshot)
+        self._pending_docs: Dict[int, Dict[str, Any]] = {}
+        self._docs_cache.clear()
+    
+    # Column views (row order follows the embedding matrix)
+    
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids.values
+    
+    @property
+    def years(self) -> np.ndarray:
+        return self._years.values
+    
+    @property
+    def vote_averages(self) -> np.ndarray:
+        return self._vote_averages.values
+    
+    @property
+    def runtimes(self) -> np.ndarray:
+        return self._runtimes.values
+    
+    @property
+    def popularity(self) -> np.ndarray:
+        return self._popularity.values
+    
+    @property
+    def director_ids(self) -> np.ndarray:
+        return self._director_ids.values
+    
+    def row_of(self, movie_id: int) -> Optional[int]:
+        return self._row_by_id.get(movie_id)
+    
+    # Mapping interface
+    
+    def __getitem__(self, movie_id: int) -> Dict[str, Any]:
+        doc = self._get_doc(movie_id)
+        if doc is None:
+            raise KeyError(movie_id)
+        return doc
+    
+    def __contains__(self, movie_id: object) -> bool:
+        return movie_id in self._row_by_id
+    
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._row_by_id)
+    
+    def __len__(self) -> int:
+        return len(self._row_by_id)
+    
+    # Writes
+    
+    def append(self, movie_id: int, metadata: Dict[str, Any]):
+        """
+        Add a movie as a new row
+        
+        Args:
+            movie_id: ID of the movie
+            metadata: Full movie metadata
+        """
+        self._row_by_id[movie_id] = len(self._ids)
+        self._ids.extend([movie_id])
+        self._years.extend([_release_year(metadata.get("release_date"))])
+        self._vote_averages.extend([metadata.get("vote_average") or 0.0])
+        self._runtimes.extend([metadata.get("runtime") or 0])
+        self._popularity.extend([metadata.get("popularity") or 0.0])
+        
+        self.genres.append([self.genre_vocab.add(g) for g in metadata.get("genres", []) if g])
+        self.cast.append([self.person_vocab.add(c) for c in metadata.get("cast", []) if c])
+        director = metadata.get("director")
+        self._director_ids.extend([self.person_vocab.add(director) if director else -1])
+        
+        self.titles.append(metadata.get("title") or "")
+        self.original_titles.append(metadata.get("original_title") or "")
+        
+        self._pending_docs[movie_id] = metadata
+        self._docs_cache.pop(movie_id)
+    
+    def reset(self, movie_ids: List[int], movies_metadata: Dict[int, Dict[str, Any]]):
+        """
+        Replace the content with the given movies (rows follow movie_ids order)
+        
+        Args:
+            movie_ids: Movie IDs in row order
+            movies_metadata: Metadata keyed by movie ID
+        """
+        self._reset()
+        for movie_id in movie_ids:
+            self.append(movie_id, movies_metadata.get(movie_id, {"id": movie_id}))
+    
+    # Documents
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open the documents database (caller holds _db_lock)"""
+        if self._db is None:
+            Path(self.docs_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.docs_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS docs (id INTEGER PRIMARY KEY, doc TEXT NOT NULL)")
+        return self._db
+    
+    def _get_doc(self, movie_id: int) -> Optional[Dict[str, Any]]:
+        """Get a full metadata document (pending writes first, then LRU, then SQLite)"""
+        if movie_id not in self._row_by_id:
+            return None
+        
+        doc = self._pending_docs.get(movie_id)
+        if doc is not None:
+            return doc
+        
+        doc = self._docs_cache.get(movie_id)
+        if doc is not None:
+            return doc
+        
+        with self._db_lock:
+            row = self._connect().execute("SELECT doc FROM docs WHERE id = ?", (movie_id,)).fetchone()
+        if row is None:
+            return None
+        
+        doc = json.loads(row[0])
+        self._docs_cache.set(movie_id, doc)
+        return doc
+    
+    def get_many(self, movie_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Get several metadata documents with one SQLite query per chunk of IDs
+        
+        Args:
+            movie_ids: Movie IDs (unknown IDs are skipped)
+        
+        Returns:
+            Documents keyed by movie ID
+        """
+        docs: Dict[int, Dict[str, Any]] = {}
+        missing = []
+        for movie_id in dict.fromkeys(movie_ids):
+            if movie_id not in self._row_by_id:
+                continue
+            doc = self._pending_docs.get(movie_id)
+            if doc is None:
+                doc = self._docs_cache.get(movie_id)
+            if doc is None:
+                missing.append(movie_id)
+            else:
+                docs[movie_id] = doc
+        
+        # Bulk reads bypass the LRU so a large batch does not evict the hot documents
+        with self._db_lock:
+            db = self._connect()
+            for start in range(0, len(missing), _CHUNK):
+                chunk = missing[start:start + _CHUNK]
+                rows = db.execute(
+                    f"SELECT id, doc FROM docs WHERE id IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                for movie_id, doc in rows:
+                    docs[movie_id] = json.loads(doc)
+        return docs
+    
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+    
+    # Persistence
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Capture the current content for saving (call under the owner's lock)
+        
+        Returns:
+            Dict with copied columns and the pending documents
+        """
+        return {
+            "columns": {
+                "ids": self.ids.copy(),
+                "years": self.years.copy(),
+                "vote_averages": self.vote_averages.copy(),
+                "runtimes": self.runtimes.copy(),
+                "popularity": self.popularity.copy(),
+                "director_ids": self.director_ids.copy(),
+                "genre_offsets": self.genres.offsets.values.copy(),
+                "genre_values": self.genres.values.values.copy(),
+                "cast_offsets": self.cast.offsets.values.copy(),
+                "cast_values": self.cast.values.values.copy(),
+                "genre_vocab": _text_to_array(list(self.genre_vocab.names)),
+                "person_vocab": _text_to_array(list(self.person_vocab.names)),
+                "titles": _text_to_array(list(self.titles)),
+                "original_titles": _text_to_array(list(self.original_titles))
+            },
+            "docs": dict(self._pending_docs)
+        }
+    
+    def write_snapshot(self, snapshot: Dict[str, Any], f):
+        """
+        Persist a snapshot: pending documents to SQLite, columns to an open binary file
+        
+        Safe to call from a worker thread.
+        """
+        docs = snapshot["docs"]
+        if docs:
+            with self._db_lock:
+                db = self._connect()
+                db.executemany(
+                    "INSERT OR REPLACE INTO docs (id, doc) VALUES (?, ?)",
+                    [(movie_id, json.dumps(doc)) for movie_id, doc in docs.items()]
+                )
+                db.commit()
+        
+        np.savez(f, **snapshot["columns"])
+    
+    def mark_saved(self, snapshot: Dict[str, Any]):
+        """Forget pending documents written by a snapshot (call under the owner's lock)"""
+        for movie_id, doc in snapshot["docs"].items():
+            if self._pending_docs.get(movie_id) is doc:
+                del self._pending_docs[movie_id]
+    
+    def load(self, columns_path: str):
+        """
+        Load columns from a snapshot file (documents stay on disk until requested)
+        
+        Args:
+            columns_path: Path of the .npz columns file
+        """
+        with np.load(columns_path) as data:
+            self._reset()
+            self._ids = _Column(np.int64, data["ids"])
+            self._years = _Column(np.int16, data["years"])
+            self._vote_averages = _Column(np.float32, data["vote_averages"])
+            self._runtimes = _Column(np.int32, data["runtimes"])
+            self._popularity = _Column(np.float32, data["popularity"])
+            self._director_ids = _Column(np.int32, data["director_ids"])
+            self.genres = _MultiValueColumn(data["genre_offsets"], data["genre_values"])
+            self.cast = _MultiValueColumn(data["cast_offsets"], data["cast_values"])
+            self.genre_vocab = _Vocabulary(_array_to_text(data["genre_vocab"]))
+            self.person_vocab = _Vocabulary(_array_to_text(data["person_vocab"]))
+            self.titles = _array_to_text(data["titles"])
+            self.original_titles = _array_to_text(data["original_titles"])
+        
+        self._row_by_id = {int(movie_id): row for row, movie_id in enumerate(self.ids)}
+    
+    def truncate(self, count: int):
+        """Keep only the first `count` rows (used to repair a partially written snapshot)"""
+        if count >= len(self._ids):
+            return
+        
+        movie_ids = self.ids[:count].tolist()
+        docs = {movie_id: self._get_doc(movie_id) or {"id": movie_id} for movie_id in movie_ids}
+        pending = dict(self._pending_docs)
+        self.reset(movie_ids, docs)
+        self._pending_docs = {movie_id: pending[movie_id] for movie_id in movie_ids if movie_id in pending}
@@ -0,0 +1,271 @@
+"""
+Neighbor Table - Precomputed item-to-item nearest neighbours ("more like this")
+"""
+import os
+import threading
+import numpy as np
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+from app.core.config import settings
+from app.services.embedding_service import embedding_service
+from app.services.faiss_service import faiss_service
+
+logger = logging.getLogger(__name__)
+
+# Query rows per FAISS search call when building, and catalog rows per block when
+# scoring existing movies against new ones
+BUILD_BATCH_ROWS = 4096
+UPDATE_BLOCK_ROWS = 8192
+
+# Past this share of new movies, a full build is cheaper than merging them in
+_MAX_NEW_FRACTION = 0.25
+
+
+class NeighborTable:
+    """
+    Top-N most similar catalog movies of every catalog movie
+    
+    Neighbours are stored as compact arrays, one row per movie: int32 movie IDs and
+    float16 cosine similarities, best first, padded with -1 / -inf when the catalog
+    has fewer than N other movies. A lookup is a dict access plus a row slice.
+    
+    build() runs batched FAISS searches over the whole embedding matrix (the offline
+    job, see build_neighbors.py); sync() merges movies added since then: their own
+    rows come from one batched search, and existing rows are only rewritten where a
+    new movie beats their current N-th neighbour. build() callers hold
+    embedding_service.lock; sync() takes it itself, only around its snapshot and swap.
+    """
+    
+    def __init__(self, num_neighbors: int = settings.SIMILAR_MOVIES_NEIGHBORS):
+        self.num_neighbors = num_neighbors
+        self.built = False
+        self.movie_ids = np.empty(0, dtype=np.int32)
+        self.neighbor_ids = np.empty((0, num_neighbors), dtype=np.int32)
+        self.scores = np.empty((0, num_neighbors), dtype=np.float16)
+        self._row_by_id: Dict[int, int] = {}
+        # Metadata generation the rows were checked against (rows follow the catalog order)
+        self._generation: Optional[int] = None
+        # Serializes merges, which run outside embedding_service.lock
+        self._sync_lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self.movie_ids)
+    
+    def get(self, movie_id: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Precomputed neighbours of a movie
+        
+        Returns:
+            Tuple of (similarities, movie IDs) best first, or None if the movie is not in the table
+        """
+        row = self._row_by_id.get(movie_id)
+        if row is None:
+            return None
+        
+        known = self.neighbor_ids[row] >= 0
+        return self.scores[row][known].astype('float32'), self.neighbor_ids[row][known]
+    
+    def build(self):
+        """Compute the neighbours of every catalog movie"""
+        movie_ids = np.asarray(embedding_service.movie_ids, dtype=np.int64)
+        self.neighbor_ids, self.scores = self._search(
+            movie_ids,
+            lambda start, stop: embedding_service.get_vectors(np.arange(start, stop))
+        )
+        self._set_ids(movie_ids)
+        self.built = True
+        self._generation = embedding_service.movies_metadata.generation
+        logger.info(f"Neighbor table built: {len(movie_ids)} movies x {self.num_neighbors} neighbours")
+    
+    def sync(self) -> int:
+        """
+        Add the catalog movies appended since the last call (no-op until built)
+        
+        embedding_service.lock is only held to snapshot the new movies and to swap the
+        updated rows in: scoring the catalog against them runs on stable row views, so
+        lookups and additions are not blocked meanwhile.
+        
+        Returns:
+            Number of movies added
+        """
+        if not self.built:
+            return 0
+        
+        with self._sync_lock:
+            with embedding_service.lock:
+                catalog_size = len(embedding_service.movie_ids)
+                generation = embedding_service.movies_metadata.generation
+                if self._generation != generation:
+                    # The catalog was replaced: keep the rows only if it merely grew
+                    known_ids = np.asarray(embedding_service.movie_ids[:len(self)], dtype=np.int64)
+                    if catalog_size < len(self) or not np.array_equal(known_ids, self.movie_ids):
+                        self.build()
+                        return len(self)
+                    self._generation = generation
+                
+                new_rows = np.arange(len(self), catalog_size)
+                if not len(new_rows):
+                    return 0
+                if len(new_rows) > max(1, len(self)) * _MAX_NEW_FRACTION:
+                    self.build()
+                    return len(new_rows)
+                
+                new_ids = np.asarray(embedding_service.movie_ids[len(self):catalog_size], dtype=np.int64)
+                new_vectors = embedding_service.get_vectors(new_rows)
+                blocks = [
+                    (start, embedding_service.get_vector_range(start, min(start + UPDATE_BLOCK_ROWS, len(self))))
+                    for start in range(0, len(self), UPDATE_BLOCK_ROWS)
+                ]
+                neighbor_ids, scores = self.neighbor_ids, self.scores
+                movie_ids, row_by_id = self.movie_ids, self._row_by_id
+            
+            # New arrays are filled outside the lock, readers keep the current ones meanwhile
+            updates = self._score_new(blocks, neighbor_ids, scores, new_ids, new_vectors)
+            new_neighbor_ids, new_scores = self._search(new_ids, lambda start, stop: new_vectors[start:stop])
+            merged_neighbor_ids = np.vstack([neighbor_ids, new_neighbor_ids])
+            merged_scores = np.vstack([scores, new_scores])
+            for rows, row_ids, row_scores in updates:
+                merged_neighbor_ids[rows] = row_ids
+                merged_scores[rows] = row_scores
+            row_by_id = dict(row_by_id)
+            row_by_id.update(zip(new_ids.tolist(), range(len(movie_ids), len(movie_ids) + len(new_ids))))
+            
+            with embedding_service.lock:
+                if self.neighbor_ids is not neighbor_ids or embedding_service.movies_metadata.generation != generation:
+                    # Rebuilt or replaced meanwhile: the next sync starts from the new state
+                    return 0
+                
+                self.neighbor_ids = merged_neighbor_ids
+                self.scores = merged_scores
+                self.movie_ids = np.concatenate([movie_ids, new_ids.astype(np.int32)])
+                self._row_by_id = row_by_id
+        
+        logger.info(f"Neighbor table: merged {len(new_ids)} new movies")
+        return len(new_ids)
+    
+    def _score_new(
+        self,
+        blocks: List[Tuple[int, np.ndarray]],
+        neighbor_ids: np.ndarray,
+        scores: np.ndarray,
+        new_ids: np.ndarray,
+        new_vectors: np.ndarray
+    ) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Rows of existing movies that adopt some new movies as neighbours
+        
+        Args:
+            blocks: (first row, embedding rows) of the existing movies
+            neighbor_ids: Current neighbour IDs
+            scores: Current neighbour similarities
+            new_ids: Movie IDs of the new movies
+            new_vectors: Embeddings of the new movies
+        
+        Returns:
+            List of (rows, neighbour IDs, similarities) to write back
+        """
+        candidate_ids = new_ids.astype(np.int32)
+        worst = scores[:, -1].astype('float32')
+        updates = []
+        
+        for start, vectors in blocks:
+            similarities = vectors @ new_vectors.T
+            affected = np.flatnonzero((similarities > worst[start:start + len(vectors), None]).any(axis=1))
+            if not len(affected):
+                continue
+            
+            # Merge current and new neighbours of the affected rows, keep the best N
+            rows = start + affected
+            merged_ids = np.hstack([
+                neighbor_ids[rows],
+                np.broadcast_to(candidate_ids, (len(rows), len(candidate_ids)))
+            ])
+            merged_scores = np.hstack([scores[rows].astype('float32'), similarities[affected]])
+            best = np.argsort(-merged_scores, axis=1, kind='stable')[:, :self.num_neighbors]
+            updates.append((
+                rows,
+                np.take_along_axis(merged_ids, best, axis=1),
+                np.take_along_axis(merged_scores, best, axis=1)
+            ))
+        
+        return updates
+    
+    def _search(
+        self,
+        movie_ids: np.ndarray,
+        get_vectors: Callable[[int, int], np.ndarray]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Neighbour arrays of some movies, by batched index searches over their vectors (read by range)"""
+        neighbor_ids = np.full((len(movie_ids), self.num_neighbors), -1, dtype=np.int32)
+        scores = np.full((len(movie_ids), self.num_neighbors), -np.inf, dtype=np.float16)
+        
+        for start in range(0, len(movie_ids), BUILD_BATCH_ROWS):
+            stop = min(start + BUILD_BATCH_ROWS, len(movie_ids))
+            hits = faiss_service.search_batch(
+                get_vectors(start, stop),
+                k=self.num_neighbors,
+                exclude_ids=[[int(movie_id)] for movie_id in movie_ids[start:stop]]
+            )
+            for offset, (distances, result_ids) in enumerate(hits):
+                neighbor_ids[start + offset, :len(result_ids)] = result_ids
+                scores[start + offset, :len(distances)] = distances
+        
+        return neighbor_ids, scores
+    
+    def _set_ids(self, movie_ids: np.ndarray):
+        self.movie_ids = movie_ids.astype(np.int32)
+        self._row_by_id = {movie_id: row for row, movie_id in enumerate(self.movie_ids.tolist())}
+    
+    def save(self, path: Optional[str] = None):
+        """Write the table to disk (nothing to save until built)"""
+        if not self.built:
+            return
+        
+        try:
+            table_path = Path(path or settings.NEIGHBORS_PATH)
+            table_path.parent.mkdir(parents=True, exist_ok=True)
+            
+            # Save to a temporary file, then swap it in
+            tmp_path = f"{table_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(f, movie_ids=self.movie_ids, neighbor_ids=self.neighbor_ids, scores=self.scores)
+            os.replace(tmp_path, table_path)
+            logger.info(f"Neighbor table saved to {table_path}")
+        
+        except Exception as e:
+            logger.error(f"Error saving neighbor table: {e}")
+    
+    def load(self, path: Optional[str] = None) -> bool:
+        """
+        Load a saved table
+        
+        Returns:
+            True if a table with the configured number of neighbours was loaded
+        """
+        path = Path(path or settings.NEIGHBORS_PATH)
+        if not path.exists():
+            return False
+        
+        try:
+            with np.load(path) as data:
+                neighbor_ids = data["neighbor_ids"]
+                if neighbor_ids.shape[1] != self.num_neighbors:
+                    logger.info("Neighbor table was built for another number of neighbours, ignoring it")
+                    return False
+                self.neighbor_ids = neighbor_ids
+                self.scores = data["scores"]
+                self._set_ids(data["movie_ids"])
+            self.built = True
+            # Checked against the catalog on the next sync
+            self._generation = None
+            logger.info(f"Loaded neighbor table ({len(self)} movies)")
+            return True
+        except Exception as e:
+            logger.error(f"Error loading neighbor table: {e}")
+            return False
+
+
+# Global instance
+neighbor_table = NeighborTable()
@@ -1,21 +1,54 @@
 """
 Recommendation Service - Orchestrates the recommendation pipeline
 """
+import asyncio
+import hashlib
+import json
 import numpy as np
 from typing import List, Dict, Any, Optional
 import logging
 
+from app.core.config import settings
+
+from app.services.cache import LRUCache
 from app.services.embedding_service import embedding_service
 from app.services.faiss_service import faiss_service
+from app.services.filter_index import FilterIndex
+from app.services.neighbor_table import neighbor_table
+from app.services.search_service import search_service
 from app.services.tmdb_service import tmdb_service
+from app.services.ingestion_service import IngestionPipeline
 from app.models.schemas import RecommendationItem, MovieBase
 
 logger = logging.getLogger(__name__)
 
+# Title matches considered by hybrid semantic search (best lexical ranks first)
+LEXICAL_CANDIDATES = 50
+
 
 class RecommendationService:
     """Service for generating movie recommendations"""
     
+    def __init__(self):
+        self._compaction_task: Optional[asyncio.Task] = None
+        # Results of recent requests, keyed on a canonical hash of the request and index version
+        self.result_cache = LRUCache(
+            max_entries=settings.RECOMMENDATION_CACHE_SIZE,
+            ttl=settings.RECOMMENDATION_CACHE_TTL
+        )
+        self.result_cache_enabled = settings.RECOMMENDATION_CACHE_ENABLED
+        # Unfiltered nearest neighbours of recent profiles, so filter changes skip the search
+        self.candidate_pools = LRUCache(
+            max_entries=settings.CANDIDATE_POOL_CACHE_SIZE,
+            ttl=settings.RECOMMENDATION_CACHE_TTL
+        )
+        self.candidate_pool_enabled = settings.CANDIDATE_POOL_ENABLED
+        # Embeddings of recent free-text queries (they only change with the model)
+        self.query_embeddings = LRUCache(max_entries=settings.QUERY_EMBEDDING_CACHE_SIZE)
+        self._result_cache_version = faiss_service.version
+        # Inverted indexes over the catalog metadata, for filters and facet counts
+        self.filter_index = FilterIndex(embedding_service.movies_metadata)
+    
     async def get_recommendations(
         self,
         liked_movies: List[Any],
@@ -29,95 +62,81 @@ class RecommendationService:
             liked_movies: List of RatedMovie objects (movies the user likes with their ratings)
             top_k: Number of recommendations to return
             filters: Optional filters (genre, year, etc.)
-            
+        
         Returns:
             Tuple of (recommendations, user_profile_movies)
         """
+        # The frontend re-posts the same selection on every filter panel change
+        cached = self._get_cached_result(liked_movies, top_k, filters)
+        if cached is not None:
+            return cached
+        
         logger.info(f"Generating recommendations for {len(liked_movies)} liked movies")
         
         # Check for missing embeddings and generate them on fly
+        unresolved = False
         for item in liked_movies:
             movie_id = item.movie_id
-            if movie_id not in embedding_service.movie_ids:
+            if not embedding_service.has_movie(movie_id):
                 logger.info(f"Movie ID {movie_id} not in embeddings, fetching and generating...")
                 try:
                     # Fetch complete data
                     movie_data = await tmdb_service.get_complete_movie_data(movie_id)
                     if movie_data:
-                        # Generate embedding
-                        embedding = embedding_service.generate_movie_embedding(movie_data)
+                        # Generate embedding on the inference executor
+                        embedding = await embedding_service.encode_async(
+                            embedding_service.create_embedding_text(movie_data)
+                        )
+                        
+                        # A concurrent request may have added it while we were waiting
+                        if embedding_service.has_movie(movie_id):
+                            continue
                         
-                        # Add to embedding service (memory)
-                        embedding_service.add_single_movie_embedding(movie_id, embedding, movie_data)
+                        # Add to embedding service (memory + write-ahead log)
+                        embedding_service.add_single_movie_embedding(
+                            movie_id, embedding, movie_data, persist=True
+                        )
                         
-                        # Add to FAISS index (memory) and save index
+                        # Add to FAISS index (memory)
                         # Provide embedding as 2D array for FAISS
-                        faiss_service.add_vectors(embedding.reshape(1, -1))
+                        faiss_service.add_vectors(embedding.reshape(1, -1), [movie_id])
+                        await asyncio.to_thread(self._sync_neighbor_table)
                         
-                        # Persist everything to disk
-                        embedding_service.save_embeddings()
-                        faiss_service.save_index()
+                        # Snapshot files are rewritten in the background once the log grows
+                        self._schedule_compaction()
                         
                         logger.info(f"Permanently added movie {movie_id} to database")
+                    else:
+                        unresolved = True
                 except Exception as e:
+                    unresolved = True
                     logger.error(f"Failed to generate on-fly embedding for {movie_id}: {e}")
-
-        # Create user profile embedding
-        user_profile = embedding_service.create_user_profile_embedding(liked_movies)
         
-        if user_profile is None:
+        # Key the result on the index version it is computed from (on-the-fly additions bump it)
+        cache_key = self._result_cache_key(liked_movies, top_k, filters)
+        
+        # Answer from the profile's candidate pool when possible, off the event loop
+        pool_key = self._profile_key(liked_movies)
+        pool = self.candidate_pools.get(pool_key) if self.candidate_pool_enabled else None
+        search_results, fetched_pool = await asyncio.to_thread(
+            self._search_similar, liked_movies, top_k, filters, pool
+        )
+        if fetched_pool is not None:
+            self.candidate_pools.set(pool_key, fetched_pool)
+        
+        if search_results is None:
             logger.error("Failed to create user profile")
             return [], []
         
-        # Find indices of liked movies to exclude them from results
-        liked_indices = []
-        for item in liked_movies:
-            movie_id = item.movie_id
-            try:
-                idx = embedding_service.movie_ids.index(movie_id)
-                liked_indices.append(idx)
-            except ValueError:
-                pass
-        
-        # Search for similar movies
-        distances, indices = faiss_service.search(
-            user_profile,
-            k=top_k * 2,  # Get more to allow for filtering
-            exclude_indices=liked_indices
-        )
+        distances, result_ids = search_results
         
         # Convert to recommendations
         recommendations = []
-        for distance, idx in zip(distances[0], indices[0]):
-            movie_id = embedding_service.movie_ids[int(idx)]
-            metadata = embedding_service.get_movie_metadata(movie_id)
-            
-            if metadata is None:
-                continue
-            
-            # Apply filters if provided
-            if filters:
-                if not self._apply_filters(metadata, filters):
-                    continue
-            
-            recommendation = RecommendationItem(
-                movie_id=movie_id,
-                title=metadata.get("title", ""),
-                score=float(distance),  # Distance is already cosine similarity
-                poster_url=metadata.get("poster_path"),
-                overview=metadata.get("overview"),
-                release_date=metadata.get("release_date"),
-                vote_average=metadata.get("vote_average"),
-                genres=metadata.get("genres", []),
-                runtime=metadata.get("runtime")
-            )
-            
-            recommendations.append(recommendation)
-            
-            if len(recommendations) >= top_k:
-                break
+        for distance, movie_id in zip(distances[0], result_ids[0]):
+            recommendation = self._to_recommendation(int(movie_id), distance)
+            if recommendation is not None:
+                recommendations.append(recommendation)
         
-
         # Get user profile movies info
         user_profile_movies = []
         for item in liked_movies:
@@ -137,69 +156,469 @@ class RecommendationService:
         
         logger.info(f"Generated {len(recommendations)} recommendations")
         
+        if self.result_cache_enabled:
+            # A liked movie TMDB failed to return (or didn't know) is only left out briefly
+            self.result_cache.set(
+                cache_key,
+                (list(recommendations), {movie.id: movie for movie in user_profile_movies}),
+                ttl=settings.RECOMMENDATION_CACHE_PARTIAL_TTL if unresolved else None
+            )
+        
         return recommendations, user_profile_movies
     
-
+    def _get_cached_result(
+        self,
+        liked_movies: List[Any],
+        top_k: int,
+        filters: Optional[Dict[str, Any]]
+    ) -> Optional[tuple[List[RecommendationItem], List[MovieBase]]]:
+        """Get the cached result of an equivalent request, if the index did not change since"""
+        if not self.result_cache_enabled:
+            return None
+        
+        # Entries of older index versions can never match again
+        if self._result_cache_version != faiss_service.version:
+            self.result_cache.clear()
+            self.candidate_pools.clear()
+            self._result_cache_version = faiss_service.version
+        
+        cached = self.result_cache.get(self._result_cache_key(liked_movies, top_k, filters))
+        if cached is None:
+            return None
+        
+        # Profile movies follow the order of this request's selection
+        recommendations, profile_movies = cached
+        return list(recommendations), [
+            profile_movies[item.movie_id] for item in liked_movies if item.movie_id in profile_movies
+        ]
+    
+    def _result_cache_key(
+        self,
+        liked_movies: List[Any],
+        top_k: int,
+        filters: Optional[Dict[str, Any]]
+    ) -> str:
+        """Canonical hash of (sorted liked movies and ratings, top_k, filters, index version)"""
+        canonical = json.dumps(
+            [
+                sorted((item.movie_id, float(item.rating)) for item in liked_movies),
+                top_k,
+                self._normalize_filters(filters),
+                faiss_service.version
+            ],
+            separators=(',', ':'),
+            default=str
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    
+    def _profile_key(self, liked_movies: List[Any]) -> str:
+        """Canonical hash of (sorted liked movies and ratings, index version)"""
+        canonical = json.dumps(
+            [sorted((item.movie_id, float(item.rating)) for item in liked_movies), faiss_service.version],
+            separators=(',', ':')
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def _normalize_filters(filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Filters with unset (empty) criteria dropped and keys sorted"""
+        return {key: value for key, value in sorted((filters or {}).items()) if value}
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters of the result cache"""
+        return {
+            **self.result_cache.get_stats(),
+            "index_version": faiss_service.version,
+            "enabled": self.result_cache_enabled,
+            "candidate_pools": {
+                **self.candidate_pools.get_stats(),
+                "pool_size": settings.CANDIDATE_POOL_SIZE,
+                "enabled": self.candidate_pool_enabled
+            },
+            "query_embeddings": self.query_embeddings.get_stats()
+        }
     
-    def _apply_filters(self, metadata: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    async def get_recommendations_batch(self, requests: List[Any]) -> List[List[RecommendationItem]]:
         """
-        Apply filters to a movie
+        Generate recommendations for many users at once
+        
+        Profiles are built with one vectorized weighted sum and each distinct filter
+        set is served by a single multi-row FAISS search. Unlike get_recommendations,
+        liked movies missing from the catalog are skipped rather than fetched.
         
         Args:
-            metadata: Movie metadata
-            filters: Filter criteria
+            requests: RecommendationRequest objects (liked_movies, top_k, filters), one per user
             
         Returns:
-            True if movie passes filters
+            Recommendations of each user, in request order
         """
-        if not filters:
-            return True
-
-        # Genre filter
-        if "genre" in filters and filters["genre"]:
-            required_genre = filters["genre"]
-            if required_genre not in metadata.get("genres", []):
-                return False
-        
-        # Year filter (min_year)
-        if "year" in filters and filters["year"]:
-            # Handle year can be string or int
-            try:
-                min_year = int(filters["year"])
-                release_date = metadata.get("release_date", "")
-                if not release_date:
-                    return False
-                movie_year = int(release_date.split("-")[0])
-                if movie_year < min_year:
-                    return False
-            except (ValueError, IndexError):
-                pass
-        
-        # Minimum rating filter
-        if "min_rating" in filters and filters["min_rating"]:
-            min_rating = float(filters["min_rating"])
-            if metadata.get("vote_average", 0) < min_rating:
-                return False
-
-        # Actor filter (partial match, case-insensitive)
-        if "actor" in filters and filters["actor"]:
-            target_actor = filters["actor"].lower()
-            cast_list = [c.lower() for c in metadata.get("cast", [])]
-            # Check if any cast member contains the target string
-            if not any(target_actor in actor for actor in cast_list):
-                 return False
-
-        # Runtime filter
-        current_runtime = metadata.get("runtime") or 0
-        if "min_runtime" in filters and filters["min_runtime"]:
-            if current_runtime < int(filters["min_runtime"]):
-                return False
+        logger.info(f"Generating batched recommendations for {len(requests)} users")
+        
+        def recommend():
+            search_results = self._search_similar_batch(requests)
+            
+            # One docs query for the whole batch instead of one lookup per item
+            movie_ids = [int(movie_id) for _, result_ids in search_results for movie_id in result_ids]
+            docs = embedding_service.movies_metadata.get_many(movie_ids)
+            
+            results = []
+            for distances, result_ids in search_results:
+                recommendations = []
+                for distance, movie_id in zip(distances, result_ids):
+                    recommendation = self._to_recommendation(int(movie_id), distance, docs.get(int(movie_id)))
+                    if recommendation is not None:
+                        recommendations.append(recommendation)
+                results.append(recommendations)
+            return results
+        
+        # Item construction (pydantic models, docs reads) stays off the event loop too
+        return await asyncio.to_thread(recommend)
+    
+    def _to_recommendation(
+        self,
+        movie_id: int,
+        distance: float,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Optional[RecommendationItem]:
+        """Build a recommendation item from a search hit (None if the movie has no metadata)"""
+        if metadata is None:
+            metadata = embedding_service.get_movie_metadata(movie_id)
+        
+        if metadata is None:
+            return None
+        
+        return RecommendationItem(
+            movie_id=movie_id,
+            title=metadata.get("title", ""),
+            # Distance is already cosine similarity; selective filters can reach
+            # unrelated (negatively correlated) movies and float32 rounding can
+            # overshoot 1 on near-duplicates, clamp to the 0-1 range
+            score=min(1.0, max(0.0, float(distance))),
+            poster_url=metadata.get("poster_path"),
+            overview=metadata.get("overview"),
+            release_date=metadata.get("release_date"),
+            vote_average=metadata.get("vote_average"),
+            genres=metadata.get("genres", []),
+            runtime=metadata.get("runtime")
+        )
+    
+    
+    
+    def _search_similar(
+        self,
+        liked_movies: List[Any],
+        top_k: int,
+        filters: Optional[Dict[str, Any]],
+        pool: Optional[tuple[np.ndarray, np.ndarray]] = None
+    ) -> tuple[Optional[tuple[np.ndarray, np.ndarray]], Optional[tuple[np.ndarray, np.ndarray]]]:
+        """
+        Build the user profile and search the index for matching movies (CPU-bound)
+        
+        With candidate pools enabled, the profile's unfiltered nearest neighbours are
+        fetched once (or taken from `pool`) and filtered in place; a filtered search only
+        runs when the pool holds fewer than top_k matches.
+        
+        Returns:
+            Tuple of ((distances, movie IDs) or None if no liked movie is known,
+            candidate pool fetched by this call or None)
+        """
+        exclude_ids = [item.movie_id for item in liked_movies]
+        
+        # Read the catalog consistently while movies may be added from the event loop
+        with embedding_service.lock:
+            # Compile filters into the set of matching movies so FAISS only scans those
+            allowed = self._compile_filter_mask(filters)
+            
+            if pool is not None:
+                results = self._filter_pool(pool, allowed, top_k)
+                if results is not None:
+                    return results, None
+            
+            # Create user profile embedding
+            user_profile = embedding_service.create_user_profile_embedding(liked_movies)
+            if user_profile is None:
+                return None, None
+        
+        fetched_pool = None
+        if pool is None and self.candidate_pool_enabled:
+            distances, result_ids = faiss_service.search(
+                user_profile,
+                k=settings.CANDIDATE_POOL_SIZE,
+                exclude_ids=exclude_ids
+            )
+            fetched_pool = (distances[0], result_ids[0])
+            
+            with embedding_service.lock:
+                results = self._filter_pool(fetched_pool, allowed, top_k)
+            if results is not None:
+                return results, fetched_pool
+        
+        # Pool ran dry: search for similar movies among the allowed ones only
+        allowed_ids = None if allowed is None else embedding_service.movies_metadata.ids[allowed]
+        return faiss_service.search(
+            user_profile,
+            k=top_k,
+            exclude_ids=exclude_ids,
+            allowed_ids=allowed_ids
+        ), fetched_pool
+    
+    def _filter_pool(
+        self,
+        pool: tuple[np.ndarray, np.ndarray],
+        allowed: Optional[np.ndarray],
+        top_k: int
+    ) -> Optional[tuple[np.ndarray, np.ndarray]]:
+        """
+        Keep the pool candidates matching the filter mask (caller holds embedding_service.lock)
+        
+        Returns:
+            Top-k (distances, movie IDs), or None if the pool cannot be trusted to contain them
+        """
+        distances, result_ids = pool
+        if allowed is not None:
+            rows, missing = embedding_service.lookup_rows(result_ids)
+            keep = ~missing & (rows < len(allowed))
+            keep[keep] = allowed[rows[keep]]
+            distances, result_ids = distances[keep], result_ids[keep]
+        
+        # Short filtered results are only final when the pool holds every indexed movie
+        # (approximate indexes can return fewer than k hits without exhausting the catalog)
+        if len(result_ids) < top_k and len(pool[1]) < faiss_service.index.ntotal:
+            return None
+        
+        return distances[:top_k].reshape(1, -1), result_ids[:top_k].reshape(1, -1)
+    
+    def _search_similar_batch(self, requests: List[Any]) -> List[tuple[np.ndarray, np.ndarray]]:
+        """
+        Build all user profiles and search the index for each of them (CPU-bound)
+        
+        Returns:
+            One tuple of (distances, movie IDs) per request; empty for users without a known liked movie
+        """
+        empty = (np.empty(0, dtype='float32'), np.empty(0, dtype=np.int64))
+        results = [empty] * len(requests)
+        
+        with embedding_service.lock:
+            profiles, has_profile = embedding_service.create_user_profile_embeddings(
+                [request.liked_movies for request in requests]
+            )
+            
+            # Users sharing the same filters share one search (and one compiled mask)
+            groups: Dict[str, List[int]] = {}
+            for position, request in enumerate(requests):
+                if has_profile[position]:
+                    key = json.dumps(self._normalize_filters(request.filters), default=str)
+                    groups.setdefault(key, []).append(position)
+            
+            allowed_ids = {}
+            for key, positions in groups.items():
+                allowed = self._compile_filter_mask(requests[positions[0]].filters)
+                allowed_ids[key] = None if allowed is None else embedding_service.movies_metadata.ids[allowed]
+        
+        for key, positions in groups.items():
+            hits = faiss_service.search_batch(
+                profiles[positions],
+                k=max(requests[position].top_k for position in positions),
+                exclude_ids=[[item.movie_id for item in requests[position].liked_movies] for position in positions],
+                allowed_ids=allowed_ids[key]
+            )
+            for position, (distances, result_ids) in zip(positions, hits):
+                top_k = requests[position].top_k
+                results[position] = (distances[:top_k], result_ids[:top_k])
+        
+        return results
+    
+    async def get_similar_movies(self, movie_id: int, top_k: int = 10) -> Optional[List[RecommendationItem]]:
+        """
+        Movies most similar to a catalog movie ("more like this")
+        
+        Served from the precomputed neighbour table (built offline by build_neighbors.py
+        and kept current as movies are added); movies it doesn't cover yet are searched
+        in the index directly.
+        
+        Args:
+            movie_id: TMDB movie ID
+            top_k: Number of similar movies to return
+        
+        Returns:
+            List of similar movies, or None if the movie is not in the catalog
+        """
+        def lookup():
+            with embedding_service.lock:
+                hit = neighbor_table.get(movie_id)
+                row = embedding_service.get_row(movie_id)
+                if hit is not None or row is None:
+                    return hit
+                vector = embedding_service.get_vectors(np.array([row]))[0]
+            
+            distances, result_ids = faiss_service.search(vector, k=top_k, exclude_ids=[movie_id])
+            return distances[0], result_ids[0]
+        
+        hit = await asyncio.to_thread(lookup)
+        if hit is None:
+            return None
+        
+        results = []
+        for similar_id, distance in zip(hit[1][:top_k], hit[0][:top_k]):
+            item = self._to_recommendation(int(similar_id), distance)
+            if item is not None:
+                results.append(item)
+        return results
+    
+    async def semantic_search(
+        self,
+        query: str,
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None,
+        hybrid: bool = False
+    ) -> List[RecommendationItem]:
+        """
+        Find movies matching a free-text description ("a heist movie in space")
+        
+        The query is encoded with the embedding model and searched in the index like
+        a user profile, under the same filters. In hybrid mode, movies whose title
+        matches the query are blended in (see _search_text).
+        
+        Args:
+            query: Natural-language query
+            top_k: Number of results to return
+            filters: Optional filters (genre, year, min_rating, actor, director, runtime)
+            hybrid: Blend lexical title matches with the semantic scores
+        
+        Returns:
+            List of matching movies, best first
+        """
+        query = " ".join(query.split())
+        query_vector = self.query_embeddings.get(query)
+        if query_vector is None:
+            # Free text stays out of the persistent movie embedding cache (the LRU covers repeats)
+            query_vector = await embedding_service.encode_async(query, use_cache=False)
+            self.query_embeddings.set(query, query_vector)
+        
+        distances, result_ids = await asyncio.to_thread(
+            self._search_text, query, query_vector, top_k, filters, hybrid
+        )
+        
+        results = []
+        for movie_id, distance in zip(result_ids, distances):
+            item = self._to_recommendation(int(movie_id), distance)
+            if item is not None:
+                results.append(item)
+        return results
+    
+    def _search_text(
+        self,
+        query: str,
+        query_vector: np.ndarray,
+        top_k: int,
+        filters: Optional[Dict[str, Any]],
+        hybrid: bool
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Search the index with an encoded query (CPU-bound)
+        
+        Hybrid scores are (1 - w) * cosine similarity + w * title match, where the
+        title match goes from 1.0 (exact title) down to 0.2 (typo) and w is
+        SEMANTIC_SEARCH_LEXICAL_WEIGHT. Title matches outside the semantic top-k get
+        their similarity computed from their stored embedding.
+        
+        Returns:
+            Tuple of (scores, movie IDs), best first
+        """
+        with embedding_service.lock:
+            allowed = self._compile_filter_mask(filters)
+            allowed_ids = None if allowed is None else embedding_service.movies_metadata.ids[allowed]
+        
+        distances, result_ids = faiss_service.search(query_vector, k=top_k, allowed_ids=allowed_ids)
+        distances, result_ids = distances[0], result_ids[0]
+        if not hybrid:
+            return distances, result_ids
         
-        if "max_runtime" in filters and filters["max_runtime"]:
-            if current_runtime > int(filters["max_runtime"]):
-                return False
+        with embedding_service.lock:
+            title_ids, ranks = search_service.rank_titles(query)
+            rows, missing = embedding_service.lookup_rows(title_ids)
+            keep = ~missing
+            if allowed is not None:
+                keep &= rows < len(allowed)
+                keep[keep] = allowed[rows[keep]]
+            keep = np.flatnonzero(keep)[:LEXICAL_CANDIDATES]
+            title_ids, ranks, rows = title_ids[keep], ranks[keep], rows[keep]
+            title_similarities = embedding_service.get_vectors(rows) @ query_vector
+        
+        # Lexical score per candidate (0 for semantic hits without a title match)
+        candidate_ids, first = np.unique(np.concatenate([title_ids, result_ids]), return_index=True)
+        similarities = np.concatenate([title_similarities, distances])[first]
+        lexical = np.zeros(len(candidate_ids), dtype='float32')
+        lexical[np.searchsorted(candidate_ids, title_ids)] = 1.0 - ranks / 5.0
+        
+        weight = settings.SEMANTIC_SEARCH_LEXICAL_WEIGHT
+        scores = (1.0 - weight) * similarities + weight * lexical
+        order = np.argsort(-scores, kind='stable')[:top_k]
+        return scores[order], candidate_ids[order]
+    
+    def _schedule_compaction(self):
+        """Start a background compaction once enough movies were logged since the last snapshot"""
+        if embedding_service.log.pending < settings.EMBEDDING_LOG_COMPACT_THRESHOLD:
+            return
+        if self._compaction_task is not None and not self._compaction_task.done():
+            return
         
-        return True
+        self._compaction_task = asyncio.create_task(self.compact_storage())
+    
+    async def compact_storage(self):
+        """Fold the embedding log into the snapshot files and save the FAISS index, off the event loop"""
+        logger.info(f"Compacting {embedding_service.log.pending} logged movies into snapshot")
+        merged_ids = await asyncio.to_thread(embedding_service.save_embeddings)
+        if merged_ids:
+            # Movies added by other server processes
+            await asyncio.to_thread(self._index_movies, merged_ids)
+        await asyncio.to_thread(faiss_service.save_index)
+        await asyncio.to_thread(self._save_neighbor_table)
+    
+    def _index_movies(self, movie_ids: List[int]):
+        """Add catalog movies missing from the FAISS index"""
+        with embedding_service.lock:
+            rows, missing = embedding_service.lookup_rows(movie_ids)
+            vectors = embedding_service.get_vectors(rows[~missing])
+        faiss_service.add_vectors(vectors, np.asarray(movie_ids, dtype=np.int64)[~missing])
+    
+    def _sync_neighbor_table(self):
+        """Merge newly added movies into the neighbour table (kept in memory until the next compaction)"""
+        neighbor_table.sync()
+    
+    def _save_neighbor_table(self):
+        """Merge movies added since the last save into the neighbour table and write it"""
+        neighbor_table.sync()
+        with embedding_service.lock:
+            neighbor_table.save()
+    
+    def _compile_filter_mask(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Evaluate filters with the inverted indexes (caller holds embedding_service.lock)
+        
+        Args:
+            filters: Filter criteria (genre, year, min_rating, actor, director, min_runtime, max_runtime)
+        
+        Returns:
+            Boolean mask over embedding rows, or None when no filter is set
+        """
+        return self.filter_index.compile(filters)
+    
+    async def get_facets(self, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Count catalog movies per genre, decade and rating under the given filters
+        
+        Args:
+            filters: Current filter criteria
+        
+        Returns:
+            Dict with the total and the counts of each facet
+        """
+        def count():
+            with embedding_service.lock:
+                return self.filter_index.facets(filters)
+        
+        return await asyncio.to_thread(count)
     
     async def initialize_from_popular_movies(self, num_movies: int = 500):
         """
@@ -210,81 +629,74 @@ class RecommendationService:
         """
         logger.info(f"Initializing system with {num_movies} movies (50% popular, 50% top rated)")
         
-        all_movies_data = []
-        seen_ids = set()
-        
-        # Target counts
-        target_per_category = num_movies // 2
-        
-        # 1. Fetch Popular Movies
-        logger.info("Fetching popular movies...")
-        page = 1
-        count_popular = 0
-        while count_popular < target_per_category and page <= 500:
-            movies_batch = await tmdb_service.get_popular_movies(page=page)
-            if not movies_batch:
-                break
-                
-            for movie_basic in movies_batch:
-                movie_id = movie_basic["id"]
-                if movie_id in seen_ids:
-                    continue
-                    
-                complete_data = await tmdb_service.get_complete_movie_data(movie_id)
-                if complete_data:
-                    all_movies_data.append(complete_data)
-                    seen_ids.add(movie_id)
-                    count_popular += 1
-                    
-                if count_popular >= target_per_category:
-                    break
-            
-            page += 1
-            
-        # 2. Fetch Top Rated Movies
-        logger.info("Fetching top rated movies...")
-        page = 1
-        # Continue filling until we reach total num_movies
-        while len(all_movies_data) < num_movies and page <= 500:
-            movies_batch = await tmdb_service.get_top_rated_movies(page=page)
-            if not movies_batch:
-                break
-                
-            for movie_basic in movies_batch:
-                movie_id = movie_basic["id"]
-                if movie_id in seen_ids:
-                    continue
-                    
-                complete_data = await tmdb_service.get_complete_movie_data(movie_id)
-                if complete_data:
-                    all_movies_data.append(complete_data)
-                    seen_ids.add(movie_id)
-                    
-                if len(all_movies_data) >= num_movies:
-                    break
-            
-            page += 1
+        # Stream pages -> rate-limited detail fetchers -> batched encoder
+        pipeline = IngestionPipeline(num_movies=num_movies)
+        embeddings, movie_ids, all_movies_data = await pipeline.run()
         
         logger.info(f"Fetched {len(all_movies_data)} movies")
         
-        # Generate embeddings
-        embeddings, movie_ids = embedding_service.batch_generate_embeddings(all_movies_data)
+        # Store, index and save off the event loop
+        await asyncio.to_thread(
+            self._install_catalog,
+            embeddings,
+            movie_ids,
+            {movie["id"]: movie for movie in all_movies_data}
+        )
+        
+        # Metadata may have changed even where vectors did not
+        self.result_cache.clear()
+        self.candidate_pools.clear()
+        
+        logger.info("System initialized successfully")
+    
+    def _install_catalog(
+        self,
+        embeddings: np.ndarray,
+        movie_ids: List[int],
+        movies_metadata: Dict[int, Dict[str, Any]]
+    ):
+        """Replace the catalog, update (or build) the FAISS index and save both to disk"""
+        # Diff against the current catalog while it is still loaded
+        current_ids = np.asarray(embedding_service.movie_ids, dtype=np.int64)
+        in_sync = (
+            faiss_service.index is not None
+            and len(current_ids) > 0
+            and np.array_equal(np.sort(faiss_service.indexed_ids()), np.sort(current_ids))
+        )
+        if in_sync:
+            old_rows, is_new = embedding_service.lookup_rows(movie_ids)
+            changed = is_new.copy()
+            changed[~is_new] = np.any(
+                embedding_service.get_vectors(old_rows[~is_new]) != embeddings[~is_new], axis=1
+            )
+            removed_ids = np.setdiff1d(current_ids, movie_ids)
         
         # Store in embedding service
-        embedding_service.embeddings = embeddings
-        embedding_service.movie_ids = movie_ids
-        embedding_service.movies_metadata = {
-            movie["id"]: movie for movie in all_movies_data
-        }
+        embedding_service.set_catalog(embeddings, movie_ids, movies_metadata)
         
-        # Create FAISS index
-        faiss_service.create_index(embeddings)
+        if in_sync:
+            # Only touch movies that left the catalog or got a new vector (in one step, so an
+            # index that cannot delete in place is rebuilt at most once)
+            if len(removed_ids) or changed.any():
+                faiss_service.update_vectors(removed_ids, embeddings[changed], np.asarray(movie_ids)[changed])
+            logger.info(f"FAISS index refreshed: {len(removed_ids)} removed, {int(changed.sum())} added or re-embedded")
+        else:
+            # Create FAISS index
+            faiss_service.create_index(embeddings, movie_ids)
         
-        # Save to disk
-        embedding_service.save_embeddings()
-        faiss_service.save_index()
+        # Save the catalog first: movies still in the write-ahead log (or saved by another
+        # process) are folded into it and must be indexed like the rest
+        merged_ids = embedding_service.save_embeddings()
+        if merged_ids:
+            self._index_movies(merged_ids)
         
-        logger.info("System initialized successfully")
+        # Index the new catalog's metadata for filters, and its "more like this" neighbours
+        with embedding_service.lock:
+            self.filter_index.sync()
+            neighbor_table.build()
+        
+        faiss_service.save_index()
+        neighbor_table.save()
 
 
 # Global instance
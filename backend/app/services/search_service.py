@@ -0,0 +1,221 @@
+"""
+Search Service - Title search over the local catalog, with TMDB as a fallback for misses
+"""
+import asyncio
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from app.services.embedding_service import embedding_service
+from app.services.text_index import TrigramIndex, fold_text
+from app.services.tmdb_service import tmdb_service
+
+logger = logging.getLogger(__name__)
+
+# Same page size as TMDB search, so both sources paginate alike
+_PAGE_SIZE = 20
+
+# Titles added since the last build live in the indexes' extra postings; rebuild once
+# they exceed this share of the catalog
+_MAX_APPENDED_FRACTION = 0.125
+_MIN_APPENDED_ROWS = 4096
+
+
+def _match_rank(text: str, query: str) -> int:
+    """Rank of a folded title for a folded query (lower is better)"""
+    if text == query:
+        return 0
+    if text.startswith(query):
+        return 1
+    if f" {query}" in f" {text}":
+        return 2
+    if query in text:
+        return 3
+    # Fuzzy (trigram) match
+    return 4
+
+
+class SearchService:
+    """
+    In-process title search over the embedded catalog
+    
+    Titles and original titles are indexed by trigram (see TrigramIndex), entry id =
+    metadata row. Matches rank exact title first, then title prefix, word prefix,
+    substring and typo matches, with popularity breaking ties. The indexes follow the
+    MetadataStore like FilterIndex: appended rows are added incrementally and a reset
+    of the store triggers a rebuild.
+    """
+    
+    def __init__(self):
+        self.metadata = embedding_service.movies_metadata
+        self.titles = TrigramIndex()
+        self.original_titles = TrigramIndex()
+        self.size = 0
+        self._built_size = 0
+        self._generation: Optional[int] = None
+    
+    def sync(self):
+        """Index rows appended since the last call (rebuild after a reset)"""
+        metadata = self.metadata
+        appended = len(metadata) - self._built_size
+        if (
+            self._generation != metadata.generation
+            or len(metadata) < self.size
+            or appended > max(_MIN_APPENDED_ROWS, self._built_size * _MAX_APPENDED_FRACTION)
+        ):
+            self.build()
+            return
+        
+        for row in range(self.size, len(metadata)):
+            self.titles.add(metadata.titles[row])
+            self.original_titles.add(metadata.original_titles[row])
+        self.size = len(metadata)
+    
+    def build(self):
+        """Index every title of the store"""
+        metadata = self.metadata
+        self.titles.build(metadata.titles)
+        self.original_titles.build(metadata.original_titles)
+        self.size = self._built_size = len(metadata)
+        self._generation = metadata.generation
+        logger.info(f"Title index built over {self.size} movies")
+    
+    def search_local(self, query: str, fuzzy: bool = True) -> List[int]:
+        """
+        Catalog movies matching a title query, best first
+        
+        Args:
+            query: Raw query text (case, accents and small typos don't matter)
+            fuzzy: Keep typo matches (titles that only resemble the query)
+        
+        Returns:
+            Ranked movie IDs
+        """
+        return self.rank_titles(query, fuzzy)[0].tolist()
+    
+    def rank_titles(self, query: str, fuzzy: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Catalog movies matching a title query with their match rank, best first
+        
+        Returns:
+            Tuple of (movie IDs, ranks: 0 exact title, 1 prefix, 2 word prefix, 3 substring, 4 typo)
+        """
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+        folded = fold_text(query)
+        if not folded:
+            return empty
+        
+        with embedding_service.lock:
+            self.sync()
+            rows = np.union1d(
+                np.asarray(self.titles.match(folded), dtype=np.int64),
+                np.asarray(self.original_titles.match(folded), dtype=np.int64)
+            )
+            if not len(rows):
+                return empty
+            
+            ranks = np.array([
+                min(
+                    _match_rank(self.titles.texts[row], folded),
+                    _match_rank(self.original_titles.texts[row], folded)
+                )
+                for row in rows.tolist()
+            ])
+            if not fuzzy:
+                rows, ranks = rows[ranks < 4], ranks[ranks < 4]
+            order = np.lexsort((-self.metadata.popularity[rows], ranks))
+            return self.metadata.ids[rows[order]], ranks[order]
+    
+    def _to_movie(self, movie_id: int) -> Optional[Dict[str, Any]]:
+        """Search result fields of a catalog movie"""
+        metadata = embedding_service.get_movie_metadata(movie_id)
+        if metadata is None:
+            return None
+        
+        movie = {
+            "id": movie_id,
+            "title": metadata.get("title", ""),
+            "overview": metadata.get("overview"),
+            "poster_path": metadata.get("poster_path"),
+            "release_date": metadata.get("release_date"),
+            "vote_average": metadata.get("vote_average"),
+            "genres": metadata.get("genres", []),
+            "runtime": metadata.get("runtime")
+        }
+        # Same refined genres as TMDB results
+        tmdb_service.apply_details(movie, metadata)
+        return movie
+    
+    async def search_movies(self, query: str, page: int = 1) -> Dict[str, Any]:
+        """
+        Search movies by title, locally first
+        
+        Catalog matches come first; once they run out (on this page or an earlier one),
+        the page is filled with TMDB results for titles the catalog doesn't have.
+        
+        Args:
+            query: Search query string
+            page: Page number for pagination
+        
+        Returns:
+            Dictionary with search results (same shape as TMDBService.search_movies)
+        """
+        start = (page - 1) * _PAGE_SIZE
+        
+        def search():
+            # A title that merely resembles the query is a miss: TMDB likely has the real one
+            movie_ids = self.search_local(query, fuzzy=False)
+            results = [self._to_movie(movie_id) for movie_id in movie_ids[start:start + _PAGE_SIZE]]
+            return movie_ids, [movie for movie in results if movie is not None]
+        
+        movie_ids, results = await asyncio.to_thread(search)
+        total_results = len(movie_ids)
+        
+        if len(movie_ids) < start + _PAGE_SIZE:
+            # The catalog can't fill this page: continue with TMDB's results for the titles it
+            # doesn't have, after those shown on earlier pages (cached pages are cheap to skip)
+            local_ids = set(movie_ids)
+            skipped = max(0, start - len(movie_ids))
+            duplicates = 0
+            tmdb_page = 1
+            while len(results) < _PAGE_SIZE:
+                data = await tmdb_service.search_movies(query=query, page=tmdb_page)
+                for movie in data["results"]:
+                    if movie["id"] in local_ids:
+                        duplicates += 1
+                    elif skipped:
+                        skipped -= 1
+                    elif len(results) < _PAGE_SIZE:
+                        results.append(movie)
+                total_results = len(movie_ids) + data["total_results"] - duplicates
+                if tmdb_page >= data["total_pages"]:
+                    break
+                tmdb_page += 1
+        
+        return {
+            "results": results,
+            "page": page,
+            "total_pages": (total_results + _PAGE_SIZE - 1) // _PAGE_SIZE,
+            "total_results": total_results
+        }
+    
+    async def suggest(self, query: str, limit: int = 8) -> List[Dict[str, Any]]:
+        """
+        Typeahead suggestions from the local catalog only (never calls TMDB)
+        
+        Args:
+            query: Partial title typed so far
+            limit: Maximum number of suggestions
+        
+        Returns:
+            Best matching movies
+        """
+        def suggest():
+            movies = [self._to_movie(movie_id) for movie_id in self.search_local(query)[:limit]]
+            return [movie for movie in movies if movie is not None]
+        
+        return await asyncio.to_thread(suggest)
+
+
+# Global instance
+search_service = SearchService()
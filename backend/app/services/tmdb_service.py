@@ -2,12 +2,59 @@
 TMDB API Service - Handles all interactions with The Movie Database API
 """
 import httpx
-from typing import List, Optional, Dict, Any
+import asyncio
+import time
+from typing import List, Optional, Dict, Any, Union, Sequence, Tuple
 from app.core.config import settings
+from app.services.cache import ResponseCache
+from app.services.embedding_service import embedding_service
 import logging
 
 logger = logging.getLogger(__name__)
 
+HOUR = 3600
+DAY = 24 * HOUR
+
+# Cache policy per endpoint: (path prefix, fresh TTL, extra stale-while-revalidate window)
+# First matching prefix wins, so specific movie lists come before movie details
+CACHE_POLICIES = [
+    ("/genre/", 7 * DAY, 7 * DAY),
+    ("/search/", HOUR, DAY),
+    ("/discover/", 6 * HOUR, DAY),
+    ("/movie/popular", HOUR, DAY),
+    ("/movie/top_rated", 6 * HOUR, DAY),
+    ("/person/", DAY, 7 * DAY),
+    ("/movie/", DAY, 7 * DAY),
+]
+
+
+class RateLimiter:
+    """Async token bucket limiting the number of requests per second"""
+    
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = float(burst or max(1, int(rate)))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """Wait until a request token is available"""
+        if self.rate <= 0:
+            return
+        
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
 
 class TMDBService:
     """Service for interacting with TMDB API"""
@@ -17,10 +64,20 @@ class TMDBService:
         self.base_url = settings.TMDB_BASE_URL
         self.image_base_url = settings.TMDB_IMAGE_BASE_URL
         self.client = httpx.AsyncClient(timeout=30.0)
+        self.rate_limiter = RateLimiter(settings.TMDB_REQUESTS_PER_SECOND)
+        self.cache = ResponseCache(
+            settings.HTTP_CACHE_PATH,
+            max_memory_entries=settings.HTTP_CACHE_MEMORY_ENTRIES,
+            enabled=settings.HTTP_CACHE_ENABLED
+        )
+        # Bounds the detail requests fired while enriching a page of results
+        self.details_semaphore = asyncio.Semaphore(settings.TMDB_MAX_CONCURRENT_REQUESTS)
+        self._genre_names: Optional[Dict[int, str]] = None
     
     async def close(self):
-        """Close the HTTP client"""
+        """Close the HTTP client and the response cache"""
         await self.client.aclose()
+        await self.cache.close()
     
     def _get_headers(self) -> Dict[str, str]:
         """Get common headers for TMDB API requests"""
@@ -29,6 +86,62 @@ class TMDBService:
             "Content-Type": "application/json"
         }
     
+    async def _get(
+        self,
+        path: str,
+        params: Optional[Union[Dict[str, Any], Sequence[Tuple[str, Any]]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Perform a cached, rate-limited GET request against the TMDB API
+        
+        Args:
+            path: Endpoint path relative to the base URL (e.g. "/movie/550")
+            params: Query parameters (dict or list of tuples)
+            
+        Returns:
+            Decoded JSON response
+        """
+        url = f"{self.base_url}{path}"
+        ttl, stale_ttl = self._get_cache_policy(path)
+        
+        return await self.cache.get_or_fetch(
+            ResponseCache.make_key(url, params),
+            lambda: self._fetch(url, params),
+            ttl=ttl,
+            stale_ttl=stale_ttl
+        )
+    
+    def _get_cache_policy(self, path: str) -> Tuple[float, float]:
+        """Get (fresh TTL, stale window) in seconds for an endpoint"""
+        for prefix, ttl, stale_ttl in CACHE_POLICIES:
+            if path.startswith(prefix):
+                return ttl, stale_ttl
+        return 0, 0
+    
+    async def _fetch(
+        self,
+        url: str,
+        params: Optional[Union[Dict[str, Any], Sequence[Tuple[str, Any]]]] = None
+    ) -> Dict[str, Any]:
+        """Send a GET request to TMDB within the rate limit, retrying on 429"""
+        headers = self._get_headers()
+        
+        retries = 0
+        while True:
+            await self.rate_limiter.acquire()
+            response = await self.client.get(url, params=params, headers=headers)
+            
+            # Back off when TMDB tells us we are over budget
+            if response.status_code == 429 and retries < 2:
+                retries += 1
+                retry_after = float(response.headers.get("Retry-After", 1))
+                logger.warning(f"TMDB rate limit hit on {url}, retrying in {retry_after}s")
+                await asyncio.sleep(retry_after)
+                continue
+            
+            response.raise_for_status()
+            return response.json()
+    
     def _get_poster_url(self, poster_path: Optional[str]) -> Optional[str]:
         # Convert poster path to full URL
         if not poster_path:
@@ -36,20 +149,72 @@ class TMDBService:
         return f"{self.image_base_url}{poster_path}"
 
     async def _populate_movie_data(self, movies: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Helper to fetch additional details (runtime, genres) for a list of movies concurrently"""
-        import asyncio
+        """
+        Helper to fill in additional details (runtime, genres) for a list of movies
+        
+        Movies already in the local catalog or in the details cache are filled without any
+        request; only the remaining ones are fetched, with bounded concurrency. Genres are
+        first resolved from TMDB `genre_ids` so results keep them even if a fetch fails.
+        """
+        genre_names = await self._get_genre_names()
+        
+        misses = []
+        for m in movies:
+            if genre_names and m.get("genre_ids"):
+                names = [genre_names[g] for g in m["genre_ids"] if g in genre_names]
+                m['genres'] = self._refine_genres(names, [])
+            
+            details = embedding_service.get_movie_metadata(m['id'])
+            if details is None:
+                details = await self._peek_movie_details(m['id'])
+            
+            if details is not None:
+                self.apply_details(m, details)
+            else:
+                misses.append(m)
+        
         async def populate_one(m):
-            details = await self.get_movie_details(m['id'])
+            async with self.details_semaphore:
+                details = await self.get_movie_details(m['id'])
             if details:
-                m['runtime'] = details.get('runtime')
-                
-                # Use refined genres if available
-                genres = details.get('genres', [])
-                keywords = details.get('keywords', [])
-                m['genres'] = self._refine_genres(genres, keywords)
-            return m
-        return await asyncio.gather(*[populate_one(m) for m in movies])
-
+                self.apply_details(m, details)
+        
+        if misses:
+            await asyncio.gather(*[populate_one(m) for m in misses])
+        
+        return movies
+    
+    def apply_details(self, movie: Dict[str, Any], details: Dict[str, Any]):
+        """Copy runtime and refined genres from movie details (TMDB or catalog) onto a list entry"""
+        movie['runtime'] = details.get('runtime')
+        
+        # Use refined genres if available
+        genres = details.get('genres', [])
+        keywords = details.get('keywords', [])
+        if genres:
+            movie['genres'] = self._refine_genres(genres, keywords)
+    
+    async def _peek_movie_details(self, movie_id: int) -> Optional[Dict[str, Any]]:
+        """Get movie details from the response cache only, without any request"""
+        url = f"{self.base_url}/movie/{movie_id}"
+        for append in ("keywords", "keywords,credits"):
+            params = {"language": "fr-FR", "append_to_response": append}
+            movie = await self.cache.peek(ResponseCache.make_key(url, params))
+            if movie is not None:
+                return self._format_movie_details(movie)
+        return None
+    
+    async def _get_genre_names(self) -> Dict[int, str]:
+        """Get the TMDB genre id -> name table (fetched once, then kept in memory)"""
+        if self._genre_names is None:
+            try:
+                data = await self._get("/genre/movie/list", {"language": "fr-FR"})
+                self._genre_names = {g["id"]: g["name"] for g in data.get("genres", [])}
+            except httpx.HTTPError as e:
+                logger.error(f"Error fetching genre table: {e}")
+                return {}
+        return self._genre_names
+    
     def _refine_genres(self, genres: List[str], keywords: List[str]) -> List[str]:
         """Refine genre names for more precision (e.g., 'Comédie Romantique')"""
         if not genres:
@@ -105,6 +270,46 @@ class TMDBService:
                     
         return refined
     
+    def _format_movie_details(self, movie: Dict[str, Any]) -> Dict[str, Any]:
+        """Format a raw TMDB movie payload (with appended keywords)"""
+        genres = [g.get("name") for g in movie.get("genres", [])]
+        keywords_data = movie.get("keywords", {}).get("keywords", [])
+        keywords = [kw.get("name") for kw in keywords_data]
+        
+        return {
+            "id": movie.get("id"),
+            "title": movie.get("title"),
+            "original_title": movie.get("original_title"),
+            "overview": movie.get("overview"),
+            "poster_path": self._get_poster_url(movie.get("poster_path")),
+            "release_date": movie.get("release_date"),
+            "vote_average": movie.get("vote_average"),
+            "genres": genres,
+            "keywords": keywords,
+            "runtime": movie.get("runtime"),
+            "popularity": movie.get("popularity")
+        }
+    
+    def _parse_credits(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Extract top cast members and director from a TMDB credits payload"""
+        # Get top 5 cast members
+        cast = [
+            member.get("name")
+            for member in data.get("cast", [])[:5]
+        ]
+        
+        # Find director
+        director = None
+        for crew_member in data.get("crew", []):
+            if crew_member.get("job") == "Director":
+                director = crew_member.get("name")
+                break
+        
+        return {
+            "cast": cast,
+            "director": director
+        }
+    
     async def search_movies(self, query: str, page: int = 1) -> Dict[str, Any]:
         """
         Search for movies by title
@@ -117,19 +322,14 @@ class TMDBService:
             Dictionary with search results
         """
         try:
-            url = f"{self.base_url}/search/movie"
+            path = "/search/movie"
             params = {
                 "query": query,
                 "page": page,
                 "language": "fr-FR",
                 "include_adult": False
             }
-            headers = self._get_headers()
-            
-            response = await self.client.get(url, params=params, headers=headers)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = await self._get(path, params)
             
             # Format results
             formatted_results = []
@@ -141,7 +341,8 @@ class TMDBService:
                     "poster_path": self._get_poster_url(movie.get("poster_path")),
                     "release_date": movie.get("release_date"),
                     "vote_average": movie.get("vote_average"),
-                    "genres": []
+                    "genres": [],
+                    "genre_ids": movie.get("genre_ids", [])
                 })
             
             # Populate data (runtime, genres)
@@ -174,34 +375,14 @@ class TMDBService:
             Dictionary with movie details or None if not found
         """
         try:
-            url = f"{self.base_url}/movie/{movie_id}"
+            path = f"/movie/{movie_id}"
             params = {
                 "language": "fr-FR",
                 "append_to_response": "keywords"
             }
-            headers = self._get_headers()
+            movie = await self._get(path, params)
             
-            response = await self.client.get(url, params=params, headers=headers)
-            response.raise_for_status()
-            
-            movie = response.json()
-            
-            genres = [g.get("name") for g in movie.get("genres", [])]
-            keywords_data = movie.get("keywords", {}).get("keywords", [])
-            keywords = [kw.get("name") for kw in keywords_data]
-            
-            return {
-                "id": movie.get("id"),
-                "title": movie.get("title"),
-                "overview": movie.get("overview"),
-                "poster_path": self._get_poster_url(movie.get("poster_path")),
-                "release_date": movie.get("release_date"),
-                "vote_average": movie.get("vote_average"),
-                "genres": genres,
-                "keywords": keywords,
-                "runtime": movie.get("runtime"),
-                "popularity": movie.get("popularity")
-            }
+            return self._format_movie_details(movie)
             
         except httpx.HTTPError as e:
             logger.error(f"Error fetching movie {movie_id}: {e}")
@@ -218,13 +399,8 @@ class TMDBService:
             List of keyword strings
         """
         try:
-            url = f"{self.base_url}/movie/{movie_id}/keywords"
-            headers = self._get_headers()
-            
-            response = await self.client.get(url, headers=headers)
-            response.raise_for_status()
-            
-            data = response.json()
+            path = f"/movie/{movie_id}/keywords"
+            data = await self._get(path)
             return [kw.get("name") for kw in data.get("keywords", [])]
             
         except httpx.HTTPError as e:
@@ -242,58 +418,37 @@ class TMDBService:
             Dictionary with cast and director information
         """
         try:
-            url = f"{self.base_url}/movie/{movie_id}/credits"
-            headers = self._get_headers()
-            
-            response = await self.client.get(url, headers=headers)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            # Get top 5 cast members
-            cast = [
-                member.get("name")
-                for member in data.get("cast", [])[:5]
-            ]
+            path = f"/movie/{movie_id}/credits"
+            data = await self._get(path)
             
-            # Find director
-            director = None
-            for crew_member in data.get("crew", []):
-                if crew_member.get("job") == "Director":
-                    director = crew_member.get("name")
-                    break
-            
-            return {
-                "cast": cast,
-                "director": director
-            }
+            return self._parse_credits(data)
             
         except httpx.HTTPError as e:
             logger.error(f"Error fetching credits for movie {movie_id}: {e}")
             return {"cast": [], "director": None}
     
-    async def get_popular_movies(self, page: int = 1) -> List[Dict[str, Any]]:
+    async def get_popular_movies(
+        self,
+        page: int = 1,
+        populate: bool = True
+    ) -> List[Dict[str, Any]]:
         """
         Get popular movies for cold start
         
         Args:
             page: Page number
+            populate: Whether to enrich each movie with details (runtime, genres)
             
         Returns:
             List of popular movies
         """
         try:
-            url = f"{self.base_url}/movie/popular"
+            path = "/movie/popular"
             params = {
                 "page": page,
                 "language": "fr-FR"
             }
-            headers = self._get_headers()
-            
-            response = await self.client.get(url, params=params, headers=headers)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = await self._get(path, params)
             
             formatted_results = []
             for movie in data.get("results", []):
@@ -304,37 +459,41 @@ class TMDBService:
                     "poster_path": self._get_poster_url(movie.get("poster_path")),
                     "release_date": movie.get("release_date"),
                     "vote_average": movie.get("vote_average"),
-                    "genres": []
+                    "genres": [],
+                    "genre_ids": movie.get("genre_ids", [])
                 })
             
+            if not populate:
+                return formatted_results
+            
             return await self._populate_movie_data(formatted_results)
             
         except httpx.HTTPError as e:
             logger.error(f"Error fetching popular movies: {e}")
             return []
 
-    async def get_top_rated_movies(self, page: int = 1) -> List[Dict[str, Any]]:
+    async def get_top_rated_movies(
+        self,
+        page: int = 1,
+        populate: bool = True
+    ) -> List[Dict[str, Any]]:
         """
         Get top rated movies for broader catalog
         
         Args:
             page: Page number
+            populate: Whether to enrich each movie with details (runtime, genres)
             
         Returns:
             List of top rated movies
         """
         try:
-            url = f"{self.base_url}/movie/top_rated"
+            path = "/movie/top_rated"
             params = {
                 "page": page,
                 "language": "fr-FR"
             }
-            headers = self._get_headers()
-            
-            response = await self.client.get(url, params=params, headers=headers)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = await self._get(path, params)
             
             formatted_results = []
             for movie in data.get("results", []):
@@ -345,9 +504,13 @@ class TMDBService:
                     "poster_path": self._get_poster_url(movie.get("poster_path")),
                     "release_date": movie.get("release_date"),
                     "vote_average": movie.get("vote_average"),
-                    "genres": []
+                    "genres": [],
+                    "genre_ids": movie.get("genre_ids", [])
                 })
             
+            if not populate:
+                return formatted_results
+            
             return await self._populate_movie_data(formatted_results)
             
         except httpx.HTTPError as e:
@@ -357,7 +520,7 @@ class TMDBService:
     async def get_complete_movie_data(self, movie_id: int) -> Optional[Dict[str, Any]]:
         """
         Get complete movie data including details, keywords, and credits
-        This is used for generating embeddings
+        This is used for generating embeddings (one TMDB request)
         
         Args:
             movie_id: TMDB movie ID
@@ -365,22 +528,23 @@ class TMDBService:
         Returns:
             Complete movie data dictionary
         """
-        # Fetch all data concurrently
-        details = await self.get_movie_details(movie_id)
-        if not details:
+        try:
+            # Details, keywords and credits in a single round-trip
+            path = f"/movie/{movie_id}"
+            params = {
+                "language": "fr-FR",
+                "append_to_response": "keywords,credits"
+            }
+            movie = await self._get(path, params)
+            
+            return {
+                **self._format_movie_details(movie),
+                **self._parse_credits(movie.get("credits", {}))
+            }
+            
+        except httpx.HTTPError as e:
+            logger.error(f"Error fetching complete data for movie {movie_id}: {e}")
             return None
-        
-        keywords = await self.get_movie_keywords(movie_id)
-        credits = await self.get_movie_credits(movie_id)
-        
-        # Combine all data
-        complete_data = {
-            **details,
-            "keywords": keywords,
-            **credits
-        }
-        
-        return complete_data
 
     async def search_person(self, query: str) -> List[Dict[str, Any]]:
         """
@@ -393,19 +557,14 @@ class TMDBService:
             List of person dictionaries
         """
         try:
-            url = f"{self.base_url}/search/person"
+            path = "/search/person"
             params = {
                 "query": query,
                 "language": "fr-FR",
                 "page": 1,
                 "include_adult": False
             }
-            headers = self._get_headers()
-            
-            response = await self.client.get(url, params=params, headers=headers)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = await self._get(path, params)
             
             # Format results
             people = []
@@ -426,14 +585,10 @@ class TMDBService:
     async def get_genres(self) -> List[Dict[str, Any]]:
         """Get list of movie genres, including refined sub-genres"""
         try:
-            url = f"{self.base_url}/genre/movie/list"
+            path = "/genre/movie/list"
             params = {"language": "fr-FR"}
-            headers = self._get_headers()
-            
-            response = await self.client.get(url, params=params, headers=headers)
-            response.raise_for_status()
-            
-            genres = response.json().get("genres", [])
+            data = await self._get(path, params)
+            genres = data.get("genres", [])
             
             # Add virtual sub-genres
             virtual_genres = [
@@ -469,7 +624,7 @@ class TMDBService:
         Discover movies with advanced filtering
         """
         try:
-            url = f"{self.base_url}/discover/movie"
+            path = "/discover/movie"
             # Build params as a list of tuples to support multiple with_genres (AND logic)
             query_params = [
                 ("language", "fr-FR"),
@@ -499,12 +654,7 @@ class TMDBService:
                 else:
                     query_params.append(("with_genres", genre_id))
                 
-            headers = self._get_headers()
-            
-            response = await self.client.get(url, params=query_params, headers=headers)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = await self._get(path, query_params)
             
             # Format results
             formatted_results = []
@@ -516,7 +666,8 @@ class TMDBService:
                     "poster_path": self._get_poster_url(movie.get("poster_path")),
                     "release_date": movie.get("release_date"),
                     "vote_average": movie.get("vote_average"),
-                    "genres": [] # IDs are in movie['genre_ids], but we usually resolve them elsewhere or ignore for list views
+                    "genres": [],  # Resolved from genre_ids by _populate_movie_data
+                    "genre_ids": movie.get("genre_ids", [])
                 })
             
             formatted_results = await self._populate_movie_data(formatted_results)
@@ -534,14 +685,9 @@ class TMDBService:
     async def get_person_movie_credits(self, person_id: int) -> List[Dict[str, Any]]:
         """Get movie credits for a person"""
         try:
-            url = f"{self.base_url}/person/{person_id}/movie_credits"
+            path = f"/person/{person_id}/movie_credits"
             params = {"language": "fr-FR"}
-            headers = self._get_headers()
-            
-            response = await self.client.get(url, params=params, headers=headers)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = await self._get(path, params)
             cast_credits = data.get("cast", [])
             
             # Sort by popularity or release date? Let's format first
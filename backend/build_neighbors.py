@@ -0,0 +1,35 @@
+"""
+Script pour précalculer les films similaires ("plus comme celui-ci") de tout le catalogue
+Usage: python build_neighbors.py
+"""
+import sys
+import time
+from app.core.config import settings
+from app.services.embedding_service import embedding_service
+from app.services.faiss_service import faiss_service
+from app.services.neighbor_table import neighbor_table
+
+
+def main():
+    if not embedding_service.load_embeddings() or not faiss_service.load_index():
+        print("❌ Aucun catalogue trouvé : initialisez d'abord le système (python init_system.py)")
+        sys.exit(1)
+    
+    # Films rejoués depuis le journal d'embeddings
+    faiss_service.sync_with_embeddings(embedding_service.embeddings, embedding_service.movie_ids)
+    
+    num_movies = len(embedding_service.movie_ids)
+    print(f"🔗 Calcul des {neighbor_table.num_neighbors} voisins de {num_movies} films...")
+    
+    start = time.perf_counter()
+    with embedding_service.lock:
+        neighbor_table.build()
+    elapsed = time.perf_counter() - start
+    
+    neighbor_table.save()
+    size_mb = (neighbor_table.neighbor_ids.nbytes + neighbor_table.scores.nbytes) / 1e6
+    print(f"✅ Table enregistrée dans {settings.NEIGHBORS_PATH} ({size_mb:.1f} Mo, {elapsed:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
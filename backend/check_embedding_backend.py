@@ -0,0 +1,108 @@
+"""
+Script pour vérifier qu'un backend d'inférence (ONNX, ONNX int8) reproduit les embeddings PyTorch
+Usage: python check_embedding_backend.py [onnx|onnx-int8] [nombre_de_textes]
+"""
+import json
+import os
+import sqlite3
+import sys
+import numpy as np
+from app.core.config import settings
+from app.services.embedding_service import embedding_service
+from app.services.embedding_backends import create_backend, parity_report
+
+
+def read_catalog_docs(count: int) -> list[dict]:
+    """
+    Fiches des premiers films de l'instantané, lues sans rien modifier dans le dossier de données
+    
+    Contrairement à embedding_service.load_embeddings(), ni le journal des ajouts ni un
+    ancien movies_metadata.json ne sont rejoués ou migrés : un serveur peut tourner sur
+    les mêmes fichiers.
+    """
+    if os.path.exists(settings.MOVIES_COLUMNS_PATH) and os.path.exists(settings.MOVIES_DOCS_PATH):
+        with np.load(settings.MOVIES_COLUMNS_PATH) as data:
+            movie_ids = data["ids"][:count].tolist()
+        
+        # Sans serveur ouvert sur la base (pas de fichier -wal), immutable=1 évite même à
+        # SQLite de créer ses fichiers -wal / -shm
+        options = "mode=ro" if os.path.exists(f"{settings.MOVIES_DOCS_PATH}-wal") else "immutable=1"
+        db = sqlite3.connect(f"file:{settings.MOVIES_DOCS_PATH}?{options}", uri=True)
+        try:
+            docs = {}
+            # Par paquets, sous la limite de variables SQLite
+            for start in range(0, len(movie_ids), 500):
+                chunk = movie_ids[start:start + 500]
+                rows = db.execute(
+                    f"SELECT id, doc FROM docs WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                docs.update((movie_id, json.loads(doc)) for movie_id, doc in rows)
+        finally:
+            db.close()
+        return [docs[movie_id] for movie_id in movie_ids if movie_id in docs]
+    
+    if os.path.exists(settings.MOVIES_METADATA_PATH):
+        with open(settings.MOVIES_METADATA_PATH, 'r') as f:
+            metadata = json.load(f)
+        return [
+            metadata["movies_metadata"][str(movie_id)]
+            for movie_id in metadata["movie_ids"][:count]
+            if str(movie_id) in metadata["movies_metadata"]
+        ]
+    
+    return []
+
+
+def load_sample_texts(count: int) -> list[str]:
+    """Textes d'embedding des films du catalogue (ou quelques textes de secours)"""
+    try:
+        docs = read_catalog_docs(count)
+    except (OSError, sqlite3.Error, KeyError, ValueError) as e:
+        print(f"⚠️  Catalogue illisible ({e}), utilisation de textes de secours")
+        docs = []
+    texts = [embedding_service.create_embedding_text(metadata) for metadata in docs]
+    
+    if not texts:
+        texts = [
+            "Un braquage dans l'espace",
+            "Une comédie romantique à Paris",
+            "A heist movie in space",
+            "Documentary about deep sea creatures",
+            "Un film d'horreur dans une maison hantée"
+        ]
+    return texts
+
+
+def main():
+    backend_name = sys.argv[1] if len(sys.argv) > 1 else "onnx-int8"
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    
+    texts = load_sample_texts(count)
+    print(f"🔍 Comparaison du backend '{backend_name}' avec PyTorch sur {len(texts)} textes...")
+    
+    try:
+        reference = create_backend("torch", settings.EMBEDDING_MODEL_NAME, settings.ONNX_EXPORT_DIR)
+        candidate = create_backend(
+            backend_name,
+            settings.EMBEDDING_MODEL_NAME,
+            settings.ONNX_EXPORT_DIR,
+            max_seq_length=settings.EMBEDDING_MAX_SEQ_LENGTH
+        )
+        report = parity_report(candidate, reference, texts)
+    except Exception as e:
+        print(f"❌ Erreur lors de la comparaison : {e}")
+        sys.exit(1)
+    
+    print("")
+    for key, value in report.items():
+        print(f"  {key}: {value:.4f}" if isinstance(value, float) else f"  {key}: {value}")
+    print("")
+    
+    if report["cosine_min"] < 0.98:
+        print("⚠️  Accord cosinus insuffisant : ne pas utiliser ce backend sans réindexer le catalogue")
+        sys.exit(1)
+    print("✅ Backend compatible avec les embeddings existants")
+
+
+if __name__ == "__main__":
+    main()
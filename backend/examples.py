@@ -6,6 +6,7 @@ directement dans du code Python (utile pour tests, scripts, notebooks).
 """
 
 import asyncio
+import numpy as np
 from app.services.tmdb_service import tmdb_service
 from app.services.embedding_service import embedding_service
 from app.services.faiss_service import faiss_service
@@ -107,22 +108,25 @@ async def example_4_similarity_search():
     
     # Choisir un film de référence
     reference_movie_id = 603  # The Matrix
-    reference_idx = embedding_service.movie_ids.index(reference_movie_id)
-    reference_embedding = embedding_service.embeddings[reference_idx]
+    reference_row = embedding_service.get_row(reference_movie_id)
+    if reference_row is None:
+        print("⚠️  Film de référence absent du catalogue.")
+        return
+    reference_embedding = embedding_service.get_vectors(np.array([reference_row]))[0]
     
     reference_metadata = embedding_service.get_movie_metadata(reference_movie_id)
     print(f"\nFilm de référence: {reference_metadata['title']}")
     
     # Rechercher les films similaires
-    distances, indices = faiss_service.search(
+    distances, movie_ids = faiss_service.search(
         reference_embedding,
-        k=6,  # Top 6 (incluant le film lui-même)
-        exclude_indices=[reference_idx]  # Exclure le film de référence
+        k=5,
+        exclude_ids=[reference_movie_id]  # Exclure le film de référence
     )
     
     print(f"\nTop 5 films similaires:")
-    for i, (distance, idx) in enumerate(zip(distances[0], indices[0]), 1):
-        movie_id = embedding_service.movie_ids[int(idx)]
+    for i, (distance, movie_id) in enumerate(zip(distances[0], movie_ids[0]), 1):
+        movie_id = int(movie_id)
         metadata = embedding_service.get_movie_metadata(movie_id)
         
         print(f"\n{i}. {metadata['title']} (Score: {distance:.3f})")
@@ -21,7 +21,7 @@ async def main():
             print("⚠️  Argument invalide, utilisation de la valeur par défaut (500)")
     
     print(f"🎬 Initialisation du système avec {num_movies} films...")
-    print("⏱️  Cette opération peut prendre 10-15 minutes...")
+    print("⏱️  Durée limitée par le budget de requêtes TMDB (TMDB_REQUESTS_PER_SECOND)...")
     print("")
     
     try:
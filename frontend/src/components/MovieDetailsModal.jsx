@@ -6,6 +6,7 @@ function MovieDetailsModal({ movie, onClose }) {
     const modalRef = useRef(null);
     const [details, setDetails] = useState(movie);
     const [isLoadingDetails, setIsLoadingDetails] = useState(false);
+    const [similarMovies, setSimilarMovies] = useState([]);
 
     useEffect(() => {
         const handleEscape = (e) => {
@@ -41,6 +42,13 @@ function MovieDetailsModal({ movie, onClose }) {
         fetchDetails();
     }, [movie.id, details.cast, details.runtime]);
 
+    useEffect(() => {
+        // Precomputed on the backend; movies outside the catalog simply have none
+        ApiService.getSimilarMovies(movie.id, 6)
+            .then(data => setSimilarMovies(data.results))
+            .catch(() => setSimilarMovies([]));
+    }, [movie.id]);
+
     const handleBackdropClick = (e) => {
         if (modalRef.current && !modalRef.current.contains(e.target)) {
             onClose();
@@ -137,6 +145,20 @@ function MovieDetailsModal({ movie, onClose }) {
                                 <p>{details.director}</p>
                             </div>
                         )}
+
+                        {/* More like this */}
+                        {similarMovies.length > 0 && (
+                            <div className="modal-section">
+                                <h3>Films similaires</h3>
+                                <div className="modal-cast">
+                                    {similarMovies.map((similar, index) => (
+                                        <span key={similar.movie_id} className="cast-member">
+                                            {similar.title}{index < similarMovies.length - 1 ? ', ' : ''}
+                                        </span>
+                                    ))}
+                                </div>
+                            </div>
+                        )}
                     </div>
                 </div>
             </div>
@@ -1,9 +1,35 @@
 import { useState, useEffect, useCallback } from 'react';
+import ApiService from '../services/api';
 import './SearchBar.css';
 
 function SearchBar({ onSearch, onClear }) {
     const [query, setQuery] = useState('');
     const [isSearching, setIsSearching] = useState(false);
+    const [suggestions, setSuggestions] = useState([]);
+    const [showSuggestions, setShowSuggestions] = useState(false);
+
+    // Typeahead: local catalog only, cheap enough for every keystroke
+    useEffect(() => {
+        if (!query.trim()) {
+            setSuggestions([]);
+            return;
+        }
+
+        let cancelled = false;
+        const timer = setTimeout(async () => {
+            try {
+                const data = await ApiService.suggestMovies(query);
+                if (!cancelled) setSuggestions(data.results);
+            } catch (err) {
+                if (!cancelled) setSuggestions([]);
+            }
+        }, 100);
+
+        return () => {
+            cancelled = true;
+            clearTimeout(timer);
+        };
+    }, [query]);
 
     // Debounce search
     useEffect(() => {
@@ -26,6 +52,11 @@ function SearchBar({ onSearch, onClear }) {
         onClear();
     };
 
+    const handleSelect = (movie) => {
+        setQuery(movie.title);
+        setShowSuggestions(false);
+    };
+
     return (
         <div className="search-bar">
             <div className="search-input-wrapper">
@@ -39,7 +70,12 @@ function SearchBar({ onSearch, onClear }) {
                     className="input search-input"
                     placeholder="Rechercher un film... (ex: Inception, Matrix)"
                     value={query}
-                    onChange={(e) => setQuery(e.target.value)}
+                    onChange={(e) => {
+                        setQuery(e.target.value);
+                        setShowSuggestions(true);
+                    }}
+                    onFocus={() => setShowSuggestions(true)}
+                    onBlur={() => setShowSuggestions(false)}
                 />
 
                 {query && (
@@ -59,6 +95,27 @@ function SearchBar({ onSearch, onClear }) {
                         <div className="spinner"></div>
                     </div>
                 )}
+
+                {showSuggestions && suggestions.length > 0 && (
+                    <ul className="search-suggestions">
+                        {suggestions.map((movie) => (
+                            <li
+                                key={movie.id}
+                                className="search-suggestion"
+                                // mousedown fires before the input's blur hides the list
+                                onMouseDown={(e) => {
+                                    e.preventDefault();
+                                    handleSelect(movie);
+                                }}
+                            >
+                                <span className="search-suggestion-title">{movie.title}</span>
+                                {movie.release_date && (
+                                    <span className="search-suggestion-year">{movie.release_date.slice(0, 4)}</span>
+                                )}
+                            </li>
+                        ))}
+                    </ul>
+                )}
             </div>
         </div>
     );
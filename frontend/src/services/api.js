@@ -17,6 +17,21 @@ class ApiService {
     return response.json();
   }
 
+  /**
+   * Typeahead suggestions from the local catalog (no TMDB call)
+   */
+  async suggestMovies(query, limit = 8) {
+    const response = await fetch(
+      `${API_BASE_URL}/search/suggest?query=${encodeURIComponent(query)}&limit=${limit}`
+    );
+
+    if (!response.ok) {
+      throw new Error('Failed to get suggestions');
+    }
+
+    return response.json();
+  }
+
   /**
    * Search for people (actors)
    */
@@ -45,6 +60,19 @@ class ApiService {
     return response.json();
   }
 
+  /**
+   * Get the movies most similar to a catalog movie
+   */
+  async getSimilarMovies(movieId, topK = 10) {
+    const response = await fetch(`${API_BASE_URL}/movie/${movieId}/similar?top_k=${topK}`);
+
+    if (!response.ok) {
+      throw new Error('Failed to get similar movies');
+    }
+
+    return response.json();
+  }
+
   /**
    * Get popular movies
    */
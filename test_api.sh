@@ -15,29 +15,29 @@ RED='\033[0;31m'
 NC='\033[0m' # No Color
 
 # 1. Test du statut
-echo -e "${BLUE}[1/5]${NC} Test du statut de l'API..."
+echo -e "${BLUE}[1/6]${NC} Test du statut de l'API..."
 STATUS=$(curl -s ${API_URL}/api/status)
 echo "$STATUS" | python3 -m json.tool
 echo ""
 
 # 2. Test de recherche
-echo -e "${BLUE}[2/5]${NC} Recherche de films (query: 'Matrix')..."
+echo -e "${BLUE}[2/6]${NC} Recherche de films (query: 'Matrix')..."
 curl -s "${API_URL}/api/search?query=Matrix&page=1" | python3 -m json.tool | head -n 50
 echo ""
 
 # 3. Test des films populaires
-echo -e "${BLUE}[3/5]${NC} Récupération des films populaires..."
+echo -e "${BLUE}[3/6]${NC} Récupération des films populaires..."
 POPULAR=$(curl -s "${API_URL}/api/popular?page=1")
 echo "$POPULAR" | python3 -m json.tool | head -n 50
 echo ""
 
 # 4. Test des détails d'un film (The Matrix - ID: 603)
-echo -e "${BLUE}[4/5]${NC} Détails du film 'The Matrix' (ID: 603)..."
+echo -e "${BLUE}[4/6]${NC} Détails du film 'The Matrix' (ID: 603)..."
 curl -s "${API_URL}/api/movie/603" | python3 -m json.tool
 echo ""
 
 # 5. Test de recommandations
-echo -e "${BLUE}[5/5]${NC} Recommandations basées sur Matrix (603), Inception (27205), Interstellar (157336)..."
+echo -e "${BLUE}[5/6]${NC} Recommandations basées sur Matrix (603), Inception (27205), Interstellar (157336)..."
 curl -s -X POST "${API_URL}/api/recommend" \
   -H "Content-Type: application/json" \
   -d '{
@@ -46,6 +46,28 @@ curl -s -X POST "${API_URL}/api/recommend" \
   }' | python3 -m json.tool
 echo ""
 
+# 6. Cohérence catalogue / index FAISS
+# Avec REINIT=1 : ajout à la volée d'un film hors catalogue (Ariel, ID: 2), puis réinitialisation ;
+# le film ajouté doit rester indexé comme le reste du catalogue
+echo -e "${BLUE}[6/6]${NC} Cohérence du catalogue et de l'index FAISS..."
+if [ "${REINIT}" = "1" ]; then
+  curl -s -X POST "${API_URL}/api/recommend" \
+    -H "Content-Type: application/json" \
+    -d '{"liked_movies": [2], "top_k": 1}' > /dev/null
+  curl -s -X POST "${API_URL}/api/initialize?num_movies=100" > /dev/null
+  SIMILAR=$(curl -s -o /dev/null -w "%{http_code}" "${API_URL}/api/movie/2/similar?top_k=3")
+  echo "Films similaires au film ajouté : HTTP ${SIMILAR}"
+fi
+TOTAL_MOVIES=$(curl -s ${API_URL}/api/status | python3 -c "import sys, json; print(json.load(sys.stdin)['total_movies'])")
+TOTAL_VECTORS=$(curl -s ${API_URL}/api/index/stats | python3 -c "import sys, json; print(json.load(sys.stdin)['total_vectors'])")
+if [ "${TOTAL_MOVIES}" = "${TOTAL_VECTORS}" ] && { [ "${REINIT}" != "1" ] || [ "${SIMILAR}" = "200" ]; }; then
+  echo -e "${GREEN}OK${NC} : ${TOTAL_MOVIES} films, ${TOTAL_VECTORS} vecteurs indexés"
+else
+  echo -e "${RED}ÉCHEC${NC} : ${TOTAL_MOVIES} films mais ${TOTAL_VECTORS} vecteurs indexés"
+  exit 1
+fi
+echo ""
+
 echo -e "${GREEN}✅ Tests terminés !${NC}"
 echo ""
 echo "Documentation complète : ${API_URL}/docs"